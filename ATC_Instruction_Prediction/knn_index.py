@@ -0,0 +1,79 @@
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin
+
+# Approximate k-nearest-neighbour classifier over an inverted file (IVF) index.
+# fit() clusters the training points with k-means into n_lists cells and stores the points sorted by cell.
+# A query only scans the points of the n_probe cells with the nearest centroids, about n_probe / n_lists of the
+# training set, instead of all of it as the brute-force KNeighborsClassifier does. The neighbours found are exact
+# within the scanned cells; a true neighbour in another cell is missed, more rarely the larger n_probe.
+# KD and ball trees do not help here: with 28 features they end up visiting most leaves.
+
+class IVFKNeighborsClassifier(ClassifierMixin, BaseEstimator):
+    def __init__(self, n_neighbors=5, n_lists=None, n_probe=16, random_state=0):
+        self.n_neighbors = n_neighbors
+        self.n_lists = n_lists # Default: sqrt of the number of training points
+        self.n_probe = n_probe
+        self.random_state = random_state
+
+    def fit(self, X, y):
+        from sklearn.cluster import MiniBatchKMeans
+
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        self.classes_, y = np.unique(y, return_inverse=True)
+        n_lists = self.n_lists or max(int(np.sqrt(len(X))), 1)
+
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, batch_size=4096, n_init=3, random_state=self.random_state).fit(X)
+        self.centroids_ = kmeans.cluster_centers_.astype(np.float32)
+        order = np.argsort(kmeans.labels_, kind='stable')
+        self.index_ = order # Position in X of every point of points_
+        self.points_ = X[order]
+        self.point_norms_ = (self.points_ ** 2).sum(axis=1)
+        self.labels_ = y[order]
+        self.offsets_ = np.searchsorted(kmeans.labels_[order], np.arange(n_lists + 1))
+        return self
+
+    # Squared distances and positions in points_ of the n_neighbors nearest points found, nearest first
+    def _search(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n, k = len(X), self.n_neighbors
+        n_probe = min(self.n_probe, len(self.centroids_))
+
+        centroid_distances = (X ** 2).sum(axis=1)[:, None] - 2 * X @ self.centroids_.T + (self.centroids_ ** 2).sum(axis=1)
+        probes = np.argpartition(centroid_distances, n_probe - 1, axis=1)[:, :n_probe]
+
+        best_distances = np.full((n, k), np.inf, dtype=np.float32)
+        best_indices = np.full((n, k), -1, dtype=np.int64)
+        # Cell by cell, every query probing the cell is compared with its points at once
+        flat_probes = probes.ravel()
+        order = np.argsort(flat_probes, kind='stable')
+        cells, starts = np.unique(flat_probes[order], return_index=True)
+        for cell, queries in zip(cells, np.split(order // n_probe, starts[1:])):
+            start, end = self.offsets_[cell], self.offsets_[cell + 1]
+            if start == end:
+                continue
+            distances = (X[queries] ** 2).sum(axis=1)[:, None] - 2 * X[queries] @ self.points_[start:end].T + self.point_norms_[start:end]
+            candidates = np.hstack([best_distances[queries], distances])
+            candidate_indices = np.hstack([best_indices[queries], np.broadcast_to(np.arange(start, end), distances.shape)])
+            if candidates.shape[1] > k:
+                nearest = np.argpartition(candidates, k - 1, axis=1)[:, :k]
+                candidates = np.take_along_axis(candidates, nearest, axis=1)
+                candidate_indices = np.take_along_axis(candidate_indices, nearest, axis=1)
+            best_distances[queries] = candidates
+            best_indices[queries] = candidate_indices
+
+        order = np.argsort(best_distances, axis=1)
+        return np.take_along_axis(best_distances, order, axis=1), np.take_along_axis(best_indices, order, axis=1)
+
+    # Distances and indices into the training set, as KNeighborsClassifier.kneighbors (-1 if fewer points were scanned)
+    def kneighbors(self, X):
+        distances, indices = self._search(X)
+        return np.sqrt(np.maximum(distances, 0)), np.where(indices >= 0, self.index_[indices], -1)
+
+    # Majority vote of the neighbours found, ties to the first class as in KNeighborsClassifier
+    def predict(self, X):
+        _, indices = self._search(X)
+        found = indices >= 0
+        votes = np.zeros((len(indices), len(self.classes_)), dtype=np.int64)
+        rows = np.broadcast_to(np.arange(len(indices))[:, None], indices.shape)
+        np.add.at(votes, (rows[found], self.labels_[indices[found]]), 1)
+        return self.classes_[votes.argmax(axis=1)]
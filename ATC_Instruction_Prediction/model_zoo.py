@@ -0,0 +1,188 @@
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
+import pickle
+import time
+
+import numpy as np
+
+from prediction_service import build_model
+from preprocessing import FeatureStore
+
+# Cross-validation of the notebook's classifiers, all models and folds in parallel:
+#   python model_zoo.py data.csv --folds 5 --workers 8
+# Every (model, fold) is one task in a process pool. A task uses MODEL_THREADS[model] threads (n_jobs and the
+# BLAS/OpenMP pools via threadpoolctl), and tasks are only started while their threads fit in the free cores,
+# so parallel models do not oversubscribe. Workers read the training set of the feature store as memory maps,
+# nothing large is pickled to them.
+# With resampling, SMOTE is applied to the training part of each fold only, the validation part stays untouched.
+# The result of every finished fold is saved below cache_dir, keyed by the dataset, the fold split and the model;
+# a rerun only trains the missing folds. The table has the mean (and std) over folds of the fit time,
+# predict latency (one batch of the fold, and single records), pickled model size and macro metrics.
+
+ZOO = ['knn', 'rf', 'lr', 'xgboost', 'adaboost', 'dt']
+
+# Threads per model, models not listed use one
+MODEL_THREADS = {'rf': 4, 'xgboost': 4}
+
+def _fold_path(cache_dir, store_path, name, num_folds, fold, resample, seed):
+    settings = json.dumps({'store': os.path.basename(store_path), 'model': name, 'folds': num_folds, 'resample': resample, 'seed': seed}, sort_keys=True)
+    return os.path.join(cache_dir, f"{name}_{hashlib.sha256(settings.encode()).hexdigest()[:12]}", f'fold_{fold}.json')
+
+def _run_fold(store_path, name, train_index, valid_index, threads, resample, seed, num_latency_samples=100):
+    from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score
+    from threadpoolctl import threadpool_limits
+
+    arrays, _ = FeatureStore.load(store_path)
+    x, y = arrays['x_train'], arrays['y_train']
+    x_train, y_train = x[train_index], y[train_index]
+    x_valid, y_valid = x[valid_index], y[valid_index]
+
+    with threadpool_limits(limits=threads):
+        if resample:
+            from imblearn.over_sampling import SMOTE
+            x_train, y_train = SMOTE(random_state=seed).fit_resample(x_train, y_train)
+
+        model = build_model(name, seed, n_jobs=threads)
+
+        start = time.perf_counter()
+        model.fit(x_train, y_train)
+        fit_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        y_pred = model.predict(x_valid)
+        batch_time = time.perf_counter() - start
+
+        # Single-record latency, as a request to the prediction service would see it
+        samples = x_valid[:num_latency_samples]
+        latencies = []
+        for i in range(len(samples)):
+            start = time.perf_counter()
+            model.predict(samples[i:i + 1])
+            latencies.append(time.perf_counter() - start)
+
+    return {
+        'fit_time': fit_time,
+        'predict_us_per_record': batch_time / len(valid_index) * 1e6,
+        'single_latency_ms': float(np.median(latencies)) * 1000,
+        'model_size_kib': len(pickle.dumps(model)) / 1024,
+        'accuracy': accuracy_score(y_valid, y_pred),
+        'precision_macro': precision_score(y_valid, y_pred, average='macro', zero_division=0),
+        'recall_macro': recall_score(y_valid, y_pred, average='macro', zero_division=0),
+        'f1_macro': f1_score(y_valid, y_pred, average='macro', zero_division=0),
+        'num_train': len(y_train),
+        'threads': threads,
+    }
+
+class ModelZoo:
+    def __init__(self, csv_path, models=ZOO, num_folds=5, n_workers=None, resample=True, seed=42,
+                 store='feature_store', cache_dir='zoo_cache', verbose=True):
+        self.csv_path = csv_path
+        self.models = list(models)
+        self.num_folds = num_folds
+        self.num_cores = n_workers or os.cpu_count()
+        self.resample = resample
+        self.seed = seed
+        self.store = FeatureStore(store)
+        self.cache_dir = cache_dir
+        self.verbose = verbose
+
+    # Stratified folds of the training split, the same for every model
+    def _folds(self, y):
+        from sklearn.model_selection import StratifiedKFold
+        return list(StratifiedKFold(n_splits=self.num_folds, shuffle=True, random_state=self.seed).split(np.zeros(len(y)), y))
+
+    # Returns {model: [result per fold]}, models whose package is missing are left out
+    def run(self):
+        # The zoo resamples per fold, the store entry without resampling is enough
+        arrays, _ = self.store.load_or_build(self.csv_path, seed=self.seed, resample=False, verbose=self.verbose)
+        store_path = self.store.path(self.csv_path, seed=self.seed, resample=False)
+        folds = self._folds(arrays['y_train'])
+
+        results = {}
+        tasks = []
+        for name in self.models:
+            try:
+                build_model(name, self.seed)
+            except ImportError as e:
+                print(f"Skipping {name}: {e}")
+                continue
+            results[name] = [None] * self.num_folds
+            for fold in range(self.num_folds):
+                path = _fold_path(self.cache_dir, store_path, name, self.num_folds, fold, self.resample, self.seed)
+                if os.path.exists(path):
+                    with open(path) as f:
+                        results[name][fold] = json.load(f)
+                else:
+                    tasks.append((name, fold, path))
+
+        if self.verbose:
+            cached = sum(result is not None for folds_results in results.values() for result in folds_results)
+            print(f"{len(tasks)} folds to train, {cached} cached, {self.num_cores} cores")
+
+        # Heaviest models first, so the single-threaded ones fill the gaps at the end
+        tasks.sort(key=lambda task: -MODEL_THREADS.get(task[0], 1))
+        free_cores = self.num_cores
+        running = {}
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.num_cores) as executor:
+            while tasks or running:
+                while tasks:
+                    threads = min(MODEL_THREADS.get(tasks[0][0], 1), self.num_cores)
+                    if threads > free_cores:
+                        break
+                    name, fold, path = tasks.pop(0)
+                    train_index, valid_index = folds[fold]
+                    future = executor.submit(_run_fold, store_path, name, train_index, valid_index, threads, self.resample, self.seed)
+                    running[future] = (name, fold, path, threads)
+                    free_cores -= threads
+
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    name, fold, path, threads = running.pop(future)
+                    free_cores += threads
+                    result = future.result()
+                    results[name][fold] = result
+                    # Written to a temporary file and renamed, an interrupted run leaves no partial fold behind
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with open(path + '.tmp', 'w') as f:
+                        json.dump(result, f)
+                    os.replace(path + '.tmp', path)
+                    if self.verbose:
+                        print(f"{name} fold {fold}: f1_macro {result['f1_macro']:.4f}, fit {result['fit_time']:.1f} sec")
+        return results
+
+# One row per model: mean over folds of every metric, and the std of the macro F1
+def results_table(results):
+    import pandas as pd
+
+    rows = []
+    for name, folds in results.items():
+        frame = pd.DataFrame(folds)
+        row = {'model': name}
+        row.update(frame.drop(columns=['num_train', 'threads']).mean().to_dict())
+        row['f1_macro_std'] = frame['f1_macro'].std()
+        row['threads'] = int(frame['threads'].iloc[0])
+        rows.append(row)
+    return pd.DataFrame(rows).set_index('model').sort_values('f1_macro', ascending=False)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('csv', help="e.g. RealWorld_ATC_Decision_Dataset_Enhanced3.csv")
+    parser.add_argument('--models', nargs='+', default=ZOO)
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=None, help="Cores to use, default all")
+    parser.add_argument('--no-resample', action='store_true', help="Train without SMOTE")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--store', default='feature_store')
+    parser.add_argument('--cache-dir', default='zoo_cache')
+    parser.add_argument('--output', default='zoo_results.csv')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    zoo = ModelZoo(args.csv, args.models, args.folds, args.workers, not args.no_resample, args.seed, args.store, args.cache_dir)
+    table = results_table(zoo.run())
+    table.to_csv(args.output)
+    print(table.to_string(float_format=lambda value: f'{value:.4g}'))
+    print(f"Done in {time.perf_counter() - start:.1f} sec, saved to {args.output}")
@@ -0,0 +1,265 @@
+import argparse
+import collections
+import json
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from preprocessing import ATCPreprocessor, FeatureStore, read_dataset
+
+# ATC_Instruction prediction outside the notebook: the notebook's classifiers are trained on the feature store
+# (preprocessing.py) and saved together with their fitted preprocessor, one directory per model:
+#   models/<name>/model.joblib, preprocessor.json, meta.json
+# ATCPredictor loads such a directory and predicts instructions for raw flight records (the CSV columns), one or
+# many per call, encoding them with one vectorized transform. It keeps per-request and per-record latencies.
+# KNN is the notebook's exact brute-force search. knn_ivf searches an approximate IVF index (knn_index.py) instead,
+# knn_ivf_<n_probe> with another number of cells scanned per query; benchmark reports its recall@k and agreement
+# with the exact predictions, to choose n_probe on the actual data before serving it. KD and ball trees are exact too.
+#   python prediction_service.py train data.csv --model knn
+#   python prediction_service.py serve --model knn --port 8001
+#   python prediction_service.py benchmark data.csv
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+
+# n_jobs: threads of the models that have them (KNN searches, forest, XGBoost)
+def build_model(name, seed=42, n_jobs=1):
+    if name == 'knn':
+        name = 'knn_brute'
+    if name.startswith('knn_ivf'):
+        from knn_index import IVFKNeighborsClassifier
+        n_probe = int(name[len('knn_ivf_'):]) if name != 'knn_ivf' else 16
+        return IVFKNeighborsClassifier(n_probe=n_probe, random_state=seed)
+    if name.startswith('knn_'):
+        from sklearn.neighbors import KNeighborsClassifier
+        return KNeighborsClassifier(algorithm=name[len('knn_'):], n_jobs=n_jobs)
+    if name == 'rf':
+        from sklearn.ensemble import RandomForestClassifier
+        return RandomForestClassifier(n_estimators=100, random_state=seed, n_jobs=n_jobs)
+    if name == 'lr':
+        from sklearn.linear_model import LogisticRegression
+        return LogisticRegression(max_iter=1000)
+    if name == 'xgboost':
+        from xgboost import XGBClassifier
+        return XGBClassifier(tree_method='hist', random_state=seed, n_jobs=n_jobs)
+    if name == 'adaboost':
+        from sklearn.ensemble import AdaBoostClassifier
+        return AdaBoostClassifier(random_state=seed)
+    if name == 'dt':
+        from sklearn.tree import DecisionTreeClassifier
+        return DecisionTreeClassifier(random_state=seed)
+    raise ValueError(f"Unknown model {name}")
+
+MODEL_NAMES = ['knn', 'knn_ivf', 'knn_ball_tree', 'knn_kd_tree', 'rf', 'lr', 'xgboost', 'adaboost', 'dt']
+
+# Fits the model on the (resampled, if present) training set of a feature store entry and saves it to path
+def train(name, arrays, preprocessor, path, seed=42):
+    x_train = arrays.get('x_train_resampled', arrays['x_train'])
+    y_train = arrays.get('y_train_resampled', arrays['y_train'])
+    model = build_model(name, seed)
+
+    start = time.perf_counter()
+    model.fit(np.asarray(x_train), np.asarray(y_train))
+    fit_time = time.perf_counter() - start
+    accuracy = float((model.predict(np.asarray(arrays['x_test'])) == arrays['y_test']).mean())
+
+    os.makedirs(path, exist_ok=True)
+    joblib.dump(model, os.path.join(path, 'model.joblib'))
+    preprocessor.save(os.path.join(path, 'preprocessor.json'))
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump({'model': name, 'fit_time': fit_time, 'test_accuracy': accuracy, 'num_train': len(y_train)}, f, indent=2)
+    return model
+
+# Models are built with n_jobs=1: for the small batches of a service, fanning out to a thread pool costs more than it saves
+class ATCPredictor:
+    def __init__(self, model, preprocessor, latency_window=10_000):
+        self.model = model
+        self.preprocessor = preprocessor
+
+        # Metrics
+        self.num_requests = 0
+        self.num_records = 0
+        self._latencies = collections.deque(maxlen=latency_window) # Per request, seconds
+        self._record_latencies = collections.deque(maxlen=latency_window) # Per record of a request, seconds
+
+    @classmethod
+    def load(cls, path):
+        model = joblib.load(os.path.join(path, 'model.joblib'))
+        return cls(model, ATCPreprocessor.load(os.path.join(path, 'preprocessor.json')))
+
+    # records: one flight as a dict, a list of dicts or a DataFrame with the CSV columns.
+    # Returns the instructions (a list, a single string for a dict) and the latency of the call in seconds.
+    # A missing column raises a KeyError, an unknown category a ValueError.
+    def predict(self, records):
+        start = time.perf_counter()
+        single = isinstance(records, dict)
+        if single:
+            records = [records]
+        num_records = len(records)
+        if num_records == 0:
+            return [], 0.0
+        if not isinstance(records, pd.DataFrame):
+            # Columns as lists: for request-sized batches much cheaper than a DataFrame
+            records = {column: [record[column] for record in records] for column in records[0]}
+
+        x = self.preprocessor.transform(records)
+        instructions = self.preprocessor.decode_target(self.model.predict(x)).tolist()
+
+        latency = time.perf_counter() - start
+        self.num_requests += 1
+        self.num_records += num_records
+        self._latencies.append(latency)
+        self._record_latencies.append(latency / max(num_records, 1))
+        return (instructions[0] if single else instructions), latency
+
+    def metrics(self):
+        latencies = np.array(self._latencies) * 1000
+        record_latencies = np.array(self._record_latencies) * 1000
+        return {
+            'requests': self.num_requests,
+            'records': self.num_records,
+            'latency_p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+            'latency_p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else 0.0,
+            'record_latency_p50_ms': float(np.percentile(record_latencies, 50)) if len(record_latencies) else 0.0,
+        }
+
+# POST /predict {"flight": {...}} -> {"instruction", "latency_ms"}
+# POST /predict {"flights": [{...}, ...]} -> {"instructions", "latency_ms", "latency_per_record_ms"}
+def create_app(predictor):
+    from fastapi import FastAPI
+    from fastapi.responses import JSONResponse
+
+    app = FastAPI()
+
+    # A plain def endpoint: FastAPI runs it in its thread pool, the event loop stays free during the predict
+    @app.post('/predict')
+    def predict(body: dict):
+        try:
+            if 'flight' in body:
+                instruction, latency = predictor.predict(body['flight'])
+                return {'instruction': instruction, 'latency_ms': latency * 1000}
+            if 'flights' not in body:
+                return JSONResponse({'error': "Expected 'flight' or 'flights'"}, status_code=400)
+            flights = body['flights']
+            instructions, latency = predictor.predict(flights)
+            return {'instructions': instructions, 'latency_ms': latency * 1000,
+                    'latency_per_record_ms': latency * 1000 / max(len(flights), 1)}
+        except KeyError as e:
+            return JSONResponse({'error': f"Missing {e}"}, status_code=400)
+        except ValueError as e:
+            return JSONResponse({'error': str(e)}, status_code=400)
+
+    @app.get('/metrics')
+    async def metrics():
+        return predictor.metrics()
+
+    return app
+
+# Recall@k of the neighbours an approximate KNN finds, and how often its predictions agree with the exact
+# brute-force KNN, over the given queries
+def knn_quality(model, x_train, y_train, x_queries):
+    from sklearn.neighbors import KNeighborsClassifier
+
+    exact = KNeighborsClassifier(n_neighbors=model.n_neighbors, algorithm='brute').fit(x_train, y_train)
+    _, exact_indices = exact.kneighbors(x_queries)
+    _, indices = model.kneighbors(x_queries)
+    found = sum(len(np.intersect1d(row, exact_row)) for row, exact_row in zip(indices, exact_indices))
+    return {
+        'recall_at_k': found / exact_indices.size,
+        'agreement': float((model.predict(x_queries) == exact.predict(x_queries)).mean()),
+    }
+
+# Records per second of each model through ATCPredictor (preprocessing included), per batch size.
+# Approximate KNN models also get knn_quality over num_quality_queries test rows.
+# Models whose package is missing (xgboost) are skipped.
+def benchmark(csv_path, model_names=MODEL_NAMES, batch_sizes=(1, 64, 4096), num_records=4096, store='feature_store', seed=42,
+              resample=True, num_quality_queries=2000):
+    arrays, preprocessor = FeatureStore(store).load_or_build(csv_path, seed=seed, resample=resample, verbose=True)
+    records = read_dataset(csv_path).sample(num_records, random_state=seed, replace=True).reset_index(drop=True)
+    x_queries = np.asarray(arrays['x_test'][:num_quality_queries])
+
+    results = {}
+    for name in model_names:
+        try:
+            model = build_model(name, seed)
+        except ImportError as e:
+            print(f"Skipping {name}: {e}")
+            continue
+        x_train = np.asarray(arrays.get('x_train_resampled', arrays['x_train']))
+        y_train = np.asarray(arrays.get('y_train_resampled', arrays['y_train']))
+        start = time.perf_counter()
+        model.fit(x_train, y_train)
+        predictor = ATCPredictor(model, preprocessor)
+        results[name] = {'fit_time': time.perf_counter() - start,
+                         'accuracy': float((model.predict(np.asarray(arrays['x_test'])) == arrays['y_test']).mean())}
+        if name.startswith('knn_ivf'):
+            results[name].update(knn_quality(model, x_train, y_train, x_queries))
+
+        for batch_size in batch_sizes:
+            # At most num_records records per batch size, at least one batch
+            num_batches = max(num_records // batch_size, 1)
+            batches = [records.iloc[i * batch_size % num_records:][:batch_size] for i in range(num_batches)]
+            predictor.predict(batches[0]) # Warm-up
+            start = time.perf_counter()
+            for batch in batches:
+                predictor.predict(batch)
+            elapsed = time.perf_counter() - start
+            results[name][batch_size] = {
+                'records_per_sec': sum(len(batch) for batch in batches) / elapsed,
+                'latency_ms': elapsed / num_batches * 1000,
+            }
+    return results
+
+def format_benchmark(results):
+    batch_sizes = sorted({key for result in results.values() for key in result if isinstance(key, int)})
+    lines = [f"{'model':<14} {'fit (s)':>8} {'accuracy':>8} {'recall@k':>8} {'agree':>6}"
+             + ''.join(f" {f'batch {b} rec/s':>16} {'ms/batch':>9}" for b in batch_sizes)]
+    for name, result in results.items():
+        line = f"{name:<14} {result['fit_time']:>8.2f} {result['accuracy']:>8.3f}"
+        if 'recall_at_k' in result:
+            line += f" {result['recall_at_k']:>8.3f} {result['agreement']:>6.3f}"
+        else:
+            line += f" {'-':>8} {'-':>6}"
+        for batch_size in batch_sizes:
+            line += f" {result[batch_size]['records_per_sec']:>16,.0f} {result[batch_size]['latency_ms']:>9.2f}"
+        lines.append(line)
+    return '\n'.join(lines)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    train_parser = subparsers.add_parser('train', help="Train a model on the feature store and save it to models/")
+    train_parser.add_argument('csv')
+    train_parser.add_argument('--model', choices=MODEL_NAMES, default='knn')
+    train_parser.add_argument('--store', default='feature_store')
+    train_parser.add_argument('--seed', type=int, default=42)
+    train_parser.add_argument('--no-resample', action='store_true', help="Train without SMOTE")
+
+    serve_parser = subparsers.add_parser('serve', help="Serve a saved model over HTTP")
+    serve_parser.add_argument('--model', default='knn', help="Name of a directory in models/, or a path")
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8001)
+
+    benchmark_parser = subparsers.add_parser('benchmark', help="Compare throughput of the models")
+    benchmark_parser.add_argument('csv')
+    benchmark_parser.add_argument('--models', nargs='+', default=MODEL_NAMES)
+    benchmark_parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 64, 4096])
+    benchmark_parser.add_argument('--store', default='feature_store')
+    benchmark_parser.add_argument('--no-resample', action='store_true', help="Train without SMOTE")
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        arrays, preprocessor = FeatureStore(args.store).load_or_build(args.csv, seed=args.seed, resample=not args.no_resample, verbose=True)
+        path = os.path.join(MODELS_DIR, args.model)
+        train(args.model, arrays, preprocessor, path, args.seed)
+        with open(os.path.join(path, 'meta.json')) as f:
+            print(f"Saved to {path}: {json.load(f)}")
+    elif args.command == 'serve':
+        import uvicorn
+        path = args.model if os.path.isdir(args.model) else os.path.join(MODELS_DIR, args.model)
+        uvicorn.run(create_app(ATCPredictor.load(path)), host=args.host, port=args.port)
+    else:
+        print(format_benchmark(benchmark(args.csv, args.models, args.batch_sizes, store=args.store, resample=not args.no_resample)))
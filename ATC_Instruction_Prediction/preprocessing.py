@@ -0,0 +1,263 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+# Preprocessing of RealWorld_ATC_Decision_Dataset_Enhanced3.csv as done in ATC_Instruction_Prediction_main.ipynb,
+# fitted once and reused:
+#   read_dataset:     chunked C-engine CSV parsing with declared dtypes, categories for the text columns
+#   ATCPreprocessor:  the notebook's encoding (get_dummies, binary maps, LabelEncoder, StandardScaler) fitted on the
+#                     training rows and applied identically to any rows in one vectorized transform(), saved as JSON
+#   FeatureStore:     the encoded train/test matrices, SMOTE-resampled training set included, cached on disk
+#                     per dataset hash and settings, loaded as memory maps
+# Numeric features are standardized before SMOTE, so its nearest neighbours are not dominated by large-scale columns.
+
+TARGET = 'ATC_Instruction'
+DROPPED = ['Flight_ID', 'Out_of_Gate_Time']
+
+NUMERIC_DTYPES = {
+    'Current_Altitude_ft': 'int32',
+    'Current_Speed_knots': 'int32',
+    'Heading_degrees': 'int32',
+    'Vertical_Speed_ft_per_min': 'int32',
+    'Fuel_Remaining_kg': 'float64',
+    'MST_minutes': 'float64',
+    'Wind_Speed_knots': 'float64',
+    'Wind_Direction_degrees': 'int32',
+    'Visibility_meters': 'int32',
+    'Precipitation_mm': 'float64',
+    'Temperature_C': 'float64',
+    'Aircraft_in_Holding': 'int32',
+    'ATC_Workload': 'int32',
+    'Available_Parking_Spots': 'int32',
+    'Parking_Occupancy_Time_minutes': 'int32',
+    'Taxiing_Rate_knots': 'float64',
+    'Arrival_Time_Diff_minutes': 'int32',
+    'Distance_to_Destination_nm': 'float64',
+    'Delay_Cost': 'float64',
+}
+
+CATEGORICAL_COLUMNS = ['Runway_Conditions', 'Runway_Availability', 'Time_of_Day', 'Aircraft_Type_Model', 'Flight_Route_Complexity']
+
+# Columns encoded as in the notebook
+ONE_HOT = ['Flight_Route_Complexity', 'Aircraft_Type_Model'] # get_dummies
+ONE_HOT_DROPPED = {'Flight_Route_Complexity': ['Multiple Waypoints']} # Redundant dummy columns the notebook drops
+BINARY_MAPS = {
+    'Runway_Availability': ('Runway_availability_Encoded', {'Closed': 0, 'Open': 1}),
+    'Time_of_Day': ('Time_of_Day_Encoded', {'Off-Peak': 0, 'Peak': 1}),
+}
+LABEL_ENCODED = {'Runway_Conditions': 'Runway_Conditions_Encoded'} # LabelEncoder, i.e. sorted categories
+
+def read_dataset(path, chunksize=100_000, usecols=None):
+    dtypes = dict(NUMERIC_DTYPES)
+    dtypes.update({column: 'category' for column in CATEGORICAL_COLUMNS + [TARGET]})
+    dtypes.update({'Flight_ID': 'int64', 'Out_of_Gate_Time': 'string'})
+    if usecols is None:
+        usecols = [column for column in dtypes if column not in DROPPED]
+    chunks = pd.read_csv(path, dtype={column: dtypes[column] for column in usecols if column in dtypes},
+                         usecols=usecols, chunksize=chunksize, engine='c')
+    # Category columns of different chunks are merged by union_categoricals
+    return pd.concat(chunks, ignore_index=True).astype({column: 'category' for column in usecols
+                                                        if column in CATEGORICAL_COLUMNS + [TARGET]})
+
+# SHA-256 of the file contents
+def dataset_hash(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class ATCPreprocessor:
+    def __init__(self):
+        self.numeric_columns = []
+        self.categories = {}
+        self.mean = None
+        self.scale = None
+        self.classes = None
+        self._indexes = {} # Lookup index per category list, built on first use
+
+    def fit(self, df):
+        self.numeric_columns = [column for column in NUMERIC_DTYPES if column in df.columns]
+        self.categories = {column: sorted(str(value) for value in pd.unique(df[column].dropna())) for column in ONE_HOT + list(LABEL_ENCODED)}
+
+        numeric = df[self.numeric_columns].to_numpy(dtype=np.float64)
+        self.mean = numeric.mean(axis=0)
+        # StandardScaler leaves constant columns unscaled
+        self.scale = numeric.std(axis=0)
+        self.scale[self.scale == 0] = 1.0
+
+        if TARGET in df.columns:
+            self.classes = sorted(str(value) for value in pd.unique(df[TARGET].dropna()))
+        return self
+
+    @property
+    def feature_names(self):
+        names = list(self.numeric_columns)
+        for column in ONE_HOT:
+            dropped = ONE_HOT_DROPPED.get(column, [])
+            names += [f'{column}_{value}' for value in self.categories[column] if value not in dropped]
+        names += [name for name, _ in BINARY_MAPS.values()]
+        names += list(LABEL_ENCODED.values())
+        return names
+
+    # Rows to a float32 feature matrix with the columns of feature_names. df is a DataFrame or any mapping of
+    # column name to values, e.g. {column: [value per row]}, which saves building a DataFrame for a few rows.
+    # Unseen one-hot categories encode as all zeros, other unknown values raise a ValueError.
+    def transform(self, df):
+        numeric = np.column_stack([np.asarray(df[column], dtype=np.float64) for column in self.numeric_columns])
+        blocks = [((numeric - self.mean) / self.scale).astype(np.float32)]
+
+        for column in ONE_HOT:
+            categories = [value for value in self.categories[column] if value not in ONE_HOT_DROPPED.get(column, [])]
+            codes = self._codes(df[column], categories)
+            blocks.append((codes[:, None] == np.arange(len(categories))).astype(np.float32))
+
+        for column, (_, mapping) in BINARY_MAPS.items():
+            values = list(mapping)
+            codes = self._codes(df[column], values)
+            _check_known(column, codes)
+            blocks.append(np.array([mapping[value] for value in values], dtype=np.float32)[codes][:, None])
+
+        for column in LABEL_ENCODED:
+            codes = self._codes(df[column], self.categories[column])
+            _check_known(column, codes)
+            blocks.append(codes.astype(np.float32)[:, None])
+
+        return np.hstack(blocks)
+
+    # Position of every value in categories, -1 for values not in it
+    def _codes(self, values, categories):
+        key = tuple(categories)
+        if key not in self._indexes:
+            self._indexes[key] = pd.Index(categories)
+        return self._indexes[key].get_indexer(np.asarray(values, dtype=object).astype(str))
+
+    def encode_target(self, y):
+        codes = self._codes(y, self.classes)
+        _check_known(TARGET, codes)
+        return codes.astype(np.int64)
+
+    def decode_target(self, codes):
+        return np.asarray(self.classes, dtype=object)[np.asarray(codes)]
+
+    def to_dict(self):
+        return {
+            'numeric_columns': self.numeric_columns,
+            'categories': self.categories,
+            'mean': self.mean.tolist(),
+            'scale': self.scale.tolist(),
+            'classes': self.classes,
+        }
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        preprocessor = cls()
+        preprocessor.numeric_columns = data['numeric_columns']
+        preprocessor.categories = data['categories']
+        preprocessor.mean = np.array(data['mean'])
+        preprocessor.scale = np.array(data['scale'])
+        preprocessor.classes = data['classes']
+        return preprocessor
+
+def _check_known(column, codes):
+    if (codes < 0).any():
+        raise ValueError(f"Unknown value in {column}")
+
+FEATURE_FILES = ('x_train', 'y_train', 'x_test', 'y_test', 'x_train_resampled', 'y_train_resampled')
+
+class FeatureStore:
+    # One directory per dataset hash and settings below root, with the arrays of FEATURE_FILES as .npy,
+    # preprocessor.json and meta.json
+    def __init__(self, root='feature_store'):
+        self.root = root
+
+    @staticmethod
+    def key(data_hash, test_size, seed, resample):
+        settings = json.dumps({'test_size': test_size, 'seed': seed, 'resample': resample}, sort_keys=True)
+        return f"{data_hash[:16]}_{hashlib.sha256(settings.encode()).hexdigest()[:8]}"
+
+    def path(self, csv_path, test_size=0.3, seed=42, resample=True):
+        return os.path.join(self.root, self.key(dataset_hash(csv_path), test_size, seed, resample))
+
+    # Returns ({name: array}, preprocessor), building and saving the features on the first call for a dataset
+    def load_or_build(self, csv_path, test_size=0.3, seed=42, resample=True, verbose=False):
+        path = self.path(csv_path, test_size, seed, resample)
+        if os.path.exists(os.path.join(path, 'meta.json')):
+            if verbose:
+                print(f"Loading features from {path}")
+            return self.load(path)
+
+        start = time.perf_counter()
+        arrays, preprocessor = build_features(csv_path, test_size, seed, resample)
+
+        # Written next to the target and renamed, so a store entry is either complete or absent
+        tmp_path = path + '.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_path, f'{name}.npy'), array)
+        preprocessor.save(os.path.join(tmp_path, 'preprocessor.json'))
+        with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+            json.dump({'dataset': os.path.abspath(csv_path), 'test_size': test_size, 'seed': seed, 'resample': resample,
+                       'feature_names': preprocessor.feature_names, 'build_time': time.perf_counter() - start}, f, indent=2)
+        os.replace(tmp_path, path)
+        if verbose:
+            print(f"Built features in {time.perf_counter() - start:.1f} sec, saved to {path}")
+        return self.load(path)
+
+    # Arrays of a store entry as read-only memory maps, and its preprocessor
+    @staticmethod
+    def load(path):
+        arrays = {}
+        for name in FEATURE_FILES:
+            file_path = os.path.join(path, f'{name}.npy')
+            if os.path.exists(file_path):
+                arrays[name] = np.load(file_path, mmap_mode='r')
+        return arrays, ATCPreprocessor.load(os.path.join(path, 'preprocessor.json'))
+
+# The notebook's train/test split and preprocessing, without the caching
+def build_features(csv_path, test_size=0.3, seed=42, resample=True):
+    from sklearn.model_selection import train_test_split
+
+    df = read_dataset(csv_path)
+    train, test = train_test_split(df, test_size=test_size, random_state=seed)
+    preprocessor = ATCPreprocessor().fit(train)
+
+    arrays = {
+        'x_train': preprocessor.transform(train),
+        'y_train': preprocessor.encode_target(train[TARGET]),
+        'x_test': preprocessor.transform(test),
+        'y_test': preprocessor.encode_target(test[TARGET]),
+    }
+    if resample:
+        from imblearn.over_sampling import SMOTE
+        arrays['x_train_resampled'], arrays['y_train_resampled'] = SMOTE(random_state=seed).fit_resample(arrays['x_train'], arrays['y_train'])
+    return arrays, preprocessor
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('csv', help="e.g. RealWorld_ATC_Decision_Dataset_Enhanced3.csv")
+    parser.add_argument('--store', default='feature_store')
+    parser.add_argument('--test-size', type=float, default=0.3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--no-resample', action='store_true', help="Skip SMOTE")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    arrays, preprocessor = FeatureStore(args.store).load_or_build(args.csv, args.test_size, args.seed, not args.no_resample, verbose=True)
+    print(f"Ready in {time.perf_counter() - start:.2f} sec")
+    for name, array in arrays.items():
+        print(f"  {name}: {array.shape}")
+    print(f"{len(preprocessor.feature_names)} features, classes {preprocessor.classes}")
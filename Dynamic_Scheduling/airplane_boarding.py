@@ -4,11 +4,13 @@ from gymnasium.envs.registration import register
 from enum import Enum
 import numpy as np
 
+from scenario_bank import ScenarioBank, sample_scenarios
+
 # Register this module as a gym environment. Once registered, the id is usable in gym.make().
 # When running this code, you can ignore this warning: "UserWarning: WARN: Overriding environment airplane-boarding-v0 already in registry."
 register(
-    id='dynamic_scheduling-v0',
-    entry_point='dynamic_scheduling:AirportEnv', # module_name:class_name
+    id='airplane-boarding-v0',
+    entry_point='airplane_boarding:AirplaneEnv', # module_name:class_name
 )
 
 class PlaneStatus(Enum):
@@ -17,7 +19,7 @@ class PlaneStatus(Enum):
     LANDING = 2
     LANDED  = 3
 
-    # Returns the string representation of the PassengerStatus enum.
+    # Returns the string representation of the PlaneStatus enum.
     def __str__(self):
         match self:
             case PlaneStatus.APPROACHING:
@@ -29,310 +31,207 @@ class PlaneStatus(Enum):
             case PlaneStatus.LANDED:
                 return "LANDED"
 
-class Plane:
-    def __init__(self, seat_num, row_num):
-        self.seat_num = seat_num
-        self.row_num = row_num
-        self.low_fuel = np.random.choice([True, False], p = [0.3, 0.7])
-        self.is_holding_luggage = True
-        self.status = PlaneStatus.MOVING
-        self.MST = np.random.choice([5, 10, 15], p = [0.15, 0.15, 0.7])
-        self.in_transit = np.random.choice([True, False], p = [0.1, 0.9])
-        self.seated_timer = 0
-        
-        if self.in_transit or self.MST in [5, 10] or self.low_fuel == True:
-            self.high_priority = True
-
-        else:
-            self.high_priority =  False
-
-        
-
-
-    # Returns the string representation of the Passenger class i.e. 2 digit seat number
-    def __str__(self):
-        if self.high_priority == True:    
-            return f"H{self.seat_num:02d}"
-        else:
-            return f"L{self.seat_num:02d}"
-
-class Row:
-    def __init__(self, row_num, seats_per_row):
-        self.row_num = row_num
-        self.passengers = [Plane(row_num * seats_per_row + i, row_num) for i in range(seats_per_row)]
-
-class Approach:
-    def __init__(self, num_of_rows, seats_per_row):
-        self.num_of_rows = num_of_rows
-        self.seats_per_row = seats_per_row
-        self.lobby_rows = [Row(row_num, self.seats_per_row) for row_num in range(self.num_of_rows)]
-
-    def remove_plane(self, row_num):
-        passenger = self.lobby_rows[row_num].passengers.pop()
-        return passenger
-    
-    def remove_plane_by_ID(self, seat_num):
-        for row in self.lobby_rows:
-            for i, passenger in enumerate(row.passengers):
-                if passenger is not None and passenger.seat_num == seat_num:
-                    removed_passenger = passenger
-                    row.passengers[i] = None
-                    return removed_passenger
-
-
-    def count_passengers(self):
-        count = 0
-        for row in self.lobby_rows:
-            for passenger in row.passengers:
-                if passenger is not None:
-                    count += 1
-
-        return count
-    
-    def num_high_priority_passengers_in_lobby(self):
-        count = 0
-        for row in self.lobby_rows:
-            for passenger in row.passengers:
-                if passenger is not None and passenger.high_priority == True:
-                    count += 1
-
-        return count
-    
-    def num_low_priority_passengers_in_lobby(self):
-        count = 0
-        for row in self.lobby_rows:
-            for passenger in row.passengers:
-                if  passenger is not None and passenger.high_priority == False:
-                    count += 1
-
-        return count
-
-class BoardingLine:
-    def __init__(self, num_of_rows):
-        # Initialize the aisle
-        self.num_of_rows = num_of_rows
-        self.line = [None for i in range(num_of_rows)]
-
-    def add_passenger(self, passenger):
-        self.line.append(passenger)
-
-    def is_onboarding(self):
-        if (len(self.line) > 0 and not all(passenger is None for passenger in self.line)):
-            return True
-
-        return False
-
-    def num_passengers_stalled(self):
-        count = 0
-        for passenger in self.line:
-            if passenger is not None and passenger.status == PassengerStatus.STALLED and passenger.fuel_level == False:
-                count += 1
-
-        return count
-    
-    def passenger_fuel_level(self):
-        count = 0
-        for passenger in self.line:
-            if passenger is not None and passenger.low_fuel == True:
-                count += 1
-
-        return count
-    
-    def num_passengers_seated(self):
-        count = 0
-        for passenger in self.line:
-            if passenger is not None and passenger.status == PassengerStatus.SEATED and passenger.fuel_level == False:
-                count += 1
-
-        return count
-    
-
-    
-    
-
-    def move_forward(self):
-
-        for i, passenger in enumerate(self.line):
-            # Skip, if no passenger in that spot or
-            #   passenger is at the front of the line or
-            #   passenger is stowing luggage
-            if passenger is None or i==0 or passenger.status == PassengerStatus.STOWING:
-                continue
-
-            # Move passenger forward, if no one is blocking
-            if (passenger.status == PassengerStatus.STALLED or passenger.status == PassengerStatus.MOVING) and self.line[i-1] is None:
-                passenger.status = PassengerStatus.MOVING
-                self.line[i-1] = passenger
-                self.line[i] = None
-            else:
-                passenger.status = PassengerStatus.STALLED
-
-        # Truncate the empty spots at the end of the line
-        for i in range(len(self.line)-1, self.num_of_rows-1, -1):
-            if self.line[i] is None:
-                self.line.pop(i)
-
-class Seat:
-    def __init__(self, seat_num, row_num):
-        self.seat_num = seat_num
-        self.row_num = row_num
-        self.passenger = None
-
-    # Attempt to sit passenger
-    def seat_passenger(self, passenger: Passenger):
-
-        assert self.seat_num == passenger.seat_num, "Seat number does not match Passenger's seat number"
-
-
-        # if passenger.seat_num > 5:
-        #     passenger.seat_num = passenger.seat_num - 5
-
-        # if passenger.row_num > 1:
-        #     passenger.row_num = passenger.row_num - 1
-
-
-
-        if passenger.is_holding_luggage:
-            # Passenger starts Stowing luggage
-            passenger.status = PassengerStatus.STOWING
-            passenger.is_holding_luggage = False
-            return False
-        else:
-            # Sit passenger in seat
-            self.passenger = passenger
-            self.passenger.status = PassengerStatus.SEATED
-            return True
-        
-    def empty_seat(self, passenger: Passenger):
-        if passenger.status == PassengerStatus.SEATED:
-            self.passenger = None
-
-
-    def __str__(self):
-        if self.passenger is None:
-            return f"S{self.seat_num:02d}"
-        else:
-            if self.passenger.high_priority == True: 
-                return f"H{self.seat_num:02d}"
-            else:
-                return f"L{self.seat_num:02d}"
-
-
-class AirplaneRow:
-    def __init__(self, row_num, seats_per_row):
-        self.row_num = row_num
-        self.seats = [Seat(row_num * seats_per_row + i, row_num) for i in range(seats_per_row)]
+# Values stored in AirplaneEnv.position for planes that are not in the landing line.
+# Planes in the landing line store their slot index (0 is the front of the line).
+IN_APPROACH = -1
+LANDED = -2
 
-    def try_sit_passenger(self, passenger: Passenger):
-        # Check if passenger's seat is in this row
-        found_seats = list(filter(lambda seats: seats.seat_num == passenger.seat_num, self.seats))
-
-        if found_seats:
-            found_seat: Seat = found_seats[0]
-            return found_seat.seat_passenger(passenger)
-
-        return False
+# Marks a free slot in the landing line and an empty entry in the observation.
+EMPTY = -1
 
+# PlaneStatus values as stored in AirplaneEnv.status
+_APPROACHING = PlaneStatus.APPROACHING.value
+_SLOWINGDOWN = PlaneStatus.SLOWINGDOWN.value
+_LANDING = PlaneStatus.LANDING.value
+_LANDED = PlaneStatus.LANDED.value
 
 class AirplaneEnv(gym.Env):
     metadata = {'render_modes': ['human','terminal'], 'render_fps': 1}
 
-    def __init__(self, render_mode=None, num_of_rows=3, seats_per_row=5, num_of_plane_rows = 1):
+    # num_of_rows * seats_per_row planes arrive, num_of_plane_rows service stations (runways) land them.
+    # Only the first num_of_visible_planes planes still in the approach are observed and can be chosen,
+    # a slot is refilled with the next arriving plane when its plane leaves the approach. This keeps the
+    # observation and action space fixed, so a policy trained on 20 planes can sequence hundreds of them:
+    #   AirplaneEnv(num_of_rows=20, seats_per_row=10, num_of_plane_rows=4, num_of_visible_planes=20)
+    # By default every plane is visible, and a plane's approach slot is its ID.
+    # Traffic is sampled with the generator seeded by reset(seed=...), or taken from a scenario_bank
+    # (a ScenarioBank or the path of one, see scenario_bank.py): reset(options={'scenario': index}) loads that
+    # scenario, without an index one is picked with the seeded generator.
+    def __init__(self, render_mode=None, num_of_rows=3, seats_per_row=5, num_of_plane_rows = 1, num_of_visible_planes=None, scenario_bank=None):
 
         self.seats_per_row = seats_per_row
         self.num_of_rows = num_of_rows
         self.num_of_seats = num_of_rows * seats_per_row
         self.num_of_plane_rows = num_of_plane_rows
+        if num_of_visible_planes is None:
+            num_of_visible_planes = self.num_of_seats
+        self.num_of_visible_planes = min(num_of_visible_planes, self.num_of_seats)
 
         self.render_mode = render_mode
 
-        # Define the Action space.
-        self.action_space = spaces.Discrete(self.num_of_seats)
+        if isinstance(scenario_bank, str):
+            scenario_bank = ScenarioBank(scenario_bank)
+        assert scenario_bank is None or scenario_bank.num_planes == self.num_of_seats, "Scenarios have a different number of planes"
+        self.scenario_bank = scenario_bank
+        self.scenario_index = None
+
+        # Define the Action space, one action per approach slot.
+        self.action_space = spaces.Discrete(self.num_of_visible_planes)
 
         # Define the Observation space.
         # The observation space is used to validate the observation returned by reset() and step().
         # [0,1,1,0,-1,-1....,6,0,7,1.....]
         self.observation_space = spaces.Box(
             low=-1,
-            high=self.num_of_seats-1,
-            shape=(self.num_of_seats * 2,),
+            high=self.num_of_visible_planes-1,
+            shape=(self.num_of_visible_planes * 2,),
             dtype=np.int32
         )
 
+        # Per-plane state, one entry per plane, indexed by plane ID. Planes arrive in ID order.
+        # The traffic attributes are views of the current scenario, the other arrays are updated in place.
+        n = self.num_of_seats
+        k = self.num_of_visible_planes
+        self.plane_id = np.arange(n, dtype=np.int32)
+        # Service station the plane lands at. The original Plane objects used their row (plane_id // seats_per_row)
+        # as station, so planes of rows >= num_of_plane_rows never matched a station and could not land; the modulo
+        # wraps them around the stations. With num_of_rows <= num_of_plane_rows (e.g. the trained 4 rows, 4 stations)
+        # the assignment is the original one.
+        self.plane_row = (self.plane_id // seats_per_row) % num_of_plane_rows
+        self.low_fuel = np.zeros(n, dtype=bool)
+        self.MST = np.zeros(n, dtype=np.int32)
+        self.in_transit = np.zeros(n, dtype=bool)
+        self.high_priority = np.zeros(n, dtype=bool)
+        self.is_holding_luggage = np.ones(n, dtype=bool)
+        self.status = np.zeros(n, dtype=np.int8)
+        self.position = np.full(n, IN_APPROACH, dtype=np.int32)
+
+        # Plane ID in every approach slot, and approach slot of every plane (EMPTY when not visible)
+        self.window = np.full(k, EMPTY, dtype=np.int32)
+        self.approach_slot = np.full(n, EMPTY, dtype=np.int32)
+        self.next_arrival = k # ID of the next plane to take a free approach slot
+
+        # Observation and action mask, kept up to date in place when a plane leaves the approach
+        self._observation = np.full(k * 2, EMPTY, dtype=np.int32)
+        self._action_mask = np.zeros(k, dtype=bool)
+
+        # Landing line, holds the plane ID per slot. The first num_of_plane_rows slots are the service stations.
+        # It can grow by at most one slot per plane chosen to land.
+        self.line = np.full(num_of_rows + n, EMPTY, dtype=np.int32)
+        self.line_len = num_of_rows
+        self._slots = np.arange(len(self.line), dtype=np.int32)
+
+    def _reset_counters(self):
+        self.num_in_approach = self.num_of_seats
+        self.num_high_priority_in_approach = int(np.count_nonzero(self.high_priority))
+        self.num_in_line = 0
+        self.num_landed = 0
+
+    # Returns the traffic of the next episode, a row of scenario_bank.SCENARIO_DTYPE
+    def _generate_traffic(self, options=None):
+        if self.scenario_bank is None:
+            self.scenario_index = None
+            return sample_scenarios(self.np_random, 1, self.num_of_seats)[0]
+
+        index = options.get('scenario') if options else None
+        if index is None:
+            index = int(self.np_random.integers(len(self.scenario_bank)))
+        self.scenario_index = index
+        return self.scenario_bank[index]
 
     def reset(self, seed=None, options=None):
         super().reset(seed=seed) # gym requires this call to control randomness and reproduce scenarios.
 
-        self.airplane_rows = [AirplaneRow(row_num, self.seats_per_row) for row_num in range(self.num_of_plane_rows)]
-        self.lobby = Lobby(self.num_of_rows, self.seats_per_row)
-        self.boarding_line = BoardingLine(self.num_of_rows)
+        scenario = self._generate_traffic(options)
+        self.low_fuel = scenario['low_fuel']
+        self.MST = scenario['MST']
+        self.in_transit = scenario['in_transit']
+        self.high_priority = scenario['high_priority']
+        self.is_holding_luggage[:] = True
+        self.status[:] = _APPROACHING
+        self.position[:] = IN_APPROACH
+
+        self.line[:] = EMPTY
+        self.line_len = self.num_of_rows
+
+        k = self.num_of_visible_planes
+        self.window[:] = self.plane_id[:k]
+        self.approach_slot[:] = EMPTY
+        self.approach_slot[:k] = self.plane_id[:k]
+        self.next_arrival = k
+
+        self._observation[0::2] = self.window
+        self._observation[1::2] = self.high_priority[:k]
+        self._action_mask[:] = True
+
+        self._reset_counters()
 
         self.render()
 
-        return self._get_observation(), {}
-    
+        info = {} if self.scenario_index is None else {'scenario': self.scenario_index}
+        return self._get_observation(), info
 
 
+
+    # Copy of the episode state, restore() returns the environment to it, e.g. to try other actions from the
+    # same state. The traffic arrays are copied too: subclasses (airplane_streaming.py) change them in place.
+    def snapshot(self):
+        return (
+            self.low_fuel.copy(), self.MST.copy(), self.in_transit.copy(), self.high_priority.copy(), self.scenario_index,
+            self.is_holding_luggage.copy(), self.status.copy(), self.position.copy(),
+            self.window.copy(), self.approach_slot.copy(), self.line.copy(),
+            self._observation.copy(), self._action_mask.copy(),
+            self.line_len, self.next_arrival,
+            self.num_in_approach, self.num_high_priority_in_approach, self.num_in_line, self.num_landed,
+        )
+
+    # The traffic arrays are replaced by copies, not written in place: they may be views of a scenario bank
+    def restore(self, snapshot):
+        (low_fuel, MST, in_transit, high_priority, self.scenario_index,
+         is_holding_luggage, status, position, window, approach_slot, line, observation, action_mask,
+         self.line_len, self.next_arrival,
+         self.num_in_approach, self.num_high_priority_in_approach, self.num_in_line, self.num_landed) = snapshot
+        self.low_fuel = low_fuel.copy()
+        self.MST = MST.copy()
+        self.in_transit = in_transit.copy()
+        self.high_priority = high_priority.copy()
+        self.is_holding_luggage[:] = is_holding_luggage
+        self.status[:] = status
+        self.position[:] = position
+        self.window[:] = window
+        self.approach_slot[:] = approach_slot
+        self.line[:] = line
+        self._observation[:] = observation
+        self._action_mask[:] = action_mask
+
+    # Only keeps the observation, the state behind it cannot be decoded from it. Use snapshot()/restore().
     def set_custom_observation(self, obs):
-        # Ensure lobby and any dependent variables are set up
-        if not hasattr(self, "lobby") or self.lobby is None:
+        # Ensure the approach and any dependent variables are set up
+        if not hasattr(self, "num_in_approach"):
             self.reset()
 
         # Set the observation manually
         self.current_obs = obs
-    # If necessary, decode obs → state and manually update self.lobby etc.
-
-
-    # Returns an array of the number of passengers in line
-    # def _get_observation(self):
-    #     observation = [LobbyRow(row_num, self.seats_per_row) for row_num in range(self.num_of_rows)]
-    #     for passenger in self.lobby.lobby_rows:
-
-    #         if passenger is None:
-    #             observation.append(-1)
-    #             observation.append(-1)
-    #             observation.append(-1)
-    #         else:
-    #             observation.append(passenger.seat_num)
-    #             observation.append(passenger.status.value)
-    #             observation.append(passenger.low_fuel)
-
-    #     for i in range(len(self.boarding_line.line), self.num_of_seats):
-    #         observation.append(-1)
-    #         observation.append(-1)
-    #         observation.append(-1)
-
-    #     return np.array(observation, dtype=np.int32)
-    
-    def _get_observation(self):
-        observation = []
 
-        for row in self.lobby.lobby_rows:
-            for passenger in row.passengers:
-                if passenger is None:
-                    observation.extend([-1, -1])
 
-                else:
-                    observation.extend([passenger.seat_num,
-                    int(passenger.high_priority)])
-                
-
-        return np.array(observation, dtype=np.int32).flatten()
+    # Returns [slot, high priority] for every approach slot, [-1, -1] once the slot is empty.
+    # The slot equals the plane ID when every plane is visible.
+    def _get_observation(self):
+        return self._observation.copy()
 
     def step(self, seat_num):
-        assert seat_num>=0 and seat_num<self.num_of_seats, f"Invalid row number {seat_num}"
+        assert seat_num>=0 and seat_num<self.num_of_visible_planes, f"Invalid row number {seat_num}"
 
         reward = 0
 
-        passenger = self.lobby.remove_passenger_by_seat(seat_num)
-        self.boarding_line.add_passenger(passenger)
+        self._add_to_line(seat_num)
 
-        # If there are passengers in the lobby, move the line once
-        if self.lobby.count_passengers()>0:
+        # If there are planes in the approach, move the line once
+        if self.num_in_approach>0:
             self._move()
             reward = self._calculate_reward()
         else:
-            # No more passengers in the lobby, so no more actions to choose from, move the line until all passengers are seated
+            # No more planes in the approach, so no more actions to choose from, move the line until all planes have landed
             while self.is_onboarding():
                 self._move()
                 # reward += self._calculate_reward()
@@ -343,40 +242,112 @@ class AirplaneEnv(gym.Env):
             terminated = True
 
 
-        
+
 
         # Gym requires returning the observation, reward, terminated, truncated, and info dictionary.
         return self._get_observation(), reward, terminated, False, {}
 
+    # Moves the plane in the given approach slot to the back of the landing line
+    def _add_to_line(self, slot):
+        # Empty slots cannot be chosen
+        if not self._action_mask[slot]:
+            return
+
+        plane_id = self.window[slot]
+        self.approach_slot[plane_id] = EMPTY
+
+        # The next arriving plane takes the free slot, if there is one left
+        if self.next_arrival < self.num_of_seats:
+            next_id = self.next_arrival
+            self.window[slot] = next_id
+            self.approach_slot[next_id] = slot
+            self._observation[slot * 2 + 1] = self.high_priority[next_id]
+            self.next_arrival += 1
+        else:
+            self.window[slot] = EMPTY
+            self._observation[slot * 2:slot * 2 + 2] = EMPTY
+            self._action_mask[slot] = False
+
+        self.line[self.line_len] = plane_id
+        self.position[plane_id] = self.line_len
+        self.line_len += 1
+
+        self.num_in_approach -= 1
+        self.num_high_priority_in_approach -= int(self.high_priority[plane_id])
+        self.num_in_line += 1
+
     def _calculate_reward(self):
-        reward = -self.lobby.num_high_priority_passengers_in_lobby() + self.lobby.num_low_priority_passengers_in_lobby()
+        num_low_priority_in_approach = self.num_in_approach - self.num_high_priority_in_approach
+        reward = -self.num_high_priority_in_approach + num_low_priority_in_approach
         return reward
 
     def is_onboarding(self):
-        # If there are passengers in the lobby or in the boarding line, return True
-        if self.lobby.count_passengers() > 0 or self.boarding_line.is_onboarding():
+        # If there are planes in the approach or in the landing line, return True
+        if self.num_in_approach > 0 or self.num_in_line > 0:
             return True
 
         return False
 
     def _move(self):
-
-        for row_num, passenger in enumerate(self.boarding_line.line):
-            if passenger is None:
-                continue
-
-            # If outside of airplane's aisle
-            if row_num >= len(self.airplane_rows):
-                break
-
-            # Try to sit passenger, if successful, remove from line
-            if self.airplane_rows[row_num].try_sit_passenger(passenger):
-                self.boarding_line.line[row_num] = None
+        # Planes standing at the service station of their own row try to land
+        num_stations = min(self.num_of_plane_rows, self.line_len)
+        front = self.line[:num_stations]
+        at_station = front[(front != EMPTY) & (self.plane_row[front] == self._slots[:num_stations])]
+
+        if len(at_station) > 0:
+            # The first attempt slows the plane down, the next one lands it and frees its slot
+            first_attempt = self.is_holding_luggage[at_station]
+            landing = at_station[first_attempt]
+            landed = at_station[~first_attempt]
+
+            self.status[landing] = _LANDING
+            self.is_holding_luggage[landing] = False
+
+            self.line[self.position[landed]] = EMPTY
+            self.position[landed] = LANDED
+            self.status[landed] = _LANDED
+            self.num_in_line -= len(landed)
+            self.num_landed += len(landed)
+            self._on_landed(landed)
 
         # Move line forward
-        self.boarding_line.move_forward()
+        self._move_forward()
         self.render()
 
+    # Called with the IDs of the planes that just landed
+    def _on_landed(self, landed):
+        pass
+
+    def _move_forward(self):
+        line = self.line[:self.line_len]
+
+        # Planes that may advance: not at the front of the line and not landing
+        movable = (line != EMPTY) & (self.status[line] != _LANDING)
+        movable[0] = False
+        self.status[line[movable]] = _SLOWINGDOWN
+
+        # A plane advances when every plane between it and the nearest blocking slot ahead advances too,
+        # and that slot is free. Walking the line front to back gives the same result.
+        blocker = np.maximum.accumulate(np.where(movable, 0, self._slots[:self.line_len]))
+        # Indices are one less than the line slot of the plane, i.e. the slot it moves into
+        moving = np.flatnonzero(movable[1:] & (line[blocker[:-1]] == EMPTY))
+
+        if len(moving) > 0:
+            moving_ids = line[moving + 1]
+            line[moving + 1] = EMPTY
+            line[moving] = moving_ids
+            self.position[moving_ids] = moving
+            self.status[moving_ids] = _APPROACHING
+
+        # Close the gaps behind the first num_of_rows slots
+        queue = line[self.num_of_rows:]
+        queued_ids = queue[queue != EMPTY]
+        if len(queued_ids) < len(queue):
+            queue[:] = EMPTY
+            queue[:len(queued_ids)] = queued_ids
+            self.position[queued_ids] = self.num_of_rows + self._slots[:len(queued_ids)]
+            self.line_len = self.num_of_rows + len(queued_ids)
+
     def render(self):
         if self.render_mode is None:
             return
@@ -384,33 +355,48 @@ class AirplaneEnv(gym.Env):
         if self.render_mode == 'terminal':
             self._render_terminal()
 
+    # Returns the string representation of a plane i.e. priority and 2 digit plane ID
+    def _plane_str(self, plane_id):
+        if plane_id == EMPTY:
+            return "None"
+
+        if self.high_priority[plane_id]:
+            return f"H{plane_id:02d}"
+        else:
+            return f"L{plane_id:02d}"
+
     def _render_terminal(self):
         print("Service Stations".center(19) + " | Runway")
-        for row in self.airplane_rows:
-            for seat in row.seats:
-                print(seat, end=" ")
+        for row_num in range(self.num_of_rows):
+            for seat_num in range(row_num * self.seats_per_row, (row_num + 1) * self.seats_per_row):
+                if self.position[seat_num] == LANDED:
+                    print(self._plane_str(seat_num), end=" ")
+                else:
+                    print(f"S{seat_num:02d}", end=" ")
 
-            if row.row_num < len(self.boarding_line.line):
-                passenger = self.boarding_line.line[row.row_num]
+            if row_num < self.line_len:
+                plane_id = self.line[row_num]
 
-                status = "" if passenger is None else passenger.status
+                status = "" if plane_id == EMPTY else PlaneStatus(self.status[plane_id])
 
-                print(f"| {passenger} {status}", end=" ")
+                print(f"| {self._plane_str(plane_id)} {status}", end=" ")
 
             print()
 
         print("\nPlanes Chosen To Land:")
-        for i in range(self.num_of_rows, len(self.boarding_line.line)):
-            passenger = self.boarding_line.line[i]
-            print(f"{passenger} {passenger.status}")
+        for i in range(self.num_of_rows, self.line_len):
+            plane_id = self.line[i]
+            print(f"{self._plane_str(plane_id)} {PlaneStatus(self.status[plane_id])}")
 
         print("\nApproaching Planes:")
-        for row in self.lobby.lobby_rows:
-            for passenger in row.passengers:
-                print(passenger, end=" ")
+        for start in range(0, self.num_of_visible_planes, self.seats_per_row):
+            for slot in range(start, min(start + self.seats_per_row, self.num_of_visible_planes)):
+                print(self._plane_str(self.window[slot]), end=" ")
+
+            print()
 
-            if(len(row.passengers) > 0):
-                print()
+        if self.next_arrival < self.num_of_seats:
+            print(f"... {self.num_of_seats - self.next_arrival} more arriving")
 
         print("\n")
 
@@ -418,15 +404,7 @@ class AirplaneEnv(gym.Env):
     # This method is used to mask the actions that are allowed
     # action_masks() is the function signature required by the MaskablePPO class
     def action_masks(self):
-        mask =np.zeros(self.num_of_seats, dtype =bool)
-
-        for row in self.lobby.lobby_rows:
-            for passenger in row.passengers:
-                if passenger is not None:
-                    mask[passenger.seat_num] = True
-
-
-        return mask
+        return self._action_mask.copy()
 
 # Check validity of the environment
 def my_check_env():
@@ -464,4 +442,4 @@ if __name__ == "__main__":
         print(f"Reward: {reward}\n")
         print(f"Mask: {masks}\n")
 
-    print(f"Total Reward: {total_reward}")
\ No newline at end of file
+    print(f"Total Reward: {total_reward}")
@@ -0,0 +1,319 @@
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.vec_env import VecEnv
+
+from airplane_boarding import EMPTY, IN_APPROACH, LANDED, PlaneStatus
+from scenario_bank import ScenarioBank, sample_scenarios
+
+# PlaneStatus values as stored in AirplaneVecEnv.status
+_APPROACHING = PlaneStatus.APPROACHING.value
+_SLOWINGDOWN = PlaneStatus.SLOWINGDOWN.value
+_LANDING = PlaneStatus.LANDING.value
+_LANDED = PlaneStatus.LANDED.value
+
+# Batched version of AirplaneEnv: the same landing-sequencing dynamics for num_envs airports held
+# in (num_envs, ...) arrays and advanced together by one vectorized step_wait().
+# Use it in place of make_vec_env(AirplaneEnv, vec_env_cls=SubprocVecEnv), wrapped in a VecMonitor for episode stats.
+# Traffic is sampled with a generator seeded by seed, or drawn from a scenario_bank (a ScenarioBank or its path).
+class AirplaneVecEnv(VecEnv):
+
+    def __init__(self, num_envs=1024, num_of_rows=3, seats_per_row=5, num_of_plane_rows=1, num_of_visible_planes=None, seed=None, scenario_bank=None):
+
+        self.seats_per_row = seats_per_row
+        self.num_of_rows = num_of_rows
+        self.num_of_seats = num_of_rows * seats_per_row
+        self.num_of_plane_rows = num_of_plane_rows
+        if num_of_visible_planes is None:
+            num_of_visible_planes = self.num_of_seats
+        self.num_of_visible_planes = min(num_of_visible_planes, self.num_of_seats)
+        k = self.num_of_visible_planes
+
+        # Rendering thousands of airports is not supported
+        self.render_mode = None
+
+        if isinstance(scenario_bank, str):
+            scenario_bank = ScenarioBank(scenario_bank)
+        assert scenario_bank is None or scenario_bank.num_planes == self.num_of_seats, "Scenarios have a different number of planes"
+        self.scenario_bank = scenario_bank
+
+        # Same action and observation spaces as a single AirplaneEnv
+        action_space = spaces.Discrete(k)
+        observation_space = spaces.Box(
+            low=-1,
+            high=k-1,
+            shape=(k * 2,),
+            dtype=np.int32
+        )
+
+        # Per-plane state, shape (num_envs, num_of_seats), indexed by [env, plane ID]
+        shape = (num_envs, self.num_of_seats)
+        self.plane_id = np.arange(self.num_of_seats, dtype=np.int32)
+        self.plane_row = (self.plane_id // seats_per_row) % num_of_plane_rows # Service station, wrapped around as in AirplaneEnv
+        self.low_fuel = np.zeros(shape, dtype=bool)
+        self.MST = np.zeros(shape, dtype=np.int32)
+        self.in_transit = np.zeros(shape, dtype=bool)
+        self.high_priority = np.zeros(shape, dtype=bool)
+        self.is_holding_luggage = np.ones(shape, dtype=bool)
+        self.status = np.zeros(shape, dtype=np.int8)
+        self.position = np.full(shape, IN_APPROACH, dtype=np.int32)
+
+        # Plane ID in every approach slot, shape (num_envs, num_of_visible_planes), and ID of the next plane
+        # of every airport to take a free approach slot
+        self.window = np.full((num_envs, k), EMPTY, dtype=np.int32)
+        self.next_arrival = np.full(num_envs, k, dtype=np.int32)
+        self._window_slots = np.arange(k, dtype=np.int32)
+
+        # Observations, shape (num_envs, num_of_visible_planes, 2), and action masks,
+        # kept up to date in place when a plane leaves the approach
+        self._observation = np.full((num_envs, k, 2), EMPTY, dtype=np.int32)
+        self._action_mask = np.zeros((num_envs, k), dtype=bool)
+
+        # Landing lines, shape (num_envs, num_of_rows + num_of_seats), hold the plane ID per slot
+        self.line = np.full((num_envs, num_of_rows + self.num_of_seats), EMPTY, dtype=np.int32)
+        self.line_len = np.full(num_envs, num_of_rows, dtype=np.int32)
+        self._slots = np.arange(self.line.shape[1], dtype=np.int32)
+        self._envs = np.arange(num_envs)
+
+        # Per-environment counters
+        self.num_in_approach = np.zeros(num_envs, dtype=np.int32)
+        self.num_high_priority_in_approach = np.zeros(num_envs, dtype=np.int32)
+        self.num_in_line = np.zeros(num_envs, dtype=np.int32)
+        self.num_landed = np.zeros(num_envs, dtype=np.int32)
+
+        self.np_random = np.random.default_rng(seed)
+        self.actions = None
+
+        super().__init__(num_envs, observation_space, action_space)
+
+    # Returns the traffic of the next episode of the given environments, shape (len(envs), num_of_seats)
+    def _generate_traffic(self, envs):
+        if self.scenario_bank is None:
+            return sample_scenarios(self.np_random, len(envs), self.num_of_seats)
+        return self.scenario_bank.take(self.np_random.integers(len(self.scenario_bank), size=len(envs)))
+
+    def _reset_envs(self, envs):
+        scenarios = self._generate_traffic(envs)
+        high_priority = scenarios['high_priority']
+        self.low_fuel[envs] = scenarios['low_fuel']
+        self.MST[envs] = scenarios['MST']
+        self.in_transit[envs] = scenarios['in_transit']
+        self.high_priority[envs] = high_priority
+        self.is_holding_luggage[envs] = True
+        self.status[envs] = _APPROACHING
+        self.position[envs] = IN_APPROACH
+
+        self.line[envs] = EMPTY
+        self.line_len[envs] = self.num_of_rows
+
+        k = self.num_of_visible_planes
+        self.window[envs] = self._window_slots
+        self.next_arrival[envs] = k
+        self._observation[envs, :, 0] = self._window_slots
+        self._observation[envs, :, 1] = high_priority[:, :k]
+        self._action_mask[envs] = True
+
+        self.num_in_approach[envs] = self.num_of_seats
+        self.num_high_priority_in_approach[envs] = np.count_nonzero(high_priority, axis=1)
+        self.num_in_line[envs] = 0
+        self.num_landed[envs] = 0
+
+    def reset(self):
+        # Seeds set through VecEnv.seed() are applied here, the first one seeds the generator shared by all airports
+        if self._seeds[0] is not None:
+            self.np_random = np.random.default_rng(self._seeds[0])
+        self._reset_seeds()
+
+        self._reset_envs(self._envs)
+
+        return self._get_observation()
+
+    # Puts the given airports (all by default) in the state of an AirplaneEnv.snapshot() of the same configuration
+    def restore(self, snapshot, envs=None):
+        if envs is None:
+            envs = self._envs
+        (low_fuel, MST, in_transit, high_priority, _,
+         is_holding_luggage, status, position, window, _, line, observation, action_mask,
+         line_len, next_arrival,
+         num_in_approach, num_high_priority_in_approach, num_in_line, num_landed) = snapshot
+
+        self.low_fuel[envs] = low_fuel
+        self.MST[envs] = MST
+        self.in_transit[envs] = in_transit
+        self.high_priority[envs] = high_priority
+        self.is_holding_luggage[envs] = is_holding_luggage
+        self.status[envs] = status
+        self.position[envs] = position
+        self.window[envs] = window
+        self.line[envs] = line
+        self._observation[envs] = observation.reshape(-1, 2)
+        self._action_mask[envs] = action_mask
+
+        self.line_len[envs] = line_len
+        self.next_arrival[envs] = next_arrival
+        self.num_in_approach[envs] = num_in_approach
+        self.num_high_priority_in_approach[envs] = num_high_priority_in_approach
+        self.num_in_line[envs] = num_in_line
+        self.num_landed[envs] = num_landed
+
+    def step_async(self, actions):
+        self.actions = np.asarray(actions)
+
+    def step_wait(self):
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+
+        self._add_to_line(self.actions)
+
+        # Airports with planes still in the approach move the line once
+        stepping = self._envs[self.num_in_approach > 0]
+        self._move(stepping)
+        rewards[stepping] = self._calculate_reward(stepping)
+
+        # The others have no more actions to choose from, move their lines until all planes have landed
+        draining = self._envs[self.num_in_approach == 0]
+        while len(draining) > 0:
+            self._move(draining)
+            draining = draining[self.num_in_line[draining] > 0]
+
+        dones = (self.num_in_approach == 0) & (self.num_in_line == 0)
+        observations = self._get_observation()
+        infos = [{} for _ in range(self.num_envs)]
+
+        # Reset finished airports, as SB3 vectorized environments do, and keep their last observation in the info
+        finished = self._envs[dones]
+        if len(finished) > 0:
+            for env_idx in finished:
+                infos[env_idx]["terminal_observation"] = observations[env_idx].copy()
+            self._reset_envs(finished)
+            observations[finished] = self._get_observation(finished)
+
+        return observations, rewards, dones, infos
+
+    # Moves the plane in the chosen approach slot of every airport to the back of its landing line
+    def _add_to_line(self, slots):
+        # Empty slots cannot be chosen
+        envs = self._envs[self._action_mask[self._envs, slots]]
+        slots = slots[envs]
+        plane_ids = self.window[envs, slots]
+
+        # The next arriving plane takes the free slot, if there is one left
+        refill = self.next_arrival[envs] < self.num_of_seats
+        refill_envs, refill_slots = envs[refill], slots[refill]
+        next_ids = self.next_arrival[refill_envs]
+        self.window[refill_envs, refill_slots] = next_ids
+        self._observation[refill_envs, refill_slots, 1] = self.high_priority[refill_envs, next_ids]
+        self.next_arrival[refill_envs] += 1
+
+        emptied_envs, emptied_slots = envs[~refill], slots[~refill]
+        self.window[emptied_envs, emptied_slots] = EMPTY
+        self._observation[emptied_envs, emptied_slots] = EMPTY
+        self._action_mask[emptied_envs, emptied_slots] = False
+
+        slots = self.line_len[envs]
+        self.line[envs, slots] = plane_ids
+        self.position[envs, plane_ids] = slots
+        self.line_len[envs] += 1
+
+        self.num_in_approach[envs] -= 1
+        self.num_high_priority_in_approach[envs] -= self.high_priority[envs, plane_ids]
+        self.num_in_line[envs] += 1
+
+    def _calculate_reward(self, envs):
+        num_low_priority_in_approach = self.num_in_approach[envs] - self.num_high_priority_in_approach[envs]
+        return -self.num_high_priority_in_approach[envs] + num_low_priority_in_approach
+
+    def _move(self, envs):
+        # Planes standing at the service station of their own row try to land
+        front = self.line[envs, :self.num_of_plane_rows]
+        at_station = (front != EMPTY) & (self.plane_row[front] == self._slots[:front.shape[1]])
+        rows, stations = np.nonzero(at_station)
+        station_envs = envs[rows]
+        plane_ids = front[rows, stations]
+
+        # The first attempt slows the plane down, the next one lands it and frees its slot
+        first_attempt = self.is_holding_luggage[station_envs, plane_ids]
+        landing = (station_envs[first_attempt], plane_ids[first_attempt])
+        self.status[landing] = _LANDING
+        self.is_holding_luggage[landing] = False
+
+        landed_envs = station_envs[~first_attempt]
+        landed_ids = plane_ids[~first_attempt]
+        self.line[landed_envs, stations[~first_attempt]] = EMPTY
+        self.position[landed_envs, landed_ids] = LANDED
+        self.status[landed_envs, landed_ids] = _LANDED
+        np.subtract.at(self.num_in_line, landed_envs, 1)
+        np.add.at(self.num_landed, landed_envs, 1)
+
+        # Move lines forward
+        self._move_forward(envs)
+
+    def _move_forward(self, envs):
+        # Lines are processed at full width, slots past line_len are EMPTY and do not change the result
+        line = self.line[envs]
+        rows = np.arange(len(envs))[:, None]
+        occupied = line != EMPTY
+
+        # Planes that may advance: not at the front of the line and not landing
+        movable = occupied & (self.status[envs[:, None], line] != _LANDING)
+        movable[:, 0] = False
+        stalled_rows, stalled_slots = np.nonzero(movable)
+        self.status[envs[stalled_rows], line[stalled_rows, stalled_slots]] = _SLOWINGDOWN
+
+        # A plane advances when every plane between it and the nearest blocking slot ahead advances too,
+        # and that slot is free. Same rule as AirplaneEnv._move_forward, applied to every line at once.
+        blocker = np.maximum.accumulate(np.where(movable, 0, self._slots), axis=1)
+        advances = movable[:, 1:] & (line[rows, blocker[:, :-1]] == EMPTY)
+        # Column indices are one less than the line slot of the plane, i.e. the slot it moves into
+        moving_rows, moving = np.nonzero(advances)
+        moving_ids = line[moving_rows, moving + 1]
+        line[moving_rows, moving + 1] = EMPTY
+        line[moving_rows, moving] = moving_ids
+        self.position[envs[moving_rows], moving_ids] = moving
+        self.status[envs[moving_rows], moving_ids] = _APPROACHING
+
+        # Close the gaps behind the first num_of_rows slots, keeping the order of the planes
+        queue = line[:, self.num_of_rows:]
+        queue[:] = queue[rows, np.argsort(queue == EMPTY, axis=1, kind='stable')]
+        queued_rows, queued = np.nonzero(queue != EMPTY)
+        self.position[envs[queued_rows], queue[queued_rows, queued]] = self.num_of_rows + queued
+
+        self.line[envs] = line
+        self.line_len[envs] = self.num_of_rows + np.count_nonzero(queue != EMPTY, axis=1)
+
+    # Returns [slot, high priority] for every approach slot of every airport, shape (num_envs, num_of_visible_planes * 2)
+    def _get_observation(self, envs=None):
+        if envs is None:
+            envs = self._envs
+
+        return self._observation[envs].reshape(len(envs), -1)
+
+    # Shape (num_envs, num_of_visible_planes), one action mask per airport
+    def action_masks(self):
+        return self._action_mask.copy()
+
+    def close(self):
+        pass
+
+    # This class holds all airports itself, attributes and methods are looked up on it.
+    # Array attributes and methods returning arrays have one row per airport and are split per index.
+    def get_attr(self, attr_name, indices=None):
+        indices = self._get_indices(indices)
+        value = getattr(self, attr_name)
+        if isinstance(value, np.ndarray) and value.ndim > 0 and value.shape[0] == self.num_envs:
+            return [value[i] for i in indices]
+        return [value for _ in indices]
+
+    def set_attr(self, attr_name, value, indices=None):
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        indices = self._get_indices(indices)
+        result = getattr(self, method_name)(*method_args, **method_kwargs)
+        if isinstance(result, np.ndarray) and result.ndim > 0 and result.shape[0] == self.num_envs:
+            return [result[i] for i in indices]
+        return [result for _ in indices]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
+
+    def get_images(self):
+        return [None for _ in range(self.num_envs)]
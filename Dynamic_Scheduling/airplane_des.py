@@ -0,0 +1,129 @@
+import argparse
+import copy
+import time
+
+import numpy as np
+from gymnasium.envs.registration import register
+
+from airplane_boarding import EMPTY, LANDED, _LANDED, _LANDING
+from airplane_streaming import StreamingAirplaneEnv
+from des_engine import DES, RandU, replication_seeds
+
+register(
+    id='airplane-des-v0',
+    entry_point='airplane_des:DESAirplaneEnv',
+)
+
+# Landing events of a DESAirplaneEnv, in env ticks: exponential interarrival times (mean arrival_interval) on the
+# @randu arrival stream, and an exponential service time (mean service_time) per plane reaching its station
+class LandingSim(DES):
+    ARRIVAL = 1
+    LANDED = 2
+
+    ARRIVAL_STREAM = 1
+    SERVICE_STREAM = 2
+
+    def __init__(self, env, arrival_interval, service_time, seeds):
+        self.env = env
+        self.arrival_interval = arrival_interval
+        self.service_time = service_time
+        self.r = RandU(seeds)
+        super().__init__(max_clock=float('inf'))
+
+    def schedule_landing(self, station, now):
+        self.r.nextlcg(self.SERVICE_STREAM)
+        self.add_event(self.LANDED, now + self.r.nexte(self.SERVICE_STREAM, self.service_time), station)
+
+    def handle(self, event_type, server):
+        if event_type == self.START or event_type == self.ARRIVAL:
+            self.r.nextlcg(self.ARRIVAL_STREAM)
+            self.add_event(self.ARRIVAL, self.clock + self.r.nexte(self.ARRIVAL_STREAM, self.arrival_interval))
+            if event_type == self.ARRIVAL:
+                self.env._arrive()
+        elif event_type == self.LANDED:
+            self.env._land(server)
+
+class DESAirplaneEnv(StreamingAirplaneEnv):
+    # StreamingAirplaneEnv with its arrivals and landings driven by des_engine instead of per-tick Poisson draws
+    # and the two-tick landing: every tick advances the LandingSim to the env clock, arrivals join the approach
+    # and planes whose service time is over leave their station. A plane starts its service when it reaches the
+    # station of its row. Observation, actions and reward are those of StreamingAirplaneEnv.
+    # The DES streams are seeded with replication_seeds(seed) of reset(seed=...), the plane attributes still come
+    # from the env's generator. A reset without a seed that continues the stream keeps the simulation too.
+    #   gym.make('airplane-des-v0', arrival_interval=4.0, service_time=2.0)
+    def __init__(self, render_mode=None, num_of_rows=4, seats_per_row=5, num_of_plane_rows=4, num_of_visible_planes=20,
+                 arrival_interval=4.0, service_time=2.0, max_backlog=100, max_line=100, bank_size=1000, max_idle_ticks=100_000):
+        super().__init__(render_mode, num_of_rows, seats_per_row, num_of_plane_rows, num_of_visible_planes,
+                         1 / arrival_interval, max_backlog, max_line, bank_size, max_idle_ticks)
+        self.arrival_interval = arrival_interval
+        self.service_time = service_time
+        self.sim = None
+
+    def reset(self, seed=None, options=None):
+        if self._restarts(seed, options):
+            replication = seed if seed is not None else int(np.random.SeedSequence().entropy % 2**31)
+            self.sim = LandingSim(self, self.arrival_interval, self.service_time, replication_seeds(replication))
+        return super().reset(seed=seed, options=options)
+
+    # Service starts at the station, the line moves, then the events up to the new clock
+    def _tick(self):
+        self._move()
+        self.clock += 1
+        self.sim.run(until=self.clock)
+
+    def _move(self):
+        num_stations = min(self.num_of_plane_rows, self.line_len)
+        front = self.line[:num_stations]
+        at_station = (front != EMPTY) & (self.plane_row[front] == self._slots[:num_stations])
+        starting = front[at_station & self.is_holding_luggage[front]]
+        for plane_id in starting:
+            self.status[plane_id] = _LANDING
+            self.is_holding_luggage[plane_id] = False
+            self.sim.schedule_landing(int(self.position[plane_id]), self.clock)
+
+        self._move_forward()
+        self.render()
+
+    # LANDED event of the plane in service at the station
+    def _land(self, station):
+        plane_id = self.line[station]
+        self.line[station] = EMPTY
+        self.position[plane_id] = LANDED
+        self.status[plane_id] = _LANDED
+        self.num_in_line -= 1
+        self.num_landed += 1
+        self._on_landed(np.array([plane_id], dtype=np.int32))
+
+    # The simulation is copied with its reference to this env kept as is
+    def snapshot(self):
+        return super().snapshot(), copy.deepcopy(self.sim, {id(self): self})
+
+    def restore(self, snapshot):
+        env_snapshot, sim = snapshot
+        super().restore(env_snapshot)
+        self.sim = copy.deepcopy(sim, {id(self): self})
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--decisions', type=int, default=100_000)
+    parser.add_argument('--arrival-interval', type=float, default=4.0, help="Mean ticks between arrivals")
+    parser.add_argument('--service-time', type=float, default=2.0, help="Mean ticks a plane takes to land at its station")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    from heuristic_scheduler import ObservationHeuristic
+
+    policy = ObservationHeuristic()
+    env = DESAirplaneEnv(arrival_interval=args.arrival_interval, service_time=args.service_time)
+    obs, _ = env.reset(seed=args.seed)
+    start = time.perf_counter()
+    for _ in range(args.decisions):
+        action, _ = policy.predict(obs, action_masks=env._action_mask)
+        obs, _, terminated, truncated, info = env.step(int(action))
+        if terminated or truncated:
+            obs, _ = env.reset()
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.decisions / elapsed:,.0f} decisions/sec, {env.sim.num_events / elapsed:,.0f} events/sec")
+    print(f"After {info['clock']} ticks: {info['arrived']} arrived, {info['landed']} landed, {info['diverted']} diverted, "
+          f"{info['backlog']} in the backlog, {info['in_line']} in the line")
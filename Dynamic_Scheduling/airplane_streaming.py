@@ -0,0 +1,347 @@
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+from gymnasium import spaces
+from gymnasium.envs.registration import register
+
+from airplane_boarding import AirplaneEnv, EMPTY, IN_APPROACH, LANDED, PlaneStatus, _APPROACHING
+from scenario_bank import sample_scenarios
+
+register(
+    id='airplane-streaming-v0',
+    entry_point='airplane_streaming:StreamingAirplaneEnv',
+)
+
+# Number of ticks of arrivals and of arriving planes drawn from the generator at a time
+ARRIVAL_BLOCK = 1024
+
+class StreamingAirplaneEnv(AirplaneEnv):
+    # Open traffic instead of a closed batch of planes, like CheckNextArrival/HandleArrival in AirportSimulation.cs.
+    # Time advances one tick per line move. Every tick a seeded Poisson number of planes (mean arrival_rate) arrives
+    # with the attributes of scenario_bank.sample_scenarios; an arrival takes a free approach slot, waits in the
+    # backlog (at most max_backlog planes) when all num_of_visible_planes slots are taken, and is diverted when
+    # the backlog is full too. The landing line holds at most max_line planes behind the service stations,
+    # a plane chosen while it is full waits for a landing first. After a step that leaves no plane to choose,
+    # ticks pass until the next arrival; if none comes for max_idle_ticks ticks the episode is truncated.
+    # The stream never ends: every bank_size decisions the episode is truncated, and reset() without a seed
+    # continues the stream where it was instead of starting over. reset(seed=...) or options={'restart': True}
+    # start a new stream. Planes live in a pool of fixed size, so memory stays constant however long it runs.
+    # Observation, actions and reward are those of AirplaneEnv with its visible window.
+    def __init__(self, render_mode=None, num_of_rows=4, seats_per_row=5, num_of_plane_rows=4, num_of_visible_planes=20,
+                 arrival_rate=0.5, max_backlog=100, max_line=100, bank_size=1000, max_idle_ticks=100_000):
+        if not arrival_rate > 0:
+            raise ValueError(f"arrival_rate must be positive, got {arrival_rate}")
+        # The batch state of AirplaneEnv is replaced below, it is set up for the attributes the subclass does not change
+        super().__init__(render_mode, num_of_rows, seats_per_row, num_of_plane_rows)
+        self.num_of_visible_planes = num_of_visible_planes
+        self.arrival_rate = arrival_rate
+        self.max_backlog = max_backlog
+        self.bank_size = bank_size
+        self.max_idle_ticks = max_idle_ticks
+
+        k = num_of_visible_planes
+        self.action_space = spaces.Discrete(k)
+        self.observation_space = spaces.Box(low=-1, high=k - 1, shape=(k * 2,), dtype=np.int32)
+
+        # Every plane in the approach, the backlog or the line holds one entry of the pool, its plane ID.
+        # The arrival number of the plane in the stream decides its service station, like the seat row does in AirplaneEnv.
+        self.pool_size = k + max_backlog + num_of_rows + max_line
+        n = self.pool_size
+        self.num_of_seats = n # Planes the per-plane arrays hold
+        self.plane_id = np.arange(n, dtype=np.int32)
+        self.arrival_number = np.zeros(n, dtype=np.int64)
+        self.plane_row = np.zeros(n, dtype=np.int64)
+        self.low_fuel = np.zeros(n, dtype=bool)
+        self.MST = np.zeros(n, dtype=np.uint8)
+        self.in_transit = np.zeros(n, dtype=bool)
+        self.high_priority = np.zeros(n, dtype=bool)
+        self.is_holding_luggage = np.ones(n, dtype=bool)
+        self.status = np.zeros(n, dtype=np.int8)
+        self.position = np.full(n, LANDED, dtype=np.int32)
+        self._free = np.arange(n, dtype=np.int32) # Stack of unused plane IDs
+        self._num_free = n
+
+        self.window = np.full(k, EMPTY, dtype=np.int32)
+        self.approach_slot = np.full(n, EMPTY, dtype=np.int32)
+        self._observation = np.full(k * 2, EMPTY, dtype=np.int32)
+        self._action_mask = np.zeros(k, dtype=bool)
+
+        # Backlog of arrived planes waiting for an approach slot, a ring buffer in arrival order
+        self._backlog = np.full(max(max_backlog, 1), EMPTY, dtype=np.int32)
+        self._backlog_head = 0
+        self.backlog_len = 0
+
+        self.line = np.full(num_of_rows + max_line, EMPTY, dtype=np.int32)
+        self.line_len = num_of_rows
+        self._slots = np.arange(len(self.line), dtype=np.int32)
+
+        self._started = False
+
+    # Whether reset(seed, options) starts a new stream rather than continuing the current one
+    def _restarts(self, seed, options):
+        return seed is not None or not self._started or (options is not None and options.get('restart', False))
+
+    def reset(self, seed=None, options=None):
+        if not self._restarts(seed, options):
+            self.num_decisions = 0
+            if not self._wait_for_arrival():
+                raise RuntimeError(f"No plane arrived in {self.max_idle_ticks} ticks, arrival_rate {self.arrival_rate} is too low")
+            return self._get_observation(), self._info()
+
+        super(AirplaneEnv, self).reset(seed=seed)
+
+        self.is_holding_luggage[:] = True
+        self.status[:] = _APPROACHING
+        self.position[:] = LANDED
+        self._free[:] = self.plane_id[::-1]
+        self._num_free = self.pool_size
+
+        self.window[:] = EMPTY
+        self.approach_slot[:] = EMPTY
+        self._observation[:] = EMPTY
+        self._action_mask[:] = False
+        self._backlog_head = 0
+        self.backlog_len = 0
+
+        self.line[:] = EMPTY
+        self.line_len = self.num_of_rows
+
+        self.num_in_approach = 0
+        self.num_high_priority_in_approach = 0
+        self.num_in_line = 0
+        self.num_landed = 0
+        self.num_arrived = 0
+        self.num_diverted = 0
+        self.num_decisions = 0
+        self.clock = 0
+
+        self._counts = None
+        self._count_index = ARRIVAL_BLOCK
+        self._traffic = None
+        self._traffic_index = ARRIVAL_BLOCK
+        self._started = True
+
+        # The airport starts empty, wait for the first arrival
+        if not self._wait_for_arrival():
+            raise RuntimeError(f"No plane arrived in {self.max_idle_ticks} ticks, arrival_rate {self.arrival_rate} is too low")
+
+        self.render()
+        return self._get_observation(), self._info()
+
+    def step(self, slot):
+        assert slot >= 0 and slot < self.num_of_visible_planes, f"Invalid slot {slot}"
+
+        if self._action_mask[slot]:
+            while self.line_len == len(self.line):
+                self._tick()
+            self._add_to_line(slot)
+
+        self._tick()
+        arrived = self._wait_for_arrival()
+
+        # Also truncated when the airport stays empty for max_idle_ticks ticks, the next reset() waits on
+        self.num_decisions += 1
+        truncated = not arrived or (self.bank_size is not None and self.num_decisions >= self.bank_size)
+        return self._get_observation(), self._calculate_reward(), False, truncated, self._info()
+
+    def _info(self):
+        return {
+            'clock': self.clock,
+            'arrived': self.num_arrived,
+            'landed': self.num_landed,
+            'diverted': self.num_diverted,
+            'backlog': self.backlog_len,
+            'in_line': self.num_in_line,
+        }
+
+    # The AirplaneEnv snapshot plus the state of the stream: plane pool, backlog, clock, counters and the arrival
+    # generator with its drawn blocks, so restore() continues with the same arrivals. The blocks are replaced,
+    # never written in place, and are kept by reference.
+    def snapshot(self):
+        return super().snapshot(), (
+            self.arrival_number.copy(), self.plane_row.copy(), self._free.copy(), self._num_free,
+            self._backlog.copy(), self._backlog_head, self.backlog_len,
+            self.clock, self.num_arrived, self.num_diverted, self.num_decisions, self._started,
+            self.np_random.bit_generator.state, self._counts, self._count_index, self._traffic, self._traffic_index,
+        )
+
+    def restore(self, snapshot):
+        env_snapshot, stream_snapshot = snapshot
+        super().restore(env_snapshot)
+        (arrival_number, plane_row, free, self._num_free, backlog, self._backlog_head, self.backlog_len,
+         self.clock, self.num_arrived, self.num_diverted, self.num_decisions, self._started,
+         rng_state, self._counts, self._count_index, self._traffic, self._traffic_index) = stream_snapshot
+        self.arrival_number[:] = arrival_number
+        self.plane_row[:] = plane_row
+        self._free[:] = free
+        self._backlog[:] = backlog
+        self.np_random.bit_generator.state = rng_state
+
+    # Ticks until a plane can be chosen, at most max_idle_ticks. Returns whether one can.
+    def _wait_for_arrival(self):
+        for _ in range(self.max_idle_ticks):
+            if self._action_mask.any():
+                return True
+            self._tick()
+        return self._action_mask.any()
+
+    # One line move, then the arrivals of the tick
+    def _tick(self):
+        self._move()
+        self.clock += 1
+
+        if self._count_index == ARRIVAL_BLOCK:
+            self._counts = self.np_random.poisson(self.arrival_rate, ARRIVAL_BLOCK)
+            self._count_index = 0
+        count = self._counts[self._count_index]
+        self._count_index += 1
+
+        for _ in range(count):
+            self._arrive()
+
+    def _arrive(self):
+        if not self._action_mask.all():
+            slot = int(np.argmin(self._action_mask))
+        elif self.backlog_len < self.max_backlog:
+            slot = EMPTY
+        else:
+            self.num_diverted += 1
+            return
+
+        if self._traffic_index == ARRIVAL_BLOCK:
+            self._traffic = sample_scenarios(self.np_random, 1, ARRIVAL_BLOCK)[0]
+            self._traffic_index = 0
+        attributes = self._traffic[self._traffic_index]
+        self._traffic_index += 1
+
+        self._num_free -= 1
+        plane_id = self._free[self._num_free]
+        self.arrival_number[plane_id] = self.num_arrived
+        self.plane_row[plane_id] = (self.num_arrived // self.seats_per_row) % self.num_of_plane_rows
+        self.low_fuel[plane_id] = attributes['low_fuel']
+        self.MST[plane_id] = attributes['MST']
+        self.in_transit[plane_id] = attributes['in_transit']
+        self.high_priority[plane_id] = attributes['high_priority']
+        self.is_holding_luggage[plane_id] = True
+        self.status[plane_id] = _APPROACHING
+        self.position[plane_id] = IN_APPROACH
+        self.num_arrived += 1
+
+        self.num_in_approach += 1
+        self.num_high_priority_in_approach += int(self.high_priority[plane_id])
+
+        if slot == EMPTY:
+            self._backlog[(self._backlog_head + self.backlog_len) % len(self._backlog)] = plane_id
+            self.backlog_len += 1
+        else:
+            self._fill_slot(slot, plane_id)
+
+    def _fill_slot(self, slot, plane_id):
+        self.window[slot] = plane_id
+        self.approach_slot[plane_id] = slot
+        self._observation[slot * 2] = slot
+        self._observation[slot * 2 + 1] = self.high_priority[plane_id]
+        self._action_mask[slot] = True
+
+    # Moves the plane in the given approach slot to the back of the landing line, the longest waiting plane
+    # of the backlog takes its slot
+    def _add_to_line(self, slot):
+        plane_id = self.window[slot]
+        self.approach_slot[plane_id] = EMPTY
+
+        if self.backlog_len > 0:
+            self._fill_slot(slot, self._backlog[self._backlog_head])
+            self._backlog_head = (self._backlog_head + 1) % len(self._backlog)
+            self.backlog_len -= 1
+        else:
+            self.window[slot] = EMPTY
+            self._observation[slot * 2:slot * 2 + 2] = EMPTY
+            self._action_mask[slot] = False
+
+        self.line[self.line_len] = plane_id
+        self.position[plane_id] = self.line_len
+        self.line_len += 1
+
+        self.num_in_approach -= 1
+        self.num_high_priority_in_approach -= int(self.high_priority[plane_id])
+        self.num_in_line += 1
+
+    # Landed planes give their entry of the pool back
+    def _on_landed(self, landed):
+        self._free[self._num_free:self._num_free + len(landed)] = landed
+        self._num_free += len(landed)
+
+    def _plane_str(self, plane_id):
+        if plane_id == EMPTY:
+            return "None"
+        return f"{'H' if self.high_priority[plane_id] else 'L'}{self.arrival_number[plane_id]:02d}"
+
+    def _render_terminal(self):
+        print(f"Clock {self.clock}: {self.num_arrived} arrived, {self.num_landed} landed, {self.num_diverted} diverted")
+        print("Runway:")
+        for slot in range(self.num_of_rows):
+            plane_id = self.line[slot]
+            status = "" if plane_id == EMPTY else PlaneStatus(self.status[plane_id])
+            print(f"| {self._plane_str(plane_id)} {status}")
+
+        print("\nPlanes Chosen To Land:")
+        print(" ".join(self._plane_str(plane_id) for plane_id in self.line[self.num_of_rows:self.line_len]))
+
+        print("\nApproaching Planes:")
+        for start in range(0, self.num_of_visible_planes, self.seats_per_row):
+            print(" ".join(self._plane_str(plane_id) for plane_id in self.window[start:start + self.seats_per_row]))
+        if self.backlog_len > 0:
+            print(f"... {self.backlog_len} more waiting")
+
+        print("\n")
+
+# Decisions per second and memory of a long stream against closed episodes of AirplaneEnv with the same window,
+# both choosing the first high priority slot (heuristic_scheduler.ObservationHeuristic)
+def benchmark(num_decisions=200_000, arrival_rate=0.5, seed=42):
+    from heuristic_scheduler import ObservationHeuristic
+
+    policy = ObservationHeuristic()
+
+    def play(env, obs, num_steps):
+        for _ in range(num_steps):
+            action, _ = policy.predict(obs, action_masks=env._action_mask)
+            obs, _, terminated, truncated, _ = env.step(int(action))
+            if terminated or truncated:
+                obs, _ = env.reset()
+        return obs
+
+    # Timed first, then the memory allocated while playing on, which stays flat when nothing grows with time
+    def run(env):
+        obs, _ = env.reset(seed=seed)
+        start = time.perf_counter()
+        obs = play(env, obs, num_decisions)
+        elapsed = time.perf_counter() - start
+
+        tracemalloc.start()
+        play(env, obs, num_decisions // 10)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {'decisions_per_sec': num_decisions / elapsed, 'peak_kib': peak / 1024}
+
+    stream = StreamingAirplaneEnv(arrival_rate=arrival_rate)
+    results = {
+        'streaming': run(stream),
+        'episodes': run(AirplaneEnv(num_of_rows=4, seats_per_row=5, num_of_plane_rows=4)),
+    }
+    results['streaming'].update(stream._info())
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--decisions', type=int, default=200_000)
+    parser.add_argument('--arrival-rate', type=float, default=0.5, help="Mean arrivals per tick")
+    args = parser.parse_args()
+
+    results = benchmark(args.decisions, args.arrival_rate)
+    for name, result in results.items():
+        print(f"{name:>10}: {result['decisions_per_sec']:>8.0f} decisions/sec, peak {result['peak_kib']:.1f} KiB")
+    stream = results['streaming']
+    print(f"\nStream after {stream['clock']} ticks: {stream['arrived']} arrived, {stream['landed']} landed, "
+          f"{stream['diverted']} diverted, {stream['backlog']} in the backlog, {stream['in_line']} in the line")
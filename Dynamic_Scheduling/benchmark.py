@@ -0,0 +1,241 @@
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import subprocess
+import time
+
+import numpy as np
+
+from airplane_boarding import AirplaneEnv
+from scaling_benchmark import make_env
+
+# Benchmark suite of the scheduling stack, results are written to a JSON file so runs on different commits
+# can be compared with --compare. Every section is seeded, rates are best-of-repeats to damp noise.
+#   env:     AirplaneEnv reset / step / action_masks calls per second across scenario sizes
+#   vec:     env-steps per second of DummyVecEnv, SubprocVecEnv and AirplaneVecEnv at different n_envs
+#   train:   MaskablePPO wall-clock split into rollout collection and policy update
+#   predict: /predict latency of the inference server, one request at a time and with concurrent clients
+
+TRAINING_SCENARIO = dict(num_of_rows=4, seats_per_row=5, num_of_plane_rows=4)
+POLICY_PATH = os.path.join('agents', 'MaskablePPO', 'PPO_33', 'manual_save_5400000.npz')
+RESULTS_PATH = 'benchmark_results.json'
+
+def _best_rate(fn, count, repeats):
+    # fn performs count operations, returns the best operations per second over the repeats
+    best = 0.0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = max(best, count / (time.perf_counter() - start))
+    return best
+
+def bench_env(sizes=(20, 200, 2000), num_steps=5000, repeats=3):
+    results = []
+    for num_planes in sizes:
+        env = make_env(num_planes) if num_planes != 20 else AirplaneEnv(**TRAINING_SCENARIO)
+
+        def resets():
+            for _ in range(200):
+                env.reset()
+
+        def masks():
+            for _ in range(num_steps):
+                env.action_masks()
+
+        def steps():
+            # Whole episodes, choosing the first free approach slot
+            env.reset()
+            for _ in range(num_steps):
+                _, _, terminated, _, _ = env.step(int(np.argmax(env._action_mask)))
+                if terminated:
+                    env.reset()
+
+        env.reset(seed=42)
+        results.append({
+            'planes': num_planes,
+            'reset_per_sec': _best_rate(resets, 200, repeats),
+            'action_masks_per_sec': _best_rate(masks, num_steps, repeats),
+            'step_per_sec': _best_rate(steps, num_steps, repeats),
+        })
+    return results
+
+def _first_valid_actions(vec_env):
+    return np.argmax(np.stack(vec_env.env_method('action_masks')), axis=1)
+
+def bench_vec(n_envs_list=(1, 4, 16), num_steps=500, repeats=3):
+    from stable_baselines3.common.env_util import make_vec_env
+    from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
+    from airplane_boarding_vec import AirplaneVecEnv
+
+    results = []
+    for n_envs in n_envs_list:
+        vec_envs = {
+            'DummyVecEnv': make_vec_env(AirplaneEnv, n_envs=n_envs, env_kwargs=TRAINING_SCENARIO, vec_env_cls=DummyVecEnv, seed=42),
+            'SubprocVecEnv': make_vec_env(AirplaneEnv, n_envs=n_envs, env_kwargs=TRAINING_SCENARIO, vec_env_cls=SubprocVecEnv, seed=42),
+            'AirplaneVecEnv': AirplaneVecEnv(num_envs=n_envs, seed=42, **TRAINING_SCENARIO),
+        }
+        for name, vec_env in vec_envs.items():
+            vec_env.reset()
+
+            def steps():
+                for _ in range(num_steps):
+                    vec_env.step(_first_valid_actions(vec_env))
+
+            results.append({
+                'vec_env': name,
+                'n_envs': n_envs,
+                'env_steps_per_sec': _best_rate(steps, num_steps * n_envs, repeats),
+            })
+            vec_env.close()
+    return results
+
+def bench_train(num_envs=256, n_steps=128, batch_size=4096, num_updates=3):
+    from sb3_contrib import MaskablePPO
+    from stable_baselines3.common.callbacks import BaseCallback
+    from stable_baselines3.common.vec_env import VecMonitor
+    from airplane_boarding_vec import AirplaneVecEnv
+
+    class RolloutTimer(BaseCallback):
+        def __init__(self):
+            super().__init__()
+            self.rollout_time = 0.0
+
+        def _on_rollout_start(self):
+            self._start = time.perf_counter()
+
+        def _on_rollout_end(self):
+            self.rollout_time += time.perf_counter() - self._start
+
+        def _on_step(self):
+            return True
+
+    env = VecMonitor(AirplaneVecEnv(num_envs=num_envs, seed=42, **TRAINING_SCENARIO))
+    model = MaskablePPO('MlpPolicy', env, device='cpu', ent_coef=0.05, n_steps=n_steps, batch_size=batch_size, seed=42)
+    timer = RolloutTimer()
+
+    total_timesteps = num_envs * n_steps * num_updates
+    start = time.perf_counter()
+    model.learn(total_timesteps=total_timesteps, callback=timer)
+    total_time = time.perf_counter() - start
+
+    return {
+        'num_envs': num_envs,
+        'n_steps': n_steps,
+        'batch_size': batch_size,
+        'timesteps': total_timesteps,
+        'total_sec': total_time,
+        'rollout_sec': timer.rollout_time,
+        'update_sec': total_time - timer.rollout_time,
+        'timesteps_per_sec': total_timesteps / total_time,
+    }
+
+def bench_predict(model_path=POLICY_PATH, num_requests=2000, concurrency=(1, 16, 64)):
+    import httpx
+    from inference_server import create_app, load_model
+    from policy_export import record_observations
+
+    model = load_model(model_path)
+    observations, _ = record_observations(model, num_episodes=20)
+    payloads = [{'obs': obs.tolist()} for obs in observations]
+
+    async def run_clients(num_clients):
+        app = create_app(model)
+        await app.state.batcher.start()
+        latencies = []
+
+        async def client(http, offset):
+            for i in range(offset, num_requests, num_clients):
+                start = time.perf_counter()
+                await http.post('/predict', json=payloads[i % len(payloads)])
+                latencies.append(time.perf_counter() - start)
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench') as http:
+            start = time.perf_counter()
+            await asyncio.gather(*(client(http, offset) for offset in range(num_clients)))
+            elapsed = time.perf_counter() - start
+
+        batch_metrics = app.state.batcher.metrics()
+        await app.state.batcher.stop()
+
+        latencies = np.array(latencies) * 1000
+        return {
+            'concurrency': num_clients,
+            'requests_per_sec': num_requests / elapsed,
+            'latency_p50_ms': float(np.percentile(latencies, 50)),
+            'latency_p99_ms': float(np.percentile(latencies, 99)),
+            'mean_batch_size': batch_metrics['mean_batch_size'],
+        }
+
+    return [asyncio.run(run_clients(num_clients)) for num_clients in concurrency]
+
+SECTIONS = {
+    'env': bench_env,
+    'vec': bench_vec,
+    'train': bench_train,
+    'predict': bench_predict,
+}
+
+def environment_info():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'commit': commit,
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+    }
+
+def run(sections=tuple(SECTIONS)):
+    results = {'info': environment_info()}
+    for section in sections:
+        print(f"Running {section} benchmarks")
+        results[section] = SECTIONS[section]()
+    return results
+
+# Rates (keys ending in _per_sec) of two result files side by side, with the change in percent
+def compare(old, new):
+    rows = []
+
+    def walk(old_value, new_value, name):
+        if isinstance(new_value, dict):
+            for key, value in new_value.items():
+                if isinstance(old_value, dict) and key in old_value:
+                    walk(old_value[key], value, f"{name}.{key}" if name else key)
+        elif isinstance(new_value, list) and isinstance(old_value, list):
+            for i, (old_item, new_item) in enumerate(zip(old_value, new_value)):
+                walk(old_item, new_item, f"{name}[{i}]")
+        elif name.endswith('_per_sec'):
+            rows.append((name, old_value, new_value, (new_value / old_value - 1) * 100))
+
+    for section in SECTIONS:
+        if section in old and section in new:
+            walk(old[section], new[section], section)
+    return rows
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--only', nargs='+', choices=list(SECTIONS), default=list(SECTIONS), help="Sections to run")
+    parser.add_argument('--out', default=RESULTS_PATH)
+    parser.add_argument('--compare', default=None, help="Earlier results file to compare the rates against")
+    args = parser.parse_args()
+
+    results = run(args.only)
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        print(f"\nCompared to {args.compare} ({old['info'].get('commit')}):")
+        for name, old_rate, new_rate, change in compare(old, results):
+            print(f"{name:<45} {old_rate:>12.1f} {new_rate:>12.1f} {change:>+7.1f}%")
@@ -0,0 +1,169 @@
+import collections
+import copy
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.save_util import save_to_zip_file
+
+# Checkpointing that does not stall training: the model is snapshotted in memory (the same contents as
+# model.save, with the policy and optimizer state dicts copied) and the zip is written by a background thread.
+# Checkpoints written by the callback are pruned after every save, keeping:
+#   - the last keep_last checkpoints
+#   - every keep_every-th periodic checkpoint (saves every save_freq timesteps, best checkpoints are not counted)
+#   - the checkpoint with the best evaluation score (see BestCheckpointCallback)
+# checkpoints.json in the save path lists the kept checkpoints with their timesteps and scores.
+
+MANIFEST_FILE = 'checkpoints.json'
+
+# Contents of model.save(), detached from the live model so it can be serialized while training goes on
+def snapshot_model(model):
+    data = model.__dict__.copy()
+    exclude = set(model._excluded_save_params())
+    state_dicts_names, torch_variable_names = model._get_torch_save_params()
+    for name in state_dicts_names + torch_variable_names:
+        exclude.add(name.split(".")[0])
+    for name in exclude:
+        data.pop(name, None)
+
+    # Containers updated in place during training, e.g. the episode info buffer
+    for name, value in data.items():
+        if isinstance(value, (collections.deque, np.ndarray, list, dict)):
+            data[name] = copy.copy(value)
+
+    pytorch_variables = {name: copy.deepcopy(_getattr(model, name)) for name in torch_variable_names}
+    params = copy.deepcopy(model.get_parameters())
+    return data, params, pytorch_variables
+
+def _getattr(obj, name):
+    for part in name.split("."):
+        obj = getattr(obj, part)
+    return obj
+
+def write_snapshot(snapshot, path):
+    data, params, pytorch_variables = snapshot
+    # Written next to the target and renamed, so a checkpoint is either complete or absent
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        save_to_zip_file(f, data=data, params=params, pytorch_variables=pytorch_variables)
+    os.replace(tmp_path, path)
+
+class AsyncCheckpointCallback(BaseCallback):
+    def __init__(self, save_freq, save_path, name_prefix='manual_save', keep_last=5, keep_every=10, verbose=0):
+        super().__init__(verbose)
+        self.save_freq = save_freq
+        self.save_path = save_path
+        self.name_prefix = name_prefix
+        self.keep_last = keep_last
+        self.keep_every = keep_every
+
+        # One record per checkpoint still on disk: {'timesteps', 'path', 'number', 'score'},
+        # number is the count of the periodic save, None for a checkpoint saved only for its score
+        self.checkpoints = []
+        self.num_saved = 0
+        self.num_periodic_saved = 0
+        self.snapshot_time = 0.0
+        self._next_save = save_freq
+        self._lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1)
+        self._pending = []
+
+    def _init_callback(self):
+        os.makedirs(self.save_path, exist_ok=True)
+
+    def _on_step(self) -> bool:
+        # Vectorized environments add num_envs timesteps per step, so num_timesteps may never be a multiple of save_freq
+        if self.num_timesteps >= self._next_save:
+            self._next_save += self.save_freq * ((self.num_timesteps - self._next_save) // self.save_freq + 1)
+            self.save()
+        return True
+
+    # Snapshots the model now and writes it in the background, score is the evaluation result if there is one
+    def save(self, score=None):
+        start = time.perf_counter()
+        snapshot = snapshot_model(self.model)
+        self.snapshot_time += time.perf_counter() - start
+
+        # Read from the model, this callback's own count lags when save() is called by another callback
+        self.save_snapshot(snapshot, self.model.num_timesteps, score)
+
+    # Writes a snapshot taken earlier with snapshot_model, e.g. once its evaluation is known
+    def save_snapshot(self, snapshot, timesteps, score=None):
+        path = os.path.join(self.save_path, f"{self.name_prefix}_{timesteps}.zip")
+        self.num_saved += 1
+        number = None
+        if score is None:
+            self.num_periodic_saved += 1
+            number = self.num_periodic_saved
+        record = {'timesteps': timesteps, 'path': path, 'number': number, 'score': score}
+
+        self._pending = [future for future in self._pending if not future.done()]
+        self._pending.append(self._writer.submit(self._write, snapshot, record))
+
+    def _write(self, snapshot, record):
+        write_snapshot(snapshot, record['path'])
+        if self.verbose:
+            print(f"Saved model to {record['path']}")
+
+        with self._lock:
+            # A periodic and a best checkpoint at the same timesteps share one record, with the number and the score
+            for checkpoint in self.checkpoints:
+                if checkpoint['path'] == record['path']:
+                    for key in ('number', 'score'):
+                        if record[key] is None:
+                            record[key] = checkpoint[key]
+            self.checkpoints = [checkpoint for checkpoint in self.checkpoints if checkpoint['path'] != record['path']]
+            self.checkpoints.append(record)
+            self._apply_retention()
+            self._write_manifest()
+
+    def _apply_retention(self):
+        keep = set(id(checkpoint) for checkpoint in self.checkpoints[-self.keep_last:])
+        keep.update(id(checkpoint) for checkpoint in self.checkpoints
+                    if checkpoint['number'] is not None and checkpoint['number'] % self.keep_every == 0)
+        best = self.best_checkpoint()
+        if best is not None:
+            keep.add(id(best))
+
+        for checkpoint in self.checkpoints:
+            if id(checkpoint) not in keep and os.path.exists(checkpoint['path']):
+                os.remove(checkpoint['path'])
+        self.checkpoints = [checkpoint for checkpoint in self.checkpoints if id(checkpoint) in keep]
+
+    def best_checkpoint(self):
+        scored = [checkpoint for checkpoint in self.checkpoints if checkpoint['score'] is not None]
+        return max(scored, key=lambda checkpoint: checkpoint['score']) if scored else None
+
+    def _write_manifest(self):
+        best = self.best_checkpoint()
+        manifest = {
+            'checkpoints': self.checkpoints,
+            'best': best['path'] if best is not None else None,
+        }
+        tmp_path = os.path.join(self.save_path, MANIFEST_FILE + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, os.path.join(self.save_path, MANIFEST_FILE))
+
+    # Waits for the checkpoints still being written
+    def wait(self):
+        for future in self._pending:
+            future.result()
+        self._pending = []
+
+    def _on_training_end(self):
+        self.wait()
+
+# Pass as callback_on_new_best of a (Maskable)EvalCallback: checkpoints the model with its new best mean reward
+class BestCheckpointCallback(BaseCallback):
+    def __init__(self, checkpoint_callback, verbose=0):
+        super().__init__(verbose)
+        self.checkpoint_callback = checkpoint_callback
+
+    def _on_step(self) -> bool:
+        self.checkpoint_callback.save(score=float(self.parent.best_mean_reward))
+        return True
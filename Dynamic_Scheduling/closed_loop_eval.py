@@ -0,0 +1,297 @@
+import argparse
+import glob
+import heapq
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+# Headless closed loop of the Unity scene (Simulation/Assets/Scripts) to rank policies on its operational metrics.
+# One episode is AirportSimulation.cs in agent mode without the visuals: the policy is called in-process with the
+# 40-value observation of the /predict contract of the Python servers (unity_agent.py, inference_server.py), and the
+# episode is scored with the metrics of Report.cs. AgentController.cs itself posts 20 values (-1 no plane, 0 normal,
+# 1 high priority), which the servers reject; the harness does not reproduce that mismatch.
+#   planes:     total_planes planes, 20 % high priority, service times uniform integers in [mean - 2, mean + 2)
+#               (Planes.InitializePlanes), drawn from the episode seed
+#   arrivals:   the first after 10 s, then exponential gaps with mean arrival_interval (fixed gaps with
+#               poisson=False). Arrived planes wait in the pending list of the scene. The default rate is higher than
+#               the runway can land, so a queue builds up and the order matters; with the scene's waitTime of
+#               10 s (--arrival-interval 10 --no-poisson) nobody waits and every policy scores the same.
+#   decisions:  while the arrival runway and a gate (server) are free, the policy picks one of the first 20
+#               pending planes: observation [index, high priority] * 20, [-1, -1] for empty slots
+#   service:    landing on the runway, taxi to the first idle gate, service, then the single departure taxiway.
+#               The gate is released when the plane starts taxiing out.
+#   report:     as Report.RecordPlaneServed / RecordServerUsage: the service interval runs from the start of
+#               the gate service to the end of the taxi out, the waiting time from the arrival to the start of
+#               the service, averaged over the planes that waited
+# Differences to the scene: it chains the next arrival to a gate release, so only one plane is ever pending and
+# the policy has no choice, and it drops a chosen plane when no gate is idle. Here arrivals follow their own
+# clock and decisions wait for a free gate. The landing and taxi durations depend on the waypoints of the scene,
+# the defaults are rough; pass the values measured in the scene.
+#   python closed_loop_eval.py --episodes 5000 --workers 8              # every checkpoint of agents/MaskablePPO
+#   python closed_loop_eval.py heuristic fifo agents/MaskablePPO/PPO_33/manual_save_5400000.npz
+
+CHECKPOINT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'agents', 'MaskablePPO')
+NUM_SLOTS = 20
+
+# Event types, in the order they are handled at the same time
+LANDED, SERVED, TAXI_OUT, DEPARTED, ARRIVAL = range(5)
+
+# Scene parameters (AirportSimulation.cs) and durations of the visual paths
+DEFAULT_CONFIG = dict(
+    total_planes=20,
+    num_servers=10,
+    mean_service_time=5,
+    high_priority_percentage=20,
+    first_arrival=10.0,
+    arrival_interval=2.0,
+    poisson=True,
+    landing_time=3.0,
+    taxi_in_time=2.0,
+    taxi_out_time=2.0,
+)
+
+class Report:
+    def __init__(self, num_servers):
+        self.num_servers = num_servers
+        self.planes_processed = 0
+        self.high_priority = 0
+        self.low_priority = 0
+        self.total_service_time = 0.0
+        self.total_waiting_time = 0.0
+        self.max_waiting_time = 0.0
+        self.planes_with_wait_time = 0
+        self.server_busy_time = np.zeros(num_servers)
+        self.server_usage_count = np.zeros(num_servers, dtype=np.int64)
+        # Not in Report.cs: waiting time of the high priority planes, what the policy is meant to cut
+        self.high_priority_waiting_time = 0.0
+        self.simulation_time = 0.0
+
+    def record_plane_served(self, high_priority, arrival_time, service_start, service_end):
+        self.planes_processed += 1
+        if high_priority:
+            self.high_priority += 1
+        else:
+            self.low_priority += 1
+        self.total_service_time += service_end - service_start
+
+        if service_start > arrival_time:
+            wait = service_start - arrival_time
+            self.total_waiting_time += wait
+            self.max_waiting_time = max(self.max_waiting_time, wait)
+            self.planes_with_wait_time += 1
+            if high_priority:
+                self.high_priority_waiting_time += wait
+
+    def record_server_usage(self, server, busy_time):
+        self.server_busy_time[server] += busy_time
+        self.server_usage_count[server] += 1
+
+    # The values of Report.GenerateReport
+    def metrics(self):
+        sim_time = float(self.simulation_time)
+        return {
+            'simulation_time': sim_time,
+            'planes_processed': self.planes_processed,
+            'high_priority': self.high_priority,
+            'low_priority': self.low_priority,
+            'avg_service_time': float(self.total_service_time / self.planes_processed) if self.planes_processed else 0.0,
+            'avg_waiting_time': float(self.total_waiting_time / self.planes_with_wait_time) if self.planes_with_wait_time else 0.0,
+            'max_waiting_time': float(self.max_waiting_time),
+            'avg_high_priority_waiting_time': float(self.high_priority_waiting_time / self.high_priority) if self.high_priority else 0.0,
+            'server_utilization': float((self.server_busy_time / sim_time * 100).mean()) if sim_time > 0 else 0.0, # Mean over the servers, in %
+            'throughput_per_minute': self.planes_processed / sim_time * 60 if sim_time > 0 else 0.0,
+        }
+
+# Plays one episode with the policy, returns the report metrics and the number of decisions
+def run_episode(policy, seed, config=DEFAULT_CONFIG):
+    rng = np.random.default_rng(seed)
+    n = config['total_planes']
+    high_priority = rng.integers(0, 100, size=n) < config['high_priority_percentage']
+    mean_service = int(config['mean_service_time'])
+    service_times = rng.integers(mean_service - 2, mean_service + 2, size=n).astype(np.float64)
+    if config['poisson']:
+        gaps = rng.exponential(config['arrival_interval'], size=n - 1)
+    else:
+        gaps = np.full(n - 1, config['arrival_interval'])
+    arrival_times = config['first_arrival'] + np.concatenate([[0.0], np.cumsum(gaps)])
+
+    report = Report(config['num_servers'])
+    server_idle = np.ones(config['num_servers'], dtype=bool)
+    service_start = np.zeros(n)
+    server_of = np.full(n, -1)
+    pending = [] # Plane IDs in arrival order
+    runway_free = True
+    departure_free_at = 0.0 # The departure taxiway is used by one plane at a time
+    observation = np.full((1, NUM_SLOTS * 2), -1, dtype=np.float32)
+    mask = np.zeros((1, NUM_SLOTS), dtype=bool)
+    num_decisions = 0
+
+    # (time, event type, seq, plane)
+    events = [(arrival_times[0], ARRIVAL, 0, 0)]
+    seq = 1
+    clock = 0.0
+    while events:
+        clock, kind, _, plane = heapq.heappop(events)
+
+        if kind == ARRIVAL:
+            pending.append(plane)
+            if plane + 1 < n:
+                heapq.heappush(events, (arrival_times[plane + 1], ARRIVAL, seq, plane + 1))
+                seq += 1
+        elif kind == LANDED:
+            runway_free = True
+            service_start[plane] = clock + config['taxi_in_time']
+            heapq.heappush(events, (service_start[plane] + service_times[plane], SERVED, seq, plane))
+            seq += 1
+        elif kind == SERVED:
+            # Waits at the gate until the departure taxiway is clear
+            departure_start = max(clock, departure_free_at)
+            departure_free_at = departure_start + config['taxi_out_time']
+            heapq.heappush(events, (departure_start, TAXI_OUT, seq, plane))
+            seq += 1
+        elif kind == TAXI_OUT:
+            server_idle[server_of[plane]] = True
+            heapq.heappush(events, (clock + config['taxi_out_time'], DEPARTED, seq, plane))
+            seq += 1
+        else:
+            report.record_plane_served(high_priority[plane], arrival_times[plane], service_start[plane], clock)
+            report.record_server_usage(server_of[plane], clock - service_start[plane])
+
+        # Decision when a plane can land
+        if runway_free and pending and server_idle.any():
+            visible = pending[:NUM_SLOTS]
+            observation[0, :] = -1
+            observation[0, 0:len(visible) * 2:2] = np.arange(len(visible))
+            observation[0, 1:len(visible) * 2:2] = high_priority[visible]
+            mask[0, :] = False
+            mask[0, :len(visible)] = True
+            action, _ = policy.predict(observation, deterministic=True, action_masks=mask)
+            slot = int(np.asarray(action).reshape(-1)[0])
+            # As AgentController.ProcessServerResponse, invalid choices fall back to the first plane
+            if not 0 <= slot < len(visible):
+                slot = 0
+            num_decisions += 1
+
+            chosen = pending.pop(slot)
+            server = int(np.argmax(server_idle)) # FindIdleServer: the first idle gate
+            server_idle[server] = False
+            server_of[chosen] = server
+            runway_free = False
+            heapq.heappush(events, (clock + config['landing_time'], LANDED, seq, chosen))
+            seq += 1
+
+    report.simulation_time = clock
+    return report.metrics(), num_decisions
+
+# 'heuristic' (first high priority plane), 'fifo' (first pending plane), or a checkpoint: the .npz of
+# policy_export.py, or a MaskablePPO .zip converted to the NumPy runtime
+def load_policy(name):
+    from heuristic_scheduler import FirstFreeSlot, ObservationHeuristic
+    from policy_export import NumpyPolicy
+
+    if name == 'heuristic':
+        return ObservationHeuristic()
+    if name == 'fifo':
+        return FirstFreeSlot()
+    if name.endswith('.npz'):
+        return NumpyPolicy.load(name)
+    from sb3_contrib import MaskablePPO
+    return NumpyPolicy.from_model(MaskablePPO.load(name, device='cpu'))
+
+# Checkpoints below root, the .npz where a checkpoint has been exported too
+def find_checkpoints(root=CHECKPOINT_ROOT):
+    paths = {}
+    for extension in ('.zip', '.npz'):
+        for path in glob.glob(os.path.join(root, '**', '*' + extension), recursive=True):
+            paths[os.path.splitext(path)[0]] = path
+    return sorted(paths.values())
+
+_policies = {} # Loaded once per worker process
+
+def run_shard(name, seeds, config):
+    if name not in _policies:
+        _policies[name] = load_policy(name)
+    policy = _policies[name]
+
+    start = time.perf_counter()
+    metrics = []
+    num_decisions = 0
+    for seed in seeds:
+        episode_metrics, episode_decisions = run_episode(policy, seed, config)
+        metrics.append(episode_metrics)
+        num_decisions += episode_decisions
+    return name, metrics, num_decisions, time.perf_counter() - start
+
+# Every policy plays the same num_episodes seeded episodes (common random numbers), shards of episodes run in a
+# process pool. Returns {policy: {metric: mean over episodes, ...}}
+def evaluate(policies, num_episodes=1000, seed=0, config=None, max_workers=None, shard_size=250, verbose=True):
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    seeds = list(range(seed, seed + num_episodes))
+    shards = [seeds[i:i + shard_size] for i in range(0, num_episodes, shard_size)]
+
+    episodes = {name: [] for name in policies}
+    decisions = dict.fromkeys(policies, 0)
+    busy_time = dict.fromkeys(policies, 0.0)
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(run_shard, name, shard, config) for name in policies for shard in shards]
+        for future in as_completed(futures):
+            name, metrics, num_decisions, elapsed = future.result()
+            episodes[name] += metrics
+            decisions[name] += num_decisions
+            busy_time[name] += elapsed
+            if verbose and len(episodes[name]) == num_episodes:
+                print(f"{name}: {num_episodes} episodes, {busy_time[name]:.1f} sec in workers")
+
+    results = {}
+    for name in policies:
+        frame = {key: np.array([episode[key] for episode in episodes[name]]) for key in episodes[name][0]}
+        results[name] = {key: float(values.mean()) for key, values in frame.items()}
+        results[name]['avg_waiting_time_std'] = float(frame['avg_waiting_time'].std())
+        results[name]['episodes_per_sec'] = num_episodes / busy_time[name]
+        results[name]['decisions'] = decisions[name]
+    return results
+
+# Policies by a metric, smallest first (largest first for throughput and utilization).
+# The mean waiting time hardly depends on the order planes land in, the high priority waiting time does.
+def rank(results, metric='avg_high_priority_waiting_time'):
+    descending = metric in ('throughput_per_minute', 'server_utilization')
+    return sorted(results, key=lambda name: -results[name][metric] if descending else results[name][metric])
+
+def format_ranking(results, metric='avg_high_priority_waiting_time', root=CHECKPOINT_ROOT):
+    columns = ['avg_high_priority_waiting_time', 'avg_waiting_time', 'max_waiting_time', 'avg_service_time',
+               'server_utilization', 'throughput_per_minute', 'simulation_time', 'episodes_per_sec']
+    width = max(len(os.path.relpath(name, root)) if os.path.exists(name) else len(name) for name in results)
+    headers = ['hp wait', 'wait', 'max wait', 'service', 'utilization %', 'planes/min', 'sim time', 'episodes/s']
+    lines = [f"{'policy':<{width}} " + ' '.join(f'{header:>13}' for header in headers)]
+    for name in rank(results, metric):
+        label = os.path.relpath(name, root) if os.path.exists(name) else name
+        lines.append(f"{label:<{width}} " + ' '.join(f'{results[name][column]:>13.3f}' for column in columns))
+    return '\n'.join(lines)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('policies', nargs='*', help="heuristic, fifo or checkpoint paths, default: every checkpoint in agents/MaskablePPO and the heuristics")
+    parser.add_argument('--episodes', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--metric', default='avg_high_priority_waiting_time', help="Metric to rank by")
+    parser.add_argument('--output', default=None, help="Write the results to this JSON file")
+    for key, value in DEFAULT_CONFIG.items():
+        if isinstance(value, bool):
+            parser.add_argument(f"--{key.replace('_', '-')}", action=argparse.BooleanOptionalAction, default=value)
+        else:
+            parser.add_argument(f"--{key.replace('_', '-')}", type=type(value), default=value)
+    args = parser.parse_args()
+
+    policies = args.policies or find_checkpoints() + ['heuristic', 'fifo']
+    config = {key: getattr(args, key) for key in DEFAULT_CONFIG}
+    start = time.perf_counter()
+    results = evaluate(policies, args.episodes, args.seed, config, args.workers)
+    print(format_ranking(results, args.metric))
+    print(f"{len(policies)} policies x {args.episodes} episodes in {time.perf_counter() - start:.1f} sec")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'config': config, 'episodes': args.episodes, 'seed': args.seed, 'results': results}, f, indent=2)
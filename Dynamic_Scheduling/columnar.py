@@ -0,0 +1,84 @@
+import json
+import os
+
+import numpy as np
+
+# Append-only columnar store: a directory with one raw little-endian file per column and a schema.json
+# mapping column names to numpy dtypes. Rows are appended to every column file and flushed, so readers see
+# complete rows while a writer is still running. Columns are read back as memory maps without copying.
+# A row cut short by a crash leaves column files of different lengths, they are trimmed to the shortest one on open.
+
+SCHEMA_FILE = 'schema.json'
+
+def _column_path(path, name):
+    return os.path.join(path, f'{name}.col')
+
+def read_schema(path):
+    with open(os.path.join(path, SCHEMA_FILE)) as f:
+        return {name: np.dtype(dtype) for name, dtype in json.load(f).items()}
+
+def num_rows(path):
+    schema = read_schema(path)
+    return min(os.path.getsize(_column_path(path, name)) // dtype.itemsize for name, dtype in schema.items())
+
+class ColumnWriter:
+    # schema: {column name: dtype}, has to match the schema of an existing store
+    def __init__(self, path, schema):
+        self.path = path
+        self.schema = {name: np.dtype(dtype).newbyteorder('<') for name, dtype in schema.items()}
+        os.makedirs(path, exist_ok=True)
+
+        schema_path = os.path.join(path, SCHEMA_FILE)
+        if os.path.exists(schema_path):
+            existing = read_schema(path)
+            if existing != self.schema:
+                raise ValueError(f"Schema of {path} does not match: {existing} != {self.schema}")
+        else:
+            with open(schema_path, 'w') as f:
+                json.dump({name: dtype.str for name, dtype in self.schema.items()}, f, indent=2)
+            for name in self.schema:
+                open(_column_path(path, name), 'wb').close()
+
+        # Drop a partially written row
+        rows = num_rows(path)
+        for name, dtype in self.schema.items():
+            column_path = _column_path(path, name)
+            if os.path.getsize(column_path) != rows * dtype.itemsize:
+                os.truncate(column_path, rows * dtype.itemsize)
+        self.num_rows = rows
+
+        self._files = {name: open(_column_path(path, name), 'ab') for name in self.schema}
+
+    # columns: {column name: value or array of values}, all columns of the schema, same number of rows each
+    def append(self, columns):
+        arrays = {name: np.atleast_1d(np.asarray(columns[name], dtype=dtype)) for name, dtype in self.schema.items()}
+        for name, array in arrays.items():
+            self._files[name].write(array.tobytes())
+        for f in self._files.values():
+            f.flush()
+        self.num_rows += len(next(iter(arrays.values())))
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# Returns {column name: array} of the complete rows, columns=None reads all of them
+def read_columns(path, columns=None):
+    schema = read_schema(path)
+    rows = num_rows(path)
+    if columns is None:
+        columns = list(schema)
+
+    result = {}
+    for name in columns:
+        if rows == 0:
+            result[name] = np.zeros(0, dtype=schema[name])
+        else:
+            result[name] = np.memmap(_column_path(path, name), dtype=schema[name], mode='r', shape=(rows,))
+    return result
@@ -0,0 +1,80 @@
+import numpy as np
+
+from airplane_boarding_vec import AirplaneVecEnv
+
+# What-if rollouts: from the current state of an AirplaneEnv, every plane that could be sent to land is sent,
+# and the episode is played to the end under a policy. All rollouts are stepped together in one AirplaneVecEnv
+# restored from a snapshot of the environment, with one batched policy call per step.
+# The outcome of an action is the return from the current state on (its own reward included) and the number
+# of decisions left. With deterministic=False every action is rolled out num_samples times, sampling the
+# policy's actions, which gives a distribution of outcomes per action.
+#   evaluator = CounterfactualEvaluator(NumpyPolicy.load(...), num_samples=32, deterministic=False)
+#   outcomes = evaluator.evaluate(env)   # "why plane X and not plane Y": compare outcomes[x] and outcomes[y]
+
+class CounterfactualEvaluator:
+    # policy: NumpyPolicy (sampled from its logits) or an SB3 model (sampled by its predict)
+    def __init__(self, policy, num_samples=1, deterministic=True, seed=None):
+        self.policy = policy
+        self.num_samples = 1 if deterministic else num_samples
+        self.deterministic = deterministic
+        self.rng = np.random.default_rng(seed)
+        self._vec_envs = {}
+
+    # One AirplaneVecEnv per configuration and batch size, reused across calls
+    def _vec_env(self, env, num_envs):
+        key = (env.num_of_rows, env.seats_per_row, env.num_of_plane_rows, env.num_of_visible_planes, num_envs)
+        if key not in self._vec_envs:
+            self._vec_envs[key] = AirplaneVecEnv(num_envs=num_envs, num_of_rows=env.num_of_rows, seats_per_row=env.seats_per_row,
+                                                 num_of_plane_rows=env.num_of_plane_rows, num_of_visible_planes=env.num_of_visible_planes)
+        return self._vec_envs[key]
+
+    def _act(self, observations, masks):
+        if self.deterministic or not hasattr(self.policy, 'logits'):
+            actions, _ = self.policy.predict(observations, deterministic=self.deterministic, action_masks=masks)
+            return np.asarray(actions)
+
+        # Sampling from the masked softmax with the Gumbel-max trick
+        logits = np.where(masks, self.policy.logits(observations), -np.inf)
+        return np.argmax(logits + self.rng.gumbel(size=logits.shape), axis=1)
+
+    # Returns {slot: {'plane', 'high_priority', 'returns', 'lengths', 'mean_return', 'std_return'}} for every
+    # unmasked slot of env (an AirplaneEnv, unwrapped), whose state is left unchanged
+    def evaluate(self, env):
+        slots = np.flatnonzero(env._action_mask)
+        num_envs = len(slots) * self.num_samples
+        vec_env = self._vec_env(env, num_envs)
+        vec_env.restore(env.snapshot())
+
+        actions = np.repeat(slots, self.num_samples)
+        returns = np.zeros(num_envs)
+        lengths = np.zeros(num_envs, dtype=np.int64)
+        alive = np.ones(num_envs, dtype=bool)
+
+        while True:
+            observations, rewards, dones, _ = vec_env.step(actions)
+            returns += np.where(alive, rewards, 0)
+            lengths += alive
+            # Finished airports are reset by the vec env, their further steps are not counted
+            alive &= ~dones
+            if not alive.any():
+                break
+            actions = self._act(observations, vec_env.action_masks())
+
+        returns = returns.reshape(len(slots), self.num_samples)
+        lengths = lengths.reshape(len(slots), self.num_samples)
+        outcomes = {}
+        for i, slot in enumerate(slots.tolist()):
+            plane_id = int(env.window[slot])
+            outcomes[slot] = {
+                'plane': plane_id,
+                'high_priority': bool(env.high_priority[plane_id]),
+                'returns': returns[i],
+                'lengths': lengths[i],
+                'mean_return': float(returns[i].mean()),
+                'std_return': float(returns[i].std()),
+            }
+        return outcomes
+
+# Slot with the best mean return, e.g. a one-step lookahead policy over the base policy
+def best_slot(outcomes):
+    return max(outcomes, key=lambda slot: outcomes[slot]['mean_return'])
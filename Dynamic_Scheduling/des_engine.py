@@ -0,0 +1,280 @@
+import argparse
+import collections
+import heapq
+import math
+import time
+
+# Discrete-event simulation of arrivals and runway service, the Python counterpart of the MATLAB engine in DES/.
+#   RandU:      the @randu streams, a multiplicative LCG (Law & Kelton) with 100 seeded streams
+#   DES:        the @des engine, events are kept in a binary heap of (time, seq, slot) and their records in slots
+#               that are reused once handled, so pushing and popping cost O(log n) instead of a copy of the list
+#   AirportSim: the @testSim model generalized to any number of queues and servers (runways), with the
+#               utilization / queue length / delay report of DES/@testSim/report.m
+# A DES can also be advanced step by step with run(until=...): airplane_des.py drives the arrivals and landings
+# of the RL environment with it, one run per env tick.
+# The engine stays pure Python rather than compiled (numba): the env calls back into Python on every event anyway,
+# and a sweep cell of a million events runs in a few seconds in its own worker process (des_sweep.py).
+
+MODULUS = 2147483647
+MULTIPLIER = 630360016
+
+# Seeds of the streams, the same table as DES/@randu/randu.m. Streams are numbered from 1 as in MATLAB.
+SEEDS = (
+    1, 1973272912, 281629770, 20006270, 1280689831, 2096730329, 1933576050, 913566091, 246780520, 1363774876,
+    604901985, 1511192140, 1259851944, 824064364, 150493284, 242708531, 75253171, 1964472944, 1202299975, 233217322,
+    1911216000, 726370533, 403498145, 993232223, 1103205531, 762430696, 1922803170, 1385516923, 76271663, 413682397,
+    726466604, 336157058, 1432650381, 1120463904, 595778810, 877722890, 1046574445, 68911991, 2088367019, 748545416,
+    622401386, 2122378830, 640690903, 1774806513, 2132545692, 2079249579, 78130110, 852776735, 1187867272, 1351423507,
+    1645973084, 1997049139, 922510944, 2045512870, 898585771, 243649545, 1004818771, 773686062, 403188473, 372279877,
+    1901633463, 498067494, 2087759558, 493157915, 597104727, 1530940798, 1814496276, 536444882, 1663153658, 855503735,
+    67784357, 1432404475, 619691088, 119025595, 880802310, 176192644, 1116780070, 277854671, 1366580350, 1142483975,
+    2026948561, 1053920743, 786262391, 1792203830, 1494667770, 1923011392, 1433700034, 1244184613, 1147297105, 539712780,
+    1545929719, 190641742, 1645390429, 264907697, 620389253, 1502074852, 927711160, 364849192, 2049576050, 638580085,
+    547070247,
+)
+
+# Seed table for independent replications: every stream jumped ahead by replication * jump draws,
+# so runs with different replications never share random numbers as long as a stream draws less than jump numbers
+def replication_seeds(replication, jump=10**8):
+    factor = pow(MULTIPLIER, replication * jump, MODULUS)
+    return tuple(factor * seed % MODULUS for seed in SEEDS)
+
+class RandU:
+    # Same calling convention as @randu: nextlcg advances a stream, the other methods map its current value.
+    # The LCG is computed with exact integers, MATLAB's doubles lose precision on the 60 bit product.
+    def __init__(self, seeds=SEEDS):
+        self.zrng = list(seeds)
+
+    def nextlcg(self, stream):
+        self.zrng[stream - 1] = MULTIPLIER * self.zrng[stream - 1] % MODULUS
+
+    # Uniform on (0, 1)
+    def nextu(self, stream):
+        return self.zrng[stream - 1] / MODULUS
+
+    # Exponential with mean beta
+    def nexte(self, stream, beta):
+        return -beta * math.log(self.zrng[stream - 1] / MODULUS)
+
+    def nextw(self, stream, alpha, beta):
+        return beta * math.exp(-math.log(1 - self.zrng[stream - 1] / MODULUS) / alpha)
+
+    # First value whose cumulative probability exceeds the uniform draw
+    def nextdiscrete(self, values, probabilities, stream):
+        u = self.zrng[stream - 1] / MODULUS
+        cumulative = 0.0
+        for value, probability in zip(values, probabilities):
+            cumulative += probability
+            if cumulative > u:
+                return value
+        return None
+
+class DES:
+    # Event types, subclasses may add their own
+    START = 0
+
+    def __init__(self, max_clock=0.0):
+        self.clock = 0.0
+        self.max_clock = max_clock
+        self.num_events = 0
+
+        # Heap of (time, seq, slot), seq keeps events with the same time in the order they were added
+        self._heap = []
+        self._seq = 0
+        # Event records, one slot per pending event, freed slots are reused
+        self._event_type = []
+        self._event_server = []
+        self._free_slots = []
+
+        self.add_event(self.START, 0.0)
+
+    def add_event(self, event_type, event_time, server=-1):
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            self._event_type[slot] = event_type
+            self._event_server[slot] = server
+        else:
+            slot = len(self._event_type)
+            self._event_type.append(event_type)
+            self._event_server.append(server)
+
+        heapq.heappush(self._heap, (event_time, self._seq, slot))
+        self._seq += 1
+
+    def pending(self):
+        return len(self._heap)
+
+    # Handles events in time order until iseos(), the event list is empty or the next event is later than until.
+    # Returns the number of events handled.
+    def run(self, until=None):
+        heap = self._heap
+        handled = 0
+        while heap and not self.iseos():
+            if until is not None and heap[0][0] > until:
+                break
+
+            event_time, _, slot = heapq.heappop(heap)
+            event_type = self._event_type[slot]
+            server = self._event_server[slot]
+            self._free_slots.append(slot)
+
+            self.clock = event_time
+            self.handle(event_type, server)
+            handled += 1
+
+        self.num_events += handled
+        return handled
+
+    def iseos(self):
+        return self.clock >= self.max_clock
+
+    def handle(self, event_type, server):
+        pass
+
+    def report(self):
+        return {}
+
+class AirportSim(DES):
+    ARRIVAL = 1
+    DEPARTURE = 2
+
+    # Random number streams, as used by DES/@testSim/handle.m
+    ARRIVAL_STREAM = 1
+    SERVICE_STREAM = 2
+
+    # arrival and service are the mean interarrival and service times, the run ends after delay_limit arrivals
+    def __init__(self, arrival, service, delay_limit, num_queues=2, num_servers=4, seeds=SEEDS):
+        self.arrival = arrival
+        self.service = service
+        self.delay_limit = delay_limit
+        self.r = RandU(seeds)
+
+        self.servers = [0] * num_servers
+        self.queues = [collections.deque() for _ in range(num_queues)] # Arrival time of every waiting aircraft
+
+        self.numguestdelayed = 0
+        self.totaldelays = 0.0
+
+        # Time-weighted sums of queue lengths and server busy times, brought up to date when a queue or server changes.
+        # report.m weighs the state after each event by the time since the previous event instead, which counts
+        # the idle time before an arrival as busy: 83% utilization of a single server at a load of 50%.
+        self._queue_area = [0.0] * num_queues
+        self._queue_changed = [0.0] * num_queues
+        self._server_area = [0.0] * num_servers
+        self._busy_since = [0.0] * num_servers
+
+        super().__init__()
+
+    def iseos(self):
+        return self.numguestdelayed >= self.delay_limit
+
+    def _service_time(self):
+        self.r.nextlcg(self.SERVICE_STREAM)
+        return self.r.nexte(self.SERVICE_STREAM, self.service)
+
+    def _schedule_arrival(self):
+        self.r.nextlcg(self.ARRIVAL_STREAM)
+        self.add_event(self.ARRIVAL, self.clock + self.r.nexte(self.ARRIVAL_STREAM, self.arrival))
+
+    def handle(self, event_type, server):
+        if event_type == self.START:
+            self._schedule_arrival()
+
+        elif event_type == self.ARRIVAL:
+            self._schedule_arrival()
+
+            # The first idle server takes the aircraft, otherwise it joins the shortest queue
+            if 0 in self.servers:
+                idle = self.servers.index(0)
+                self.servers[idle] = 1
+                self._busy_since[idle] = self.clock
+                self.add_event(self.DEPARTURE, self.clock + self._service_time(), idle)
+            else:
+                shortest = 0
+                for q in range(1, len(self.queues)):
+                    if len(self.queues[q]) < len(self.queues[shortest]):
+                        shortest = q
+                self._queue_change(shortest)
+                self.queues[shortest].append(self.clock)
+            self.numguestdelayed += 1
+
+        elif event_type == self.DEPARTURE:
+            # The server takes the next aircraft of the longest queue, or becomes idle
+            longest = 0
+            for q in range(1, len(self.queues)):
+                if len(self.queues[q]) > len(self.queues[longest]):
+                    longest = q
+            if self.queues[longest]:
+                self._queue_change(longest)
+                self.totaldelays += self.clock - self.queues[longest].popleft()
+                self.add_event(self.DEPARTURE, self.clock + self._service_time(), server)
+            else:
+                self.servers[server] = 0
+                self._server_area[server] += self.clock - self._busy_since[server]
+
+    def _queue_change(self, q):
+        self._queue_area[q] += len(self.queues[q]) * (self.clock - self._queue_changed[q])
+        self._queue_changed[q] = self.clock
+
+    def report(self):
+        avg_delay = self.totaldelays / self.numguestdelayed if self.numguestdelayed > 0 else 0.0
+        end = self.clock if self.clock > 0 else 1.0
+        # Include the time since the last change of every queue and busy server
+        queue_lengths = [(area + len(queue) * (self.clock - changed)) / end
+                         for area, queue, changed in zip(self._queue_area, self.queues, self._queue_changed)]
+        utilizations = [100 * (area + busy * (self.clock - since)) / end
+                        for area, busy, since in zip(self._server_area, self.servers, self._busy_since)]
+        return {
+            'num_queues': len(self.queues),
+            'num_servers': len(self.servers),
+            'clock': self.clock,
+            'num_events': self.num_events,
+            'avg_delay': avg_delay,
+            'avg_queue_lengths': queue_lengths,
+            'server_utilizations': utilizations,
+            'avg_queue_length': sum(queue_lengths) / len(queue_lengths),
+            'avg_server_utilization': sum(utilizations) / len(utilizations),
+        }
+
+ORDINALS = ('First', 'Second', 'Third', 'Forth')
+
+# Report in the format of DES/@testSim/report.m, followed by the summary lines read by DES/extractLastMetrics.m
+def format_report(report):
+    def ordinal(i):
+        return ORDINALS[i] if i < len(ORDINALS) else f"#{i + 1}"
+
+    lines = [f"Average Delay = {report['avg_delay']:0.4f}"]
+    lines += [f"Average {ordinal(i)} Queue Length = {length:0.4f}" for i, length in enumerate(report['avg_queue_lengths'])]
+    lines += [f"Average {ordinal(i)} Server Utilization = {utilization:f} %" for i, utilization in enumerate(report['server_utilizations'])]
+    lines += [
+        f"Queue Number = {report['num_queues']}",
+        f"Server Number = {report['num_servers']}",
+        f"Average Server Utilization = {report['avg_server_utilization']:f} %",
+        f"Average queue length = {report['avg_queue_length']:0.4f}",
+    ]
+    return "\n".join(lines)
+
+def write_report(report, log_path='simulation_output.log'):
+    with open(log_path, 'a') as f:
+        f.write(format_report(report) + "\n----\n")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--arrival', type=float, default=1.0, help="Mean interarrival time")
+    parser.add_argument('--service', type=float, default=0.5, help="Mean service time")
+    parser.add_argument('--delay-limit', type=int, default=1000, help="Number of arrivals to simulate")
+    parser.add_argument('--queues', type=int, default=2)
+    parser.add_argument('--servers', type=int, default=4)
+    parser.add_argument('--log', default=None, help="Append the report to this file, e.g. DES/simulation_output.log")
+    args = parser.parse_args()
+
+    sim = AirportSim(args.arrival, args.service, args.delay_limit, args.queues, args.servers)
+    start = time.perf_counter()
+    sim.run()
+    wall_time = time.perf_counter() - start
+
+    report = sim.report()
+    print(format_report(report))
+    print(f"\n{report['num_events']} events in {wall_time:.3f} sec ({report['num_events'] / wall_time:,.0f} events/sec)")
+    if args.log:
+        write_report(report, args.log)
@@ -0,0 +1,137 @@
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from columnar import ColumnWriter, read_columns
+from des_engine import AirportSim, replication_seeds
+
+# Parameter sweep of the landing simulation, replacing DES/runSimComparison.m.
+# Every cell of queues x servers x arrival x service x seeds runs in a worker process, the metrics come back
+# with the result and are appended to a columnar store (see columnar.py) as soon as a cell finishes.
+# Cells already in the store are skipped, so an interrupted sweep continues where it stopped when rerun.
+
+# Configuration of a cell, identifies it in the results
+CELL_COLUMNS = {
+    'queues': np.int32,
+    'servers': np.int32,
+    'arrival': np.float64,
+    'service': np.float64,
+    'delay_limit': np.int64,
+    'seed': np.int32,
+}
+
+RESULT_COLUMNS = {
+    **CELL_COLUMNS,
+    'utilization': np.float64,  # Mean over the servers, in %
+    'queue_length': np.float64, # Mean over the queues
+    'delay': np.float64,
+    'sim_clock': np.float64,
+    'num_events': np.int64,
+    'wall_time': np.float64,
+}
+
+RESULTS_PATH = 'sweep_results'
+
+def run_cell(queues, servers, arrival, service, delay_limit, seed):
+    sim = AirportSim(arrival, service, delay_limit, num_queues=queues, num_servers=servers, seeds=replication_seeds(seed))
+    start = time.perf_counter()
+    sim.run()
+    wall_time = time.perf_counter() - start
+
+    report = sim.report()
+    return {
+        'queues': queues,
+        'servers': servers,
+        'arrival': arrival,
+        'service': service,
+        'delay_limit': delay_limit,
+        'seed': seed,
+        'utilization': report['avg_server_utilization'],
+        'queue_length': report['avg_queue_length'],
+        'delay': report['avg_delay'],
+        'sim_clock': report['clock'],
+        'num_events': report['num_events'],
+        'wall_time': wall_time,
+    }
+
+def grid(queue_counts=(1, 2), server_counts=(1, 2), arrivals=(1.0,), services=(0.5,), delay_limit=1000, seeds=(0,)):
+    return [
+        (queues, servers, arrival, service, delay_limit, seed)
+        for queues, servers, arrival, service, seed in itertools.product(queue_counts, server_counts, arrivals, services, seeds)
+    ]
+
+def finished_cells(path):
+    if not os.path.exists(path):
+        return set()
+    columns = read_columns(path, list(CELL_COLUMNS))
+    return set(zip(*(columns[name].tolist() for name in CELL_COLUMNS)))
+
+# Runs every cell not in the results yet, returns the metrics of the cells run by this call
+def sweep(cells, path=RESULTS_PATH, max_workers=None, verbose=True):
+    done = finished_cells(path)
+    todo = [cell for cell in cells if cell not in done]
+    if verbose:
+        print(f"{len(cells) - len(todo)} of {len(cells)} cells already done, running {len(todo)}")
+
+    results = []
+    with ColumnWriter(path, RESULT_COLUMNS) as writer, ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(run_cell, *cell) for cell in todo]
+        for future in as_completed(futures):
+            result = future.result()
+            writer.append(result)
+            results.append(result)
+            if verbose:
+                print(f"Queues: {result['queues']}, Servers: {result['servers']}, Arrival: {result['arrival']}, "
+                      f"Service: {result['service']}, Seed: {result['seed']}, Utilization: {result['utilization']:.2f} %, "
+                      f"Queue Length: {result['queue_length']:.4f}, Delay: {result['delay']:.4f}, "
+                      f"Wall Clock Time = {result['wall_time']:.4f} sec")
+    return results
+
+# Mean of a metric over the seeds, one table per (arrival, service) of the cells, shape (queue counts, server counts)
+# like the matrices of runSimComparison.m. Only rows of the given cells count: the store also keeps the cells
+# of earlier sweeps, with other seeds, delay limits or parameters.
+def summarize(path, metric, cells):
+    columns = read_columns(path)
+    cells = set(cells)
+    in_cells = np.array([cell in cells for cell in zip(*(columns[name].tolist() for name in CELL_COLUMNS))], dtype=bool)
+    queue_counts = sorted({cell[0] for cell in cells})
+    server_counts = sorted({cell[1] for cell in cells})
+
+    tables = {}
+    for arrival, service in sorted({(cell[2], cell[3]) for cell in cells}):
+        table = np.full((len(queue_counts), len(server_counts)), np.nan)
+        for q, queues in enumerate(queue_counts):
+            for s, servers in enumerate(server_counts):
+                rows = (in_cells & (columns['queues'] == queues) & (columns['servers'] == servers)
+                        & (columns['arrival'] == arrival) & (columns['service'] == service))
+                if rows.any():
+                    table[q, s] = columns[metric][rows].mean()
+        tables[arrival, service] = table
+    return tables
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--queues', type=int, nargs='+', default=[1, 2])
+    parser.add_argument('--servers', type=int, nargs='+', default=[1, 2])
+    parser.add_argument('--arrival', type=float, nargs='+', default=[1.0], help="Mean interarrival times")
+    parser.add_argument('--service', type=float, nargs='+', default=[0.5], help="Mean service times")
+    parser.add_argument('--delay-limit', type=int, default=1000, help="Number of arrivals per run")
+    parser.add_argument('--seeds', type=int, default=1, help="Number of replications per configuration")
+    parser.add_argument('--out', default=RESULTS_PATH)
+    parser.add_argument('--workers', type=int, default=None, help="Defaults to the number of CPUs")
+    args = parser.parse_args()
+
+    cells = grid(args.queues, args.servers, args.arrival, args.service, args.delay_limit, range(args.seeds))
+    start = time.perf_counter()
+    sweep(cells, args.out, args.workers)
+    print(f"\nSweep finished in {time.perf_counter() - start:.2f} sec")
+
+    for metric in ('utilization', 'queue_length', 'delay', 'wall_time'):
+        for (arrival, service), table in summarize(args.out, metric, cells).items():
+            print(f"\n{metric}, arrival {arrival}, service {service} (rows: queues {sorted(set(args.queues))}, "
+                  f"columns: servers {sorted(set(args.servers))})")
+            print(table)
@@ -0,0 +1,181 @@
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.logger import TensorBoardOutputFormat
+
+from airplane_boarding import AirplaneEnv
+from checkpointing import snapshot_model
+from policy_export import NumpyPolicy
+from scenario_bank import create_bank
+
+# Evaluation in worker processes, decoupled from training.
+# The evaluation set is a fixed scenario bank sampled from a seed, shared by the workers through its memory map.
+# A policy is anything picklable with predict(observation, action_masks=...), e.g. a NumpyPolicy snapshot of
+# the model being trained. Its episodes are split over the workers and played deterministically.
+# Metrics per evaluation:
+#   mean_reward, std_reward, mean_ep_length
+#   high_priority_order: mean position at which high priority planes were sent to land, 0 = first, 1 = last
+
+_worker_env = None
+
+def _init_worker(env_kwargs, scenario_bank):
+    global _worker_env
+    _worker_env = AirplaneEnv(**env_kwargs, scenario_bank=scenario_bank)
+
+def _evaluate_shard(policy, scenarios):
+    env = _worker_env
+    rewards = np.zeros(len(scenarios))
+    lengths = np.zeros(len(scenarios), dtype=np.int64)
+    high_priority_orders = np.zeros(len(scenarios))
+
+    for i, scenario in enumerate(scenarios):
+        obs, _ = env.reset(options={'scenario': int(scenario)})
+        terminated = False
+        orders = []
+        while not terminated:
+            action, _ = policy.predict(obs, action_masks=env.action_masks())
+            if env.high_priority[env.window[action]]:
+                orders.append(lengths[i])
+            obs, reward, terminated, _, _ = env.step(int(action))
+            rewards[i] += reward
+            lengths[i] += 1
+        high_priority_orders[i] = np.mean(orders) / max(lengths[i] - 1, 1) if orders else 0.0
+
+    return rewards, lengths, high_priority_orders
+
+def summarize(rewards, lengths, high_priority_orders):
+    return {
+        'mean_reward': float(np.mean(rewards)),
+        'std_reward': float(np.std(rewards)),
+        'mean_ep_length': float(np.mean(lengths)),
+        'high_priority_order': float(np.mean(high_priority_orders)),
+    }
+
+class ParallelEvaluator:
+    # scenario_bank: path of a bank to evaluate on, otherwise num_scenarios scenarios are sampled from seed
+    def __init__(self, env_kwargs, num_scenarios=1000, seed=0, n_workers=4, scenario_bank=None):
+        self.env_kwargs = env_kwargs
+        self.n_workers = n_workers
+
+        if scenario_bank is None:
+            num_planes = env_kwargs['num_of_rows'] * env_kwargs['seats_per_row']
+            self._tmp_dir = tempfile.TemporaryDirectory()
+            scenario_bank = os.path.join(self._tmp_dir.name, f'eval_scenarios_{seed}.npy')
+            self.num_scenarios = len(create_bank(scenario_bank, num_scenarios, num_planes, seed))
+        else:
+            self._tmp_dir = None
+            self.num_scenarios = len(np.load(scenario_bank, mmap_mode='r'))
+        self.scenario_bank = scenario_bank
+
+        # Spawned workers do not inherit the threads and state of the training process
+        self._pool = ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context('spawn'),
+                                         initializer=_init_worker, initargs=(env_kwargs, scenario_bank))
+
+    # Starts the evaluation of a policy, returns one future per shard of scenarios
+    def submit(self, policy):
+        shards = np.array_split(np.arange(self.num_scenarios), self.n_workers)
+        return [self._pool.submit(_evaluate_shard, policy, shard) for shard in shards]
+
+    @staticmethod
+    def collect(futures):
+        results = [future.result() for future in futures]
+        return tuple(np.concatenate(arrays) for arrays in zip(*results))
+
+    def evaluate(self, policy):
+        return summarize(*self.collect(self.submit(policy)))
+
+    def close(self):
+        self._pool.shutdown()
+        if self._tmp_dir is not None:
+            self._tmp_dir.cleanup()
+
+# Replaces MaskableEvalCallback on the training env: every eval_freq timesteps a frozen snapshot of the policy
+# is evaluated by the workers while training goes on. Results are written to the TensorBoard log of the run
+# at the timesteps of the snapshot. An evaluation due while the previous one is still running is skipped.
+# With a checkpoint_callback (checkpointing.AsyncCheckpointCallback), the model snapshot of a new best
+# evaluation is checkpointed with its score.
+class AsyncEvalCallback(BaseCallback):
+    def __init__(self, env_kwargs, eval_freq=100_000, num_scenarios=1000, seed=0, n_workers=4, checkpoint_callback=None, verbose=0):
+        super().__init__(verbose)
+        self.env_kwargs = env_kwargs
+        self.eval_freq = eval_freq
+        self.num_scenarios = num_scenarios
+        self.seed = seed
+        self.n_workers = n_workers
+        self.checkpoint_callback = checkpoint_callback
+
+        self.evaluator = None
+        self.best_mean_reward = -np.inf
+        self.last_metrics = None
+        self.num_skipped = 0
+        self._next_eval = eval_freq
+        self._pending = None
+
+    def _init_callback(self):
+        self.evaluator = ParallelEvaluator(self.env_kwargs, self.num_scenarios, self.seed, self.n_workers)
+
+    def _on_step(self) -> bool:
+        if self._pending is not None and all(future.done() for future in self._pending['futures']):
+            self._report(self._pending)
+            self._pending = None
+
+        if self.num_timesteps >= self._next_eval:
+            self._next_eval += self.eval_freq * ((self.num_timesteps - self._next_eval) // self.eval_freq + 1)
+            if self._pending is None:
+                self._submit()
+            else:
+                self.num_skipped += 1
+        return True
+
+    def _submit(self):
+        self._pending = {
+            'timesteps': self.num_timesteps,
+            'start': time.perf_counter(),
+            'futures': self.evaluator.submit(NumpyPolicy.from_model(self.model)),
+            'snapshot': snapshot_model(self.model) if self.checkpoint_callback is not None else None,
+        }
+
+    def _report(self, pending):
+        rewards, lengths, high_priority_orders = self.evaluator.collect(pending['futures'])
+        metrics = summarize(rewards, lengths, high_priority_orders)
+        metrics['wall_time'] = time.perf_counter() - pending['start']
+        self.last_metrics = metrics
+        timesteps = pending['timesteps']
+
+        writer = self._tensorboard_writer()
+        if writer is not None:
+            for key, value in metrics.items():
+                writer.add_scalar(f'eval/{key}', value, timesteps)
+            writer.add_histogram('eval/episode_reward', rewards, timesteps)
+            writer.flush()
+        else:
+            for key, value in metrics.items():
+                self.logger.record(f'eval/{key}', value)
+
+        if self.verbose:
+            print(f"Eval num_timesteps={timesteps}, episode_reward={metrics['mean_reward']:.2f} +/- {metrics['std_reward']:.2f}, "
+                  f"high priority order={metrics['high_priority_order']:.3f}, {metrics['wall_time']:.1f} sec")
+
+        if metrics['mean_reward'] > self.best_mean_reward:
+            self.best_mean_reward = metrics['mean_reward']
+            if self.verbose:
+                print("New best mean reward!")
+            if self.checkpoint_callback is not None:
+                self.checkpoint_callback.save_snapshot(pending['snapshot'], timesteps, score=metrics['mean_reward'])
+
+    def _tensorboard_writer(self):
+        for output_format in self.logger.output_formats:
+            if isinstance(output_format, TensorBoardOutputFormat):
+                return output_format.writer
+        return None
+
+    def _on_training_end(self):
+        if self._pending is not None:
+            self._report(self._pending)
+            self._pending = None
+        self.evaluator.close()
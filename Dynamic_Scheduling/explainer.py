@@ -0,0 +1,176 @@
+import collections
+import hashlib
+
+import numpy as np
+
+from policy_export import NumpyPolicy
+
+# Explanations of landing decisions of a MaskablePPO policy.
+# A decision is the masked argmax of the action logits, the explained quantity is the logit of the chosen plane.
+# Attributions are per observation feature: [plane_0_id, plane_0_priority, plane_1_id, ...].
+#   method='kernel':   KernelSHAP against a k-means summary of recorded observations
+#   method='gradient': Integrated Gradients from the background mean, computed in closed form for the MLP,
+#                      attributions add up to logit(obs) - logit(background mean) like SHAP values do
+# One explainer is kept per loaded model (see get_explainer) and results are cached per (model, observation, mask).
+
+def feature_names(obs_size):
+    return [f"plane_{i // 2}_id" if i % 2 == 0 else f"plane_{i // 2}_priority" for i in range(obs_size)]
+
+def model_hash(policy):
+    digest = hashlib.sha1()
+    for W, b in zip(policy.weights, policy.biases):
+        digest.update(W.tobytes())
+        digest.update(b.tobytes())
+    return digest.hexdigest()
+
+# Derivative of each activation function, in terms of its output
+ACTIVATION_GRADIENTS = {
+    'tanh': lambda h: 1 - h ** 2,
+    'relu': lambda h: (h > 0).astype(h.dtype),
+    'identity': lambda h: np.ones_like(h),
+}
+
+class PolicyExplainer:
+    def __init__(self, policy, background, n_clusters=20, cache_size=10_000):
+        # Accept a loaded MaskablePPO model as well as an exported NumpyPolicy
+        if not isinstance(policy, NumpyPolicy):
+            policy = NumpyPolicy.from_model(policy)
+
+        self.policy = policy
+        self.model_hash = model_hash(policy)
+
+        background = np.asarray(background, dtype=np.float32)
+        self.feature_names = feature_names(background.shape[1])
+        self.n_clusters = min(n_clusters, len(background))
+        self._background_observations = background
+        self._background = None
+        self._kernel_explainer = None
+
+        self.cache_size = cache_size
+        self._cache = collections.OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    # k-means summary of the recorded observations, built on first use
+    @property
+    def background(self):
+        if self._background is None:
+            import shap
+            self._background = shap.kmeans(self._background_observations, self.n_clusters)
+        return self._background
+
+    @property
+    def background_mean(self):
+        return np.average(self.background.data, axis=0, weights=self.background.weights).astype(np.float32)
+
+    @property
+    def kernel_explainer(self):
+        if self._kernel_explainer is None:
+            import shap
+            self._kernel_explainer = shap.KernelExplainer(self.policy.logits, self.background)
+        return self._kernel_explainer
+
+    # Explains the decisions for a batch of observations, masks default to the planes present in each observation.
+    # Returns one dict per decision with the chosen action, its attributions and the base value they add up from.
+    def explain(self, observations, masks=None, method='kernel', nsamples='auto'):
+        observations = np.atleast_2d(np.asarray(observations, dtype=np.float32))
+        if masks is None:
+            masks = observations[:, 0::2] != -1
+        masks = np.atleast_2d(np.asarray(masks, dtype=bool))
+
+        actions, _ = self.policy.predict(observations, action_masks=masks)
+
+        keys = [(self.model_hash, method, obs.tobytes(), mask.tobytes()) for obs, mask in zip(observations, masks)]
+        results = [self._cache_get(key) for key in keys]
+
+        # Everything not cached is explained in one batched call
+        misses = [i for i, result in enumerate(results) if result is None]
+        if misses:
+            attributions, base_values = self._attribute(observations[misses], actions[misses], method, nsamples)
+            for i, row_attributions, base_value in zip(misses, attributions, base_values):
+                results[i] = {
+                    'action': int(actions[i]),
+                    'attributions': row_attributions,
+                    'base_value': float(base_value),
+                }
+                self._cache_put(keys[i], results[i])
+
+        return results
+
+    def _attribute(self, observations, actions, method, nsamples):
+        if method == 'kernel':
+            shap_values = self.kernel_explainer.shap_values(observations, nsamples=nsamples, silent=True)
+            # Older shap versions return one (batch, features) array per action
+            if isinstance(shap_values, list):
+                shap_values = np.stack(shap_values, axis=-1)
+            rows = np.arange(len(actions))
+            expected_value = np.asarray(self.kernel_explainer.expected_value)
+            return shap_values[rows, :, actions], expected_value[actions]
+
+        if method == 'gradient':
+            return self._integrated_gradients(observations, actions)
+
+        raise ValueError(f"Unknown attribution method {method}")
+
+    def _integrated_gradients(self, observations, actions, steps=32):
+        baseline = self.background_mean
+        alphas = (np.arange(steps, dtype=np.float32) + 0.5) / steps
+
+        # All points on the paths from the baseline to every observation, shape (batch * steps, features)
+        path = baseline + alphas[None, :, None] * (observations - baseline)[:, None, :]
+        path = path.reshape(-1, observations.shape[1])
+        path_actions = np.repeat(actions, steps)
+
+        # Forward pass keeping the hidden activations, then backpropagate the chosen logit to the inputs
+        activations = [path]
+        for W, b in zip(self.policy.weights[:-1], self.policy.biases[:-1]):
+            activations.append(self.policy.activation(activations[-1] @ W + b))
+
+        gradient = self.policy.weights[-1][:, path_actions].T
+        activation_gradient = ACTIVATION_GRADIENTS[self.policy.activation_name]
+        for W, h in zip(reversed(self.policy.weights[:-1]), reversed(activations[1:])):
+            gradient = (gradient * activation_gradient(h)) @ W.T
+
+        mean_gradient = gradient.reshape(len(actions), steps, -1).mean(axis=1)
+        attributions = (observations - baseline) * mean_gradient
+        base_values = self.policy.logits(baseline[None])[0, actions]
+        return attributions, base_values
+
+    def _cache_get(self, key):
+        result = self._cache.get(key)
+        if result is None:
+            self.cache_misses += 1
+            return None
+        self._cache.move_to_end(key)
+        self.cache_hits += 1
+        return result
+
+    def _cache_put(self, key, result):
+        self._cache[key] = result
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    # Short text for controllers, listing the features that pushed the chosen plane's score the most
+    def describe(self, explanation, top=5):
+        lines = [f"Plane {explanation['action']} was selected to land next."]
+        attributions = explanation['attributions']
+        for i in np.argsort(np.abs(attributions))[::-1][:top]:
+            if abs(attributions[i]) < 0.01:
+                break
+            direction = "towards" if attributions[i] > 0 else "against"
+            lines.append(f"- {self.feature_names[i]} weighed {direction} this choice ({attributions[i]:+.3f})")
+        return "\n".join(lines)
+
+_explainers = {}
+
+# Returns the explainer of a model, creating it with the given background the first time the model is seen
+def get_explainer(policy, background=None, **kwargs):
+    if not isinstance(policy, NumpyPolicy):
+        policy = NumpyPolicy.from_model(policy)
+
+    key = model_hash(policy)
+    if key not in _explainers:
+        if background is None:
+            raise ValueError("A background of recorded observations is needed to create the explainer")
+        _explainers[key] = PolicyExplainer(policy, background, **kwargs)
+    return _explainers[key]
@@ -0,0 +1,114 @@
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from airplane_boarding import AirplaneEnv
+from stream_server import PORT, REPLY_FRAME, REQUEST_FRAME
+
+# Headless stand-in for Unity's AgentController on the binary channel of stream_server.py.
+# It plays AirplaneEnv episodes, asking the server for every decision, and measures round-trip latency and decisions/sec.
+
+class FakeUnityClient:
+    def __init__(self):
+        self.reader = None
+        self.writer = None
+        self._next_request_id = 0
+        self._pending = {}
+        self._reply_task = None
+        self._error = None # Why the reply stream ended, later decide() calls fail with it
+
+    async def connect(self, host='127.0.0.1', port=PORT):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        self._reply_task = asyncio.create_task(self._read_replies())
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+        self._reply_task.cancel()
+
+    async def decide(self, observation):
+        request_id = self._next_request_id
+        self._next_request_id = (self._next_request_id + 1) % 2**32
+
+        frame = np.zeros(1, dtype=REQUEST_FRAME)
+        frame['request_id'] = request_id
+        frame['obs'] = observation
+
+        if self._error is not None:
+            raise self._error
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self.writer.write(frame.tobytes())
+        await self.writer.drain()
+        return await future
+
+    # When the stream ends (server gone, connection reset, close()), every outstanding decide() fails
+    async def _read_replies(self):
+        try:
+            while True:
+                reply = await self.reader.readexactly(REPLY_FRAME.size)
+                request_id, action = REPLY_FRAME.unpack(reply)
+                self._pending.pop(request_id).set_result(action)
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            self._error = ConnectionError(f"Connection to the server lost: {e}")
+        except asyncio.CancelledError:
+            self._error = ConnectionError("Client closed")
+            raise
+        finally:
+            pending, self._pending = self._pending, {}
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(self._error or ConnectionError("Reply stream ended"))
+
+async def play_episodes(client, num_decisions, in_flight, env_kwargs):
+    # Each of the in_flight airports waits for its own decision, so up to in_flight requests are outstanding
+    round_trips = []
+
+    async def play(env):
+        obs, _ = env.reset()
+        while len(round_trips) < num_decisions:
+            start = time.perf_counter()
+            action = await client.decide(obs)
+            round_trips.append(time.perf_counter() - start)
+
+            obs, _, terminated, _, _ = env.step(action)
+            if terminated:
+                obs, _ = env.reset()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[play(AirplaneEnv(**env_kwargs)) for _ in range(in_flight)])
+    elapsed = time.perf_counter() - start
+
+    round_trips = np.array(round_trips) * 1000
+    return {
+        'decisions': len(round_trips),
+        'in_flight': in_flight,
+        'elapsed_s': elapsed,
+        'decisions_per_s': len(round_trips) / elapsed,
+        'rtt_p50_ms': float(np.percentile(round_trips, 50)),
+        'rtt_p99_ms': float(np.percentile(round_trips, 99)),
+    }
+
+async def main(args):
+    client = FakeUnityClient()
+    await client.connect(args.host, args.port)
+    try:
+        results = await play_episodes(client, args.decisions, args.in_flight,
+                                      {"num_of_rows": 4, "seats_per_row": 5, "num_of_plane_rows": 4})
+    finally:
+        await client.close()
+
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--decisions', type=int, default=10_000)
+    parser.add_argument('--in-flight', type=int, default=16, help="Number of airports played at once, each with one outstanding decision")
+    args = parser.parse_args()
+
+    asyncio.run(main(args))
@@ -0,0 +1,145 @@
+import argparse
+import heapq
+import time
+
+import numpy as np
+
+from airplane_boarding import EMPTY
+
+# Rule-based landing sequencing, the baseline of the learned policy and the decision of the servers when there is
+# no model. Planes land in the order of their priority key, smaller first:
+#   high priority, then low fuel, then shortest MST, then in transit, then arrival order
+#   HeapScheduler:         keeps the planes of an AirplaneEnv's approach in a heap, O(log n) per decision
+#   ObservationHeuristic:  the same order from a [slot, high priority, ...] observation alone, as /predict gets it.
+#                          The other attributes are not observed, so it is the first high priority slot, else the first slot.
+# Both have the predict() interface of SB3 models and policy_export.NumpyPolicy.
+
+# Priority keys of all planes of the current scenario, plane IDs are the last digits so every key is unique
+def priority_keys(env):
+    n = env.num_of_seats
+    rank = ~env.high_priority * 2 + ~env.low_fuel
+    rank = (rank * 16 + env.MST) * 2 + ~env.in_transit
+    return (rank.astype(np.int64) * n + env.plane_id).tolist()
+
+class HeapScheduler:
+    # Reads the planes' attributes from env (an AirplaneEnv, unwrapped). The heap is rebuilt at the first decision
+    # of every episode, afterwards planes are pushed as they arrive in the approach.
+    def __init__(self, env):
+        self.env = env
+        self._heap = []
+        self._keys = None
+        self._next_push = 0
+
+    def _rebuild(self):
+        env = self.env
+        self._keys = priority_keys(env)
+        self._heap = [self._keys[plane_id] for plane_id in env.window.tolist() if plane_id != EMPTY]
+        heapq.heapify(self._heap)
+        self._next_push = env.next_arrival
+
+    # Approach slot of the plane to land next, -1 when the approach is empty
+    def decide(self):
+        env = self.env
+        if env.num_in_approach == env.num_of_seats:
+            self._rebuild()
+
+        # Planes that took a free slot since the last decision
+        while self._next_push < env.next_arrival:
+            heapq.heappush(self._heap, self._keys[self._next_push])
+            self._next_push += 1
+
+        n = env.num_of_seats
+        while self._heap:
+            plane_id = heapq.heappop(self._heap) % n
+            # Planes chosen by someone else are dropped when they come up
+            slot = env.approach_slot[plane_id]
+            if slot != EMPTY:
+                return int(slot)
+        return -1
+
+    # The observation is ignored, the decision is taken from the environment's state
+    def predict(self, observation=None, state=None, episode_start=None, deterministic=True, action_masks=None):
+        return self.decide(), state
+
+class ObservationHeuristic:
+    def predict(self, observation, state=None, episode_start=None, deterministic=True, action_masks=None):
+        observation = np.asarray(observation)
+        single = observation.ndim == 1
+        observations = observation.reshape(-1, observation.shape[-1])
+
+        if action_masks is None:
+            masks = observations[:, 0::2] != EMPTY
+        else:
+            masks = np.asarray(action_masks, dtype=bool).reshape(len(observations), -1)
+        high_priority = masks & (observations[:, 1::2] == 1)
+
+        actions = np.where(high_priority.any(axis=1), high_priority.argmax(axis=1), masks.argmax(axis=1))
+        return (actions[0] if single else actions), state
+
+# The fallback the servers used before: the first plane in the observation
+class FirstFreeSlot:
+    def predict(self, observation, state=None, episode_start=None, deterministic=True, action_masks=None):
+        masks = np.asarray(action_masks, dtype=bool).reshape(-1, np.shape(action_masks)[-1])
+        actions = masks.argmax(axis=1)
+        return (actions[0] if np.ndim(action_masks) == 1 else actions), state
+
+# Plays num_episodes seeded episodes, returns the mean episode reward and decisions per second (time in predict only)
+def run_policy(env, policy, num_episodes=20, seed=42):
+    env.reset(seed=seed)
+    rewards = []
+    decisions = 0
+    elapsed = 0.0
+    for _ in range(num_episodes):
+        obs, _ = env.reset()
+        terminated = False
+        total_reward = 0
+        while not terminated:
+            mask = env.action_masks()
+            start = time.perf_counter()
+            action, _ = policy.predict(obs, deterministic=True, action_masks=mask)
+            elapsed += time.perf_counter() - start
+            decisions += 1
+            obs, reward, terminated, _, _ = env.step(int(action))
+            total_reward += reward
+        rewards.append(total_reward)
+    return {'mean_reward': float(np.mean(rewards)), 'decisions_per_sec': decisions / elapsed}
+
+# Heuristics against the model on the same scenarios of every size (rows of 10 planes, 4 stations, see scaling_benchmark.py).
+# The model observes num_of_visible_planes slots and is skipped where that does not match its observation size.
+def benchmark(model=None, sizes=(20, 100, 500, 2000), num_of_visible_planes=20, num_episodes=20, seed=42):
+    from scaling_benchmark import make_env
+
+    results = []
+    for num_planes in sizes:
+        env = make_env(num_planes, num_of_visible_planes=num_of_visible_planes)
+        policies = {
+            'heap': HeapScheduler(env),
+            'observation': ObservationHeuristic(),
+            'first_free': FirstFreeSlot(),
+        }
+        if model is not None and model.observation_space.shape == env.observation_space.shape:
+            policies['model'] = model
+
+        for name, policy in policies.items():
+            result = run_policy(env, policy, num_episodes, seed)
+            results.append({'planes': num_planes, 'policy': name, **result})
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', default='agents/MaskablePPO/PPO_33/manual_save_5400000.zip', help="MaskablePPO checkpoint, empty to skip")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[20, 100, 500, 2000])
+    parser.add_argument('--visible', type=int, default=20, help="Visible approach slots, 0 for all planes")
+    parser.add_argument('--episodes', type=int, default=20)
+    args = parser.parse_args()
+
+    model = None
+    if args.model:
+        from sb3_contrib import MaskablePPO
+        model = MaskablePPO.load(args.model, device='cpu')
+
+    results = benchmark(model, args.sizes, args.visible or None, args.episodes)
+
+    print(f"{'planes':>8} {'policy':>12} {'mean reward':>12} {'decisions/s':>12}")
+    for result in results:
+        print(f"{result['planes']:>8} {result['policy']:>12} {result['mean_reward']:>12.1f} {result['decisions_per_sec']:>12.0f}")
@@ -0,0 +1,368 @@
+import argparse
+import asyncio
+import collections
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from heuristic_scheduler import ObservationHeuristic
+
+# Async replacement for the Flask server in unity_agent.py, with the same /predict contract:
+# POST {"obs": [id, prio, id, prio, ...]} -> {"action": plane index}, or {"action": -1} when no plane is left.
+# Concurrent requests are collected into micro-batches and answered with one masked forward pass of the policy.
+
+MODEL_PATH = "Dynamic_Scheduling/agents/MaskablePPO/PPO_33/manual_save_5400000.zip"
+OBS_SIZE = 40
+
+def compute_action_masks(observations):
+    # Mask only the plane entries (every 2nd value is a priority), one row per observation
+    # We assume observation = [id, prio, id, prio, ...]
+    return observations[:, 0::2] != -1
+
+_heuristic = ObservationHeuristic()
+
+def fallback_action(observation):
+    # Decision of the rule-based scheduler (heuristic_scheduler.py), -1 if no plane is left.
+    # It answers the error paths of /predict, so a malformed observation gives -1 instead of raising.
+    try:
+        observation = np.asarray(observation, dtype=np.float32).reshape(-1)
+        if not (observation[0::2] != -1).any():
+            return -1
+        action, _ = _heuristic.predict(observation)
+        return int(action)
+    except Exception as e:
+        print(f"Error in fallback: {e}")
+        return -1
+
+class MicroBatcher:
+    def __init__(self, model, max_batch_size=64, max_wait_ms=2.0, latency_window=10_000):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+
+        self._queue = None
+        self._task = None
+        self._batch = [] # Requests taken from the queue and not answered yet
+        self._stopped = False
+        # One worker thread, so the event loop keeps accepting requests while a batch runs
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+        # Metrics
+        self.num_requests = 0
+        self.num_batches = 0
+        self.batch_sizes = collections.Counter()
+        self.last_batch_size = 0
+        self.max_queue_depth = 0
+        self.num_in_flight = 0
+        self._latencies = collections.deque(maxlen=latency_window)
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    # Requests still queued or in the batch being run fail with a RuntimeError, which the endpoints answer with
+    # the fallback. Call drain() first to have them answered by the model.
+    async def stop(self):
+        self._stopped = True
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+        error = RuntimeError("Batcher stopped")
+        futures = [future for _, _, future in self._batch]
+        while not self._queue.empty():
+            futures.append(self._queue.get_nowait()[2])
+        for future in futures:
+            if not future.done():
+                future.set_exception(error)
+        self._batch = []
+        self._executor.shutdown()
+
+    async def predict(self, observation, mask):
+        if self._stopped:
+            raise RuntimeError("Batcher stopped")
+        start = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        self.num_in_flight += 1
+        try:
+            await self._queue.put((observation, mask, future))
+            self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+            action = await future
+        finally:
+            self.num_in_flight -= 1
+
+        self._latencies.append(time.perf_counter() - start)
+        self.num_requests += 1
+        return action
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Wait for the first request, then collect more until the batch is full or the window has passed
+            batch = self._batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            observations = np.stack([observation for observation, _, _ in batch])
+            masks = np.stack([mask for _, mask, _ in batch])
+            try:
+                actions = await loop.run_in_executor(self._executor, self._forward, observations, masks)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                self._batch = []
+                continue
+
+            for action, (_, _, future) in zip(actions, batch):
+                if not future.done():
+                    future.set_result(int(action))
+
+            self._batch = []
+            self.num_batches += 1
+            self.last_batch_size = len(batch)
+            self.batch_sizes[len(batch)] += 1
+
+    # Waits until the requests already submitted are answered
+    async def drain(self):
+        while self.num_in_flight > 0:
+            await asyncio.sleep(self.max_wait)
+
+    def _forward(self, observations, masks):
+        action, _ = self.model.predict(observation=observations, deterministic=True, action_masks=masks)
+        return action
+
+    def metrics(self):
+        latencies = np.array(self._latencies) * 1000
+        return {
+            'requests': self.num_requests,
+            'batches': self.num_batches,
+            'last_batch_size': self.last_batch_size,
+            'mean_batch_size': self.num_requests / self.num_batches if self.num_batches else 0.0,
+            'batch_size_histogram': {str(size): count for size, count in sorted(self.batch_sizes.items())},
+            'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+            'max_queue_depth': self.max_queue_depth,
+            'latency_p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+            'latency_p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else 0.0,
+        }
+
+# One MicroBatcher per model of a model_registry.ModelRegistry. The batcher of an evicted model is stopped
+# once its requests are answered, a request for that model again reloads it.
+class ModelRouter:
+    def __init__(self, registry, max_batch_size=64, max_wait_ms=2.0):
+        self.registry = registry
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.batchers = {}
+        self._retiring = set()
+        self._loop = None
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self.registry.on_evict.append(self._on_evict)
+
+    async def stop(self):
+        self.registry.on_evict.remove(self._on_evict)
+        for batcher in list(self.batchers.values()):
+            await batcher.stop()
+        if self._retiring:
+            await asyncio.gather(*self._retiring)
+
+    # Name and batcher of the named model, or of the default model if name is None
+    async def batcher(self, name=None):
+        if name is None:
+            name = self.registry.default
+        model = self.registry.get(name, load=False)
+        if model is None:
+            model = await self._loop.run_in_executor(None, self.registry.get, name)
+
+        batcher = self.batchers.get(name)
+        if batcher is None or batcher.model is not model:
+            if batcher is not None:
+                self._retire(name, batcher.model)
+            batcher = MicroBatcher(model, max_batch_size=self.max_batch_size, max_wait_ms=self.max_wait_ms)
+            await batcher.start()
+            self.batchers[name] = batcher
+            # Evicted again while it was loading, this request is still answered by it
+            if name not in self.registry:
+                self._retire(name, model)
+        return name, batcher
+
+    async def set_default(self, name):
+        await self._loop.run_in_executor(None, self.registry.set_default, name)
+
+    # Called by the registry from the thread that loaded another model
+    def _on_evict(self, name, model):
+        self._loop.call_soon_threadsafe(self._retire, name, model)
+
+    def _retire(self, name, model):
+        batcher = self.batchers.get(name)
+        if batcher is None or batcher.model is not model:
+            return
+        del self.batchers[name]
+        task = asyncio.create_task(self._drain_and_stop(batcher))
+        self._retiring.add(task)
+        task.add_done_callback(self._retiring.discard)
+
+    async def _drain_and_stop(self, batcher):
+        await batcher.drain()
+        await batcher.stop()
+
+    def metrics(self):
+        return {name: batcher.metrics() for name, batcher in self.batchers.items()}
+
+# recorder: optional trajectory_recorder.DecisionRecorder that keeps every decision of the model
+# registry: optional model_registry.ModelRegistry to serve instead of model. Requests choose a model with
+# {"obs": [...], "model": name} and get {"action": ..., "model": name} back. Without a name the default answers
+# with the plain {"action": ...} reply Unity parses.
+def create_app(model, max_batch_size=64, max_wait_ms=2.0, recorder=None, registry=None):
+    router = ModelRouter(registry, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms) if registry is not None else None
+    batcher = None
+    if router is None and model is not None:
+        batcher = MicroBatcher(model, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        if batcher is not None:
+            await batcher.start()
+        if router is not None:
+            await router.start()
+        yield
+        if batcher is not None:
+            await batcher.stop()
+        if router is not None:
+            await router.stop()
+        if recorder is not None:
+            recorder.close()
+
+    app = FastAPI(lifespan=lifespan)
+    app.state.batcher = batcher
+    app.state.router = router
+
+    @app.post('/predict')
+    async def predict(request: Request):
+        data = None
+        try:
+            data = await request.json()
+            obs = np.array(data['obs'], dtype=np.float32).reshape(-1)
+
+            # Validate shape
+            if obs.shape[0] != OBS_SIZE:
+                raise ValueError(f"Invalid observation shape: {obs.shape}")
+
+            name = None
+            model_batcher = batcher
+            if router is not None:
+                try:
+                    name, model_batcher = await router.batcher(data.get('model'))
+                except KeyError as e:
+                    # A model asked for by name has to exist, without a name the fallback answers
+                    if data.get('model') is not None:
+                        return JSONResponse({'error': str(e)}, status_code=404)
+                    raise
+
+            # If model failed to load, return fallback
+            if model_batcher is None:
+                return {'action': fallback_action(obs)}
+
+            # Compute mask (1 per plane)
+            mask = compute_action_masks(obs[None])[0]
+
+            if not mask.any():
+                return {'action': -1}
+
+            action = await model_batcher.predict(obs, mask)
+            if recorder is not None:
+                recorder.record(obs, mask, action)
+            # Unity parses the reply as exactly {"action": n}, the model is only echoed to clients that named one
+            if data.get('model') is not None:
+                return {'action': action, 'model': name}
+            return {'action': action}
+
+        except Exception as e:
+            print(f"Error in predict: {e}")
+            if not isinstance(data, dict) or 'obs' not in data:
+                return {'action': -1}
+            return {'action': fallback_action(data['obs'])}
+
+    @app.get('/metrics')
+    async def metrics():
+        if router is not None:
+            return router.metrics()
+        if batcher is None:
+            return {}
+        return batcher.metrics()
+
+    if router is not None:
+        @app.get('/models')
+        async def models():
+            return registry.info()
+
+        # {"name": ...}, the new default is loaded before requests switch to it
+        @app.post('/models/default')
+        async def set_default(request: Request):
+            data = await request.json()
+            try:
+                await router.set_default(data['name'])
+            except KeyError as e:
+                return JSONResponse({'error': str(e)}, status_code=404)
+            return registry.info()
+
+    return app
+
+# .npz files exported by policy_export.py are served with the NumPy runtime, without loading torch
+def load_model(path):
+    try:
+        if path.endswith('.npz'):
+            from policy_export import NumpyPolicy
+            model = NumpyPolicy.load(path)
+        else:
+            from sb3_contrib import MaskablePPO
+            model = MaskablePPO.load(path, device='cpu')
+        print("Successfully loaded the pre-trained model")
+        return model
+    except Exception as e:
+        print(f"Error loading model: {e}")
+        return None
+
+if __name__ == '__main__':
+    import uvicorn
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', default=MODEL_PATH, help="MaskablePPO .zip checkpoint or .npz exported by policy_export.py")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--max-batch-size', type=int, default=64)
+    parser.add_argument('--max-wait-ms', type=float, default=2.0, help="How long to wait for more requests after the first one of a batch")
+    parser.add_argument('--record', default=None, help="Directory to record the decisions to, see trajectory_recorder.py")
+    parser.add_argument('--registry', default=None, metavar='ROOT', help="Serve the checkpoints below ROOT by name instead of --model, e.g. Dynamic_Scheduling/agents/MaskablePPO")
+    parser.add_argument('--default', default='PPO_33/manual_save_5400000', help="Default model of the registry")
+    parser.add_argument('--max-models', type=int, default=4, help="Models the registry keeps loaded")
+    parser.add_argument('--memory-budget-mb', type=float, default=512, help="Weights the registry keeps loaded")
+    args = parser.parse_args()
+
+    recorder = None
+    if args.record is not None:
+        from trajectory_recorder import DecisionRecorder
+        recorder = DecisionRecorder(args.record, OBS_SIZE, OBS_SIZE // 2)
+
+    if args.registry is not None:
+        from model_registry import ModelRegistry
+        registry = ModelRegistry(args.registry, args.default, args.max_models, args.memory_budget_mb)
+        app = create_app(None, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms, recorder=recorder, registry=registry)
+    else:
+        app = create_app(load_model(args.model), max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms, recorder=recorder)
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,206 @@
+import argparse
+import collections
+import functools
+import time
+
+import numpy as np
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.logger import TensorBoardOutputFormat
+
+# Per-phase timers and call counters for the hot paths, switched on and off at runtime.
+# instrument() registers methods of an object (or functions of a module) as phases. enable() replaces them by
+# timing wrappers, disable() puts the originals back: while off the code runs exactly as without instrumentation,
+# there is no flag to check on the hot path. Phases nest, e.g. env.step includes env._move.
+#   profiler = Profiler()
+#   profiler.instrument(env.unwrapped, ENV_PHASES, prefix='env.')
+#   profiler.enable(); ...; print(profiler.text())
+# Durations of the last `window` calls of every phase are kept for percentiles and histograms.
+#   python instrumentation.py   # step time of the env never instrumented, switched off and switched on
+
+ENV_PHASES = ['step', '_add_to_line', '_move', '_move_forward', '_calculate_reward', '_get_observation', 'render']
+VEC_ENV_PHASES = ['step_wait', '_add_to_line', '_move', '_move_forward', '_calculate_reward', '_get_observation', '_reset_envs']
+
+_MISSING = object()
+
+class Profiler:
+    def __init__(self, window=100_000):
+        self.window = window
+        self.enabled = False
+        self.counts = collections.Counter()
+        self.totals = collections.defaultdict(float) # Seconds
+        self.durations = {} # Phase -> deque of the last durations, seconds
+        self._phases = [] # (object, attribute, phase name)
+        self._originals = {} # (id of object, attribute) -> instance/module attribute before enable(), or _MISSING
+
+    def instrument(self, obj, names, prefix=''):
+        was_enabled = self.enabled
+        self.disable()
+        self._phases += [(obj, name, prefix + name) for name in names]
+        if was_enabled:
+            self.enable()
+        return self
+
+    def _timed(self, function, phase):
+        durations = self.durations.setdefault(phase, collections.deque(maxlen=self.window))
+        counts, totals = self.counts, self.totals
+        perf_counter = time.perf_counter
+
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                duration = perf_counter() - start
+                durations.append(duration)
+                counts[phase] += 1
+                totals[phase] += duration
+        return timed
+
+    def enable(self):
+        if self.enabled:
+            return
+        for obj, name, phase in self._phases:
+            self._originals[id(obj), name] = vars(obj).get(name, _MISSING)
+            setattr(obj, name, self._timed(getattr(obj, name), phase))
+        self.enabled = True
+
+    def disable(self):
+        if not self.enabled:
+            return
+        for obj, name, _ in self._phases:
+            original = self._originals.pop((id(obj), name))
+            # Methods come back from the class once the instance attribute is gone
+            if original is _MISSING:
+                delattr(obj, name)
+            else:
+                setattr(obj, name, original)
+        self.enabled = False
+
+    def reset(self):
+        self.counts.clear()
+        self.totals.clear()
+        for durations in self.durations.values():
+            durations.clear()
+
+    # {phase: {'count', 'total_s', 'mean_us', 'p50_us', 'p99_us'}}, percentiles over the last window calls
+    def summary(self):
+        summary = {}
+        for phase, count in self.counts.items():
+            durations = np.array(self.durations[phase]) * 1e6
+            summary[phase] = {
+                'count': count,
+                'total_s': self.totals[phase],
+                'mean_us': self.totals[phase] / count * 1e6,
+                'p50_us': float(np.percentile(durations, 50)) if len(durations) else 0.0,
+                'p99_us': float(np.percentile(durations, 99)) if len(durations) else 0.0,
+            }
+        return summary
+
+    # Prometheus text exposition format
+    def text(self, metric='phase_seconds'):
+        lines = ['# TYPE profiler_enabled gauge', f'profiler_enabled {int(self.enabled)}', f'# TYPE {metric} summary']
+        for phase, stats in self.summary().items():
+            for quantile, key in ((0.5, 'p50_us'), (0.99, 'p99_us')):
+                lines.append(f'{metric}{{phase="{phase}",quantile="{quantile}"}} {stats[key] / 1e6:.9f}')
+            lines.append(f'{metric}_sum{{phase="{phase}"}} {stats["total_s"]:.9f}')
+            lines.append(f'{metric}_count{{phase="{phase}"}} {stats["count"]}')
+        return '\n'.join(lines) + '\n'
+
+    # Histogram of the recent durations (ms) and mean of every phase, to a torch SummaryWriter
+    def log_tensorboard(self, writer, step, tag='profile'):
+        for phase, stats in self.summary().items():
+            durations = np.array(self.durations[phase]) * 1000
+            if len(durations):
+                writer.add_histogram(f'{tag}/{phase}', durations, step)
+            writer.add_scalar(f'{tag}/{phase}_mean_us', stats['mean_us'], step)
+            writer.add_scalar(f'{tag}/{phase}_calls', stats['count'], step)
+
+# Instruments the training env (below VecMonitor and other wrappers) for the whole run. Every log_freq timesteps
+# the phase histograms since the last log go to the TensorBoard log of the run (logger.record without TensorBoard).
+# Timing starts switched off unless enabled=True; callback.profiler.enable() switches it on during the run.
+# Nothing is logged while it is off.
+class ProfilerCallback(BaseCallback):
+    def __init__(self, profiler=None, log_freq=100_000, phases=VEC_ENV_PHASES, enabled=False, verbose=0):
+        super().__init__(verbose)
+        self.profiler = profiler if profiler is not None else Profiler()
+        self.enabled = enabled
+        self.log_freq = log_freq
+        self.phases = phases
+        self._next_log = log_freq
+
+    def _init_callback(self):
+        env = self.training_env
+        while hasattr(env, 'venv'):
+            env = env.venv
+        self.profiler.instrument(env, self.phases, prefix='env.')
+        if self.enabled:
+            self.profiler.enable()
+
+    def _on_step(self) -> bool:
+        if self.num_timesteps >= self._next_log:
+            self._next_log += self.log_freq * ((self.num_timesteps - self._next_log) // self.log_freq + 1)
+            if self.profiler.counts:
+                self._log()
+        return True
+
+    def _log(self):
+        writer = next((output_format.writer for output_format in self.logger.output_formats
+                       if isinstance(output_format, TensorBoardOutputFormat)), None)
+        if writer is not None:
+            self.profiler.log_tensorboard(writer, self.num_timesteps)
+            writer.flush()
+        else:
+            for phase, stats in self.profiler.summary().items():
+                self.logger.record(f'profile/{phase}_mean_us', stats['mean_us'])
+        self.profiler.reset()
+
+    def _on_training_end(self):
+        self.profiler.disable()
+
+# Microseconds per step of episodes with the first free slot as action
+def time_steps(env, num_episodes, seed=0):
+    steps = 0
+    elapsed = 0.0
+    for episode in range(num_episodes):
+        env.reset(seed=seed + episode)
+        terminated = False
+        start = time.perf_counter()
+        while not terminated:
+            _, _, terminated, _, _ = env.step(int(np.argmax(env._action_mask)))
+            steps += 1
+        elapsed += time.perf_counter() - start
+    return elapsed / steps * 1e6
+
+# Step time of an env never instrumented, instrumented but switched off, and switched on. Rounds alternate
+# between the modes and the best round of each is kept, which evens out noise from the machine.
+def benchmark(num_episodes=200, num_rounds=5, env_kwargs=None):
+    from airplane_boarding import AirplaneEnv
+
+    env_kwargs = env_kwargs or dict(num_of_rows=4, seats_per_row=5, num_of_plane_rows=4)
+    baseline_env = AirplaneEnv(**env_kwargs)
+    env = AirplaneEnv(**env_kwargs)
+    profiler = Profiler().instrument(env, ENV_PHASES, prefix='env.')
+
+    times = collections.defaultdict(list)
+    for _ in range(num_rounds):
+        times['never instrumented'].append(time_steps(baseline_env, num_episodes))
+        profiler.disable()
+        times['switched off'].append(time_steps(env, num_episodes))
+        profiler.enable()
+        times['switched on'].append(time_steps(env, num_episodes))
+    profiler.disable()
+    return {mode: min(values) for mode, values in times.items()}, profiler
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--episodes', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    results, profiler = benchmark(args.episodes, args.rounds)
+    baseline = results['never instrumented']
+    for mode, step_time in results.items():
+        print(f"{mode:<20} {step_time:8.2f} us/step  {(step_time / baseline - 1) * 100:+6.1f} %")
+    print()
+    print(profiler.text(), end='')
@@ -0,0 +1,136 @@
+import collections
+import os
+import threading
+import time
+
+# Checkpoints by name, loaded on first use and kept in memory while they are used.
+# A name is a path below root without extension, e.g. "PPO_33/manual_save_5400000": the .npz exported by
+# policy_export.py is loaded if there is one (NumPy runtime, no torch), else the MaskablePPO .zip.
+# At most max_models models stay loaded, and together at most memory_budget_mb of weights; the least recently
+# used model goes first. The default model is never evicted, the model just loaded counts against both limits
+# and is evicted last (right away if it alone exceeds the memory budget next to the default). Evicting a model only drops the registry's reference,
+# requests that already got it finish with it.
+
+DEFAULT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'agents', 'MaskablePPO')
+
+# Bytes of weights of a NumpyPolicy or an SB3 model
+def model_nbytes(model):
+    if hasattr(model, 'weights'):
+        return sum(array.nbytes for array in model.weights + model.biases)
+    return sum(param.numel() * param.element_size() for param in model.policy.parameters())
+
+class ModelRegistry:
+    def __init__(self, root=DEFAULT_ROOT, default=None, max_models=4, memory_budget_mb=512):
+        # The default and the model of a request must fit together
+        if max_models < 2:
+            raise ValueError(f"max_models must be at least 2, got {max_models}")
+        self.root = root
+        self.max_models = max_models
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+
+        # name -> {'model', 'path', 'nbytes', 'load_time'}, least recently used first
+        self._models = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.on_evict = [] # Called with the name and model of every evicted model
+        self.num_loads = 0
+        self.num_evictions = 0
+
+        self.default = None
+        if default is not None:
+            self.set_default(default)
+
+    def resolve(self, name):
+        if os.path.isabs(name) or '..' in name.split('/'):
+            raise KeyError(f"Invalid model name {name}")
+        for extension in ('.npz', '.zip'):
+            path = os.path.join(self.root, name + extension)
+            if os.path.exists(path):
+                return path
+        raise KeyError(f"No checkpoint named {name} in {self.root}")
+
+    # The model with this name (the default model if name is None), loaded if it is not in memory.
+    # Loading blocks, call it from a worker thread in async code. With load=False a model not in memory is None.
+    def get(self, name=None, load=True):
+        if name is None:
+            name = self.default
+            if name is None:
+                raise KeyError("No default model")
+
+        with self._lock:
+            entry = self._models.get(name)
+            if entry is not None:
+                self._models.move_to_end(name)
+                return entry['model']
+        if not load:
+            return None
+
+        path = self.resolve(name)
+        start = time.perf_counter()
+        model = _load(path)
+        entry = {'model': model, 'path': path, 'nbytes': model_nbytes(model), 'load_time': time.perf_counter() - start}
+
+        with self._lock:
+            # Another thread may have loaded it in the meantime
+            if name in self._models:
+                self._models.move_to_end(name)
+                return self._models[name]['model']
+            self._models[name] = entry
+            self.num_loads += 1
+            evicted = self._evict()
+
+        self._notify(evicted)
+        return model
+
+    # Least recently used first, so the model just loaded (last) goes only if the others are not enough
+    def _evict(self):
+        evicted = []
+        for name in list(self._models):
+            if len(self._models) <= self.max_models and self._nbytes() <= self.memory_budget:
+                break
+            if name == self.default:
+                continue
+            evicted.append((name, self._models.pop(name)['model']))
+            self.num_evictions += 1
+        return evicted
+
+    def _notify(self, evicted):
+        for evicted_name, evicted_model in evicted:
+            for callback in self.on_evict:
+                callback(evicted_name, evicted_model)
+
+    def _nbytes(self):
+        return sum(entry['nbytes'] for entry in self._models.values())
+
+    # Loads the model first, then switches: requests see either the old or the new default, never a missing one.
+    # The old default is no longer pinned and is evicted if the limits need it.
+    def set_default(self, name):
+        self.get(name)
+        with self._lock:
+            self.default = name
+            evicted = self._evict()
+        self._notify(evicted)
+
+    def __contains__(self, name):
+        return name in self._models
+
+    def info(self):
+        with self._lock:
+            models = {name: {'path': entry['path'], 'size_kib': entry['nbytes'] / 1024, 'load_time_ms': entry['load_time'] * 1000}
+                      for name, entry in self._models.items()}
+            nbytes = self._nbytes()
+        return {
+            'default': self.default,
+            'models': models, # Least recently used first
+            'memory_kib': nbytes / 1024,
+            'memory_budget_kib': self.memory_budget / 1024,
+            'max_models': self.max_models,
+            'loads': self.num_loads,
+            'evictions': self.num_evictions,
+        }
+
+def _load(path):
+    if path.endswith('.npz'):
+        from policy_export import NumpyPolicy
+        return NumpyPolicy.load(path)
+    from sb3_contrib import MaskablePPO
+    return MaskablePPO.load(path, device='cpu')
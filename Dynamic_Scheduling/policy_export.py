@@ -0,0 +1,133 @@
+import argparse
+import os
+
+import numpy as np
+
+# Export of a MaskablePPO checkpoint to a plain .npz of policy weights, and a NumPy runtime for it.
+# The runtime only needs numpy: no torch or sb3_contrib, it loads in milliseconds and answers the deterministic
+# masked action (argmax of the action logits over the valid actions) for single or batched observations.
+
+# Module-level functions, not lambdas: a NumpyPolicy is pickled to process pools (spawn) and preforked workers
+def relu(x):
+    return np.maximum(x, 0)
+
+def identity(x):
+    return x
+
+ACTIVATIONS = {
+    'tanh': np.tanh,
+    'relu': relu,
+    'identity': identity,
+}
+
+def export_policy(checkpoint_path, out_path=None):
+    from sb3_contrib import MaskablePPO
+
+    if out_path is None:
+        out_path = os.path.splitext(checkpoint_path)[0] + '.npz'
+
+    NumpyPolicy.from_model(MaskablePPO.load(checkpoint_path, device='cpu')).save(out_path)
+    return out_path
+
+class NumpyPolicy:
+    def __init__(self, weights, biases, activation='tanh'):
+        self.weights = weights
+        self.biases = biases
+        self.activation_name = activation
+        self.activation = ACTIVATIONS[activation]
+
+    # Copies the actor of a loaded MaskablePPO model: mlp_extractor.policy_net followed by action_net
+    @classmethod
+    def from_model(cls, model):
+        import torch
+
+        policy = model.policy
+        activation = policy.activation_fn.__name__.lower()
+        assert activation in ACTIVATIONS, f"Unsupported activation function {policy.activation_fn}"
+
+        layers = [module for module in policy.mlp_extractor.policy_net if isinstance(module, torch.nn.Linear)]
+        layers.append(policy.action_net)
+
+        # Weights are stored transposed, so a forward pass is x @ W + b
+        weights = [layer.weight.detach().numpy().T.astype(np.float32) for layer in layers]
+        biases = [layer.bias.detach().numpy().astype(np.float32) for layer in layers]
+        return cls(weights, biases, activation)
+
+    def save(self, path):
+        arrays = {}
+        for i, (W, b) in enumerate(zip(self.weights, self.biases)):
+            arrays[f'W{i}'] = W
+            arrays[f'b{i}'] = b
+        np.savez(path, activation=self.activation_name, num_layers=len(self.weights), **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            num_layers = int(data['num_layers'])
+            weights = [data[f'W{i}'] for i in range(num_layers)]
+            biases = [data[f'b{i}'] for i in range(num_layers)]
+            activation = str(data['activation'])
+        return cls(weights, biases, activation)
+
+    def logits(self, observations):
+        x = np.asarray(observations, dtype=np.float32)
+        for W, b in zip(self.weights[:-1], self.biases[:-1]):
+            x = self.activation(x @ W + b)
+        return x @ self.weights[-1] + self.biases[-1]
+
+    # Same signature as MaskablePPO.predict, deterministic is always on.
+    # observation has shape (obs_size,) or (batch, obs_size), action_masks (num_actions,) or (batch, num_actions).
+    def predict(self, observation, state=None, episode_start=None, deterministic=True, action_masks=None):
+        observation = np.asarray(observation)
+        single = observation.ndim == 1
+        logits = self.logits(observation.reshape(-1, observation.shape[-1]))
+
+        if action_masks is not None:
+            masks = np.asarray(action_masks, dtype=bool).reshape(logits.shape)
+            logits = np.where(masks, logits, -np.inf)
+
+        actions = np.argmax(logits, axis=1)
+        return (actions[0] if single else actions), state
+
+# Plays episodes of the training scenario with the SB3 model and records the observations and masks it decided on
+def record_observations(model, num_episodes=100, seed=42):
+    from airplane_boarding import AirplaneEnv
+
+    env = AirplaneEnv(num_of_rows=4, seats_per_row=5, num_of_plane_rows=4)
+    observations, masks = [], []
+
+    env.reset(seed=seed)
+    for _ in range(num_episodes):
+        obs, _ = env.reset()
+        terminated = False
+        while not terminated:
+            mask = env.action_masks()
+            observations.append(obs)
+            masks.append(mask)
+            action, _ = model.predict(observation=obs, deterministic=True, action_masks=mask)
+            obs, _, terminated, _, _ = env.step(action)
+
+    return np.array(observations), np.array(masks)
+
+# Checks that the exported policy picks the same actions as the SB3 policy, returns the fraction of matching actions
+def verify(checkpoint_path, exported_path, observations=None, masks=None):
+    from sb3_contrib import MaskablePPO
+
+    model = MaskablePPO.load(checkpoint_path, device='cpu')
+    if observations is None:
+        observations, masks = record_observations(model)
+
+    expected, _ = model.predict(observation=observations, deterministic=True, action_masks=masks)
+    actions, _ = NumpyPolicy.load(exported_path).predict(observations, action_masks=masks)
+
+    return np.mean(actions == expected)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('checkpoint', help="e.g. agents/MaskablePPO/PPO_33/manual_save_5400000.zip")
+    parser.add_argument('--out', default=None, help="Defaults to the checkpoint path with a .npz extension")
+    args = parser.parse_args()
+
+    out_path = export_policy(args.checkpoint, args.out)
+    print(f"Exported policy to {out_path}")
+    print(f"Matching actions on recorded observations: {verify(args.checkpoint, out_path):.2%}")
@@ -0,0 +1,254 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from inference_server import MODEL_PATH, OBS_SIZE, create_app
+from policy_export import NumpyPolicy
+
+# Pre-fork serving of /predict on several cores, with the inference_server.py app in every worker.
+# The master loads the policy once, into a shared memory block, opens the listening socket and forks the workers.
+# The workers run the NumPy policy on views of the shared block, so the weights exist once however many workers
+# there are, and the kernel spreads the connections over them. Neither the master nor the workers import torch.
+# The master prints the worker count, the memory of every worker and the requests per second while it serves,
+# and restarts workers that die. GET /workers on any worker returns the same table.
+#   python prefork_server.py --workers 4 --model agents/MaskablePPO/PPO_33/manual_save_5400000.npz
+#   python prefork_server.py --workers 4 --load-test 10      # serves under load for 10 seconds and reports
+
+_ALIGNMENT = 64
+
+def _export(path):
+    from sb3_contrib import MaskablePPO
+    return NumpyPolicy.from_model(MaskablePPO.load(path, device='cpu'))
+
+# .npz files exported by policy_export.py are loaded directly, .zip checkpoints are exported in a separate process
+# so torch stays out of the master
+def load_policy(path):
+    if path.endswith('.npz'):
+        return NumpyPolicy.load(path)
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(_export, path).result()
+
+class SharedPolicy:
+    # Copies the weights and biases of a NumpyPolicy into one shared memory block, self.policy reads them from there
+    def __init__(self, policy):
+        arrays = [array for layer in zip(policy.weights, policy.biases) for array in layer]
+        offsets = np.cumsum([0] + [-(-array.nbytes // _ALIGNMENT) * _ALIGNMENT for array in arrays])
+        self.shm = shared_memory.SharedMemory(create=True, size=int(offsets[-1]))
+
+        views = []
+        for array, offset in zip(arrays, offsets):
+            view = np.ndarray(array.shape, dtype=array.dtype, buffer=self.shm.buf, offset=int(offset))
+            view[...] = array
+            view.flags.writeable = False
+            views.append(view)
+        self.policy = NumpyPolicy(views[0::2], views[1::2], policy.activation_name)
+
+    @property
+    def nbytes(self):
+        return self.shm.size
+
+    def close(self):
+        # The views have to go before the block can be unmapped
+        self.policy = None
+        self.shm.close()
+        self.shm.unlink()
+
+# Resident and proportional set size of a process in KiB, PSS splits shared pages over the processes mapping them
+def memory_kib(pid):
+    memory = {'rss_kib': None, 'pss_kib': None}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                if line.startswith('Rss:'):
+                    memory['rss_kib'] = int(line.split()[1])
+                elif line.startswith('Pss:'):
+                    memory['pss_kib'] = int(line.split()[1])
+    except OSError:
+        pass
+    return memory
+
+# One row of worker statistics per worker in shared memory: pid, requests served
+class WorkerStats:
+    def __init__(self, num_workers):
+        self.shm = shared_memory.SharedMemory(create=True, size=num_workers * 2 * 8)
+        self.table = np.ndarray((num_workers, 2), dtype=np.int64, buffer=self.shm.buf)
+        self.table[:] = 0
+
+    def report(self):
+        workers = []
+        for pid, requests in self.table.tolist():
+            workers.append({'pid': pid, 'requests': requests, **memory_kib(pid)})
+        return workers
+
+    def close(self):
+        self.table = None
+        self.shm.close()
+        self.shm.unlink()
+
+def _run_worker(index, sock, policy, stats, max_batch_size, max_wait_ms):
+    import uvicorn
+
+    stats.table[index] = (os.getpid(), 0)
+    app = create_app(policy, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+
+    @app.middleware('http')
+    async def count_requests(request, call_next):
+        response = await call_next(request)
+        if request.url.path == '/predict':
+            stats.table[index, 1] += 1
+        return response
+
+    @app.get('/workers')
+    async def workers():
+        return stats.report()
+
+    uvicorn.Server(uvicorn.Config(app, fd=sock.fileno(), log_level='warning')).run()
+
+class PreforkServer:
+    def __init__(self, policy, host='0.0.0.0', port=5000, num_workers=None, max_batch_size=64, max_wait_ms=2.0):
+        self.num_workers = num_workers or os.cpu_count()
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+
+        self.shared_policy = SharedPolicy(policy)
+        self.stats = WorkerStats(self.num_workers)
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen(2048)
+        self.sock.set_inheritable(True)
+        self.port = self.sock.getsockname()[1]
+
+        self.pids = [None] * self.num_workers
+        self.num_restarts = 0
+
+    def _fork(self, index):
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                _run_worker(index, self.sock, self.shared_policy.policy, self.stats, self.max_batch_size, self.max_wait_ms)
+            except BaseException:
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        self.pids[index] = pid
+
+    def start(self):
+        for index in range(self.num_workers):
+            self._fork(index)
+
+    # Forks a new worker in the place of every worker that exited
+    def reap(self):
+        while True:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid in self.pids:
+                print(f"Worker {pid} exited, restarting it")
+                self.num_restarts += 1
+                self._fork(self.pids.index(pid))
+
+    def report(self):
+        return {
+            'workers': self.num_workers,
+            'shared_weights_kib': self.shared_policy.nbytes / 1024,
+            'master': memory_kib(os.getpid()),
+            'per_worker': self.stats.report(),
+            'requests': int(self.stats.table[:, 1].sum()),
+        }
+
+    def serve_forever(self, report_interval=10.0):
+        last_requests = 0
+        try:
+            while True:
+                time.sleep(report_interval)
+                self.reap()
+                report = self.report()
+                print(format_report(report, (report['requests'] - last_requests) / report_interval))
+                last_requests = report['requests']
+        except KeyboardInterrupt:
+            pass
+
+    def stop(self):
+        for pid in self.pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in self.pids:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        self.sock.close()
+        self.stats.close()
+        self.shared_policy.close()
+
+def format_report(report, requests_per_sec):
+    lines = [f"{report['workers']} workers, {requests_per_sec:.0f} requests/sec, "
+             f"shared weights {report['shared_weights_kib']:.0f} KiB"]
+    for worker in report['per_worker']:
+        lines.append(f"  worker {worker['pid']}: {worker['requests']} requests, "
+                     f"RSS {worker['rss_kib']} KiB, PSS {worker['pss_kib']} KiB")
+    return "\n".join(lines)
+
+# Sends random valid observations from concurrency connections for duration seconds, returns requests per second
+async def load_test(url, duration=10.0, concurrency=64, seed=42):
+    import httpx
+
+    rng = np.random.default_rng(seed)
+    observations = np.stack([rng.permutation(OBS_SIZE // 2), rng.integers(0, 2, OBS_SIZE // 2)], axis=1).reshape(-1, OBS_SIZE)
+    payload = {'obs': observations[0].tolist()}
+    num_requests = 0
+    deadline = time.perf_counter() + duration
+
+    async def client():
+        nonlocal num_requests
+        async with httpx.AsyncClient(base_url=url, timeout=30.0) as http:
+            while time.perf_counter() < deadline:
+                response = await http.post('/predict', json=payload)
+                response.raise_for_status()
+                num_requests += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return num_requests / (time.perf_counter() - start)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', default=MODEL_PATH, help="MaskablePPO .zip checkpoint or .npz exported by policy_export.py")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes, one per core by default")
+    parser.add_argument('--max-batch-size', type=int, default=64)
+    parser.add_argument('--max-wait-ms', type=float, default=2.0)
+    parser.add_argument('--report-interval', type=float, default=10.0, help="Seconds between the reports of the master")
+    parser.add_argument('--load-test', type=float, default=None, metavar='SECONDS', help="Serve a load test instead of clients, then exit")
+    parser.add_argument('--concurrency', type=int, default=64, help="Connections of the load test")
+    args = parser.parse_args()
+
+    server = PreforkServer(load_policy(args.model), args.host, args.port, args.workers, args.max_batch_size, args.max_wait_ms)
+    server.start()
+    try:
+        if args.load_test is None:
+            print(f"Serving on {args.host}:{server.port} with {server.num_workers} workers")
+            server.serve_forever(args.report_interval)
+        else:
+            time.sleep(2.0) # Workers starting up
+            requests_per_sec = asyncio.run(load_test(f'http://127.0.0.1:{server.port}', args.load_test, args.concurrency))
+            print(format_report(server.report(), requests_per_sec))
+    finally:
+        server.stop()
@@ -0,0 +1,77 @@
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from airplane_boarding import AirplaneEnv
+
+# Step time and memory of AirplaneEnv as the number of inbound planes grows.
+# Every scenario has rows of 10 planes, the given number of service stations and a 20 plane visible window,
+# so the observation stays 40 wide like the one the trained policies use.
+# The growth exponent is the slope of log(cost) over log(planes), below 2 means sub-quadratic.
+
+SIZES = (20, 50, 100, 200, 500, 1000, 2000)
+
+def make_env(num_planes, num_of_plane_rows=4, num_of_visible_planes=20):
+    return AirplaneEnv(num_of_rows=num_planes // 10, seats_per_row=10,
+                       num_of_plane_rows=num_of_plane_rows, num_of_visible_planes=num_of_visible_planes)
+
+# Plays whole episodes choosing the first free approach slot, returns the mean time per step in microseconds
+def time_steps(env, min_steps=2000, seed=42):
+    env.reset(seed=seed)
+    steps = 0
+    elapsed = 0.0
+    while steps < min_steps:
+        env.reset()
+        terminated = False
+        start = time.perf_counter()
+        while not terminated:
+            _, _, terminated, _, _ = env.step(int(np.argmax(env._action_mask)))
+            steps += 1
+        elapsed += time.perf_counter() - start
+    return elapsed / steps * 1e6
+
+# Peak memory allocated while building the environment and playing one episode, in KiB
+def peak_memory(num_planes, seed=42, **kwargs):
+    tracemalloc.start()
+    env = make_env(num_planes, **kwargs)
+    env.reset(seed=seed)
+    terminated = False
+    while not terminated:
+        _, _, terminated, _, _ = env.step(int(np.argmax(env._action_mask)))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+def growth_exponent(sizes, costs):
+    return np.polyfit(np.log(sizes), np.log(costs), 1)[0]
+
+def run(sizes=SIZES, num_of_plane_rows=4, num_of_visible_planes=20, seed=42):
+    results = []
+    for num_planes in sizes:
+        env = make_env(num_planes, num_of_plane_rows, num_of_visible_planes)
+        results.append({
+            'planes': num_planes,
+            'step_us': time_steps(env, seed=seed),
+            'peak_kib': peak_memory(num_planes, seed=seed, num_of_plane_rows=num_of_plane_rows,
+                                    num_of_visible_planes=num_of_visible_planes),
+        })
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--stations', type=int, default=4)
+    parser.add_argument('--visible', type=int, default=20)
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.stations, args.visible)
+
+    print(f"{'planes':>8} {'step (us)':>10} {'peak (KiB)':>11}")
+    for result in results:
+        print(f"{result['planes']:>8} {result['step_us']:>10.1f} {result['peak_kib']:>11.1f}")
+
+    sizes = [result['planes'] for result in results]
+    print(f"\nStep time grows as planes^{growth_exponent(sizes, [r['step_us'] for r in results]):.2f}")
+    print(f"Memory grows as planes^{growth_exponent(sizes, [r['peak_kib'] for r in results]):.2f}")
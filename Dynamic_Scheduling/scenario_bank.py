@@ -0,0 +1,68 @@
+import argparse
+
+import numpy as np
+
+# Traffic scenarios: the attributes of every plane of an episode, one row of num_planes planes per scenario.
+# sample_scenarios draws whole batches from a seeded np.random.Generator in one go, a ScenarioBank keeps
+# millions of them in a memory-mapped .npy file so an environment can reset to any of them without copying.
+#   low_fuel: p = [0.3, 0.7], MST 5/10/15: p = [0.15, 0.15, 0.7], in_transit: p = [0.1, 0.9]
+#   high_priority = in_transit or MST != 15 or low_fuel
+
+SCENARIO_DTYPE = np.dtype([
+    ('low_fuel', '?'),
+    ('MST', 'u1'),
+    ('in_transit', '?'),
+    ('high_priority', '?'),
+])
+
+# Returns an array of shape (num_scenarios, num_planes) and dtype SCENARIO_DTYPE.
+# Numbers are drawn scenario by scenario, so batches of any size give the same scenarios for the same generator state.
+def sample_scenarios(rng, num_scenarios, num_planes, out=None):
+    draws = rng.random((num_scenarios, num_planes, 3))
+    if out is None:
+        out = np.empty((num_scenarios, num_planes), dtype=SCENARIO_DTYPE)
+
+    out['low_fuel'] = draws[..., 0] < 0.3
+    out['MST'] = np.where(draws[..., 1] < 0.15, 5, np.where(draws[..., 1] < 0.3, 10, 15))
+    out['in_transit'] = draws[..., 2] < 0.1
+    out['high_priority'] = out['in_transit'] | (out['MST'] != 15) | out['low_fuel']
+    return out
+
+# Samples num_scenarios scenarios into a memory-mapped .npy file, chunk by chunk
+def create_bank(path, num_scenarios, num_planes, seed=42, chunk_size=100_000):
+    rng = np.random.default_rng(seed)
+    scenarios = np.lib.format.open_memmap(path, mode='w+', dtype=SCENARIO_DTYPE, shape=(num_scenarios, num_planes))
+    for start in range(0, num_scenarios, chunk_size):
+        stop = min(start + chunk_size, num_scenarios)
+        sample_scenarios(rng, stop - start, num_planes, out=scenarios[start:stop])
+    scenarios.flush()
+    return ScenarioBank(path)
+
+class ScenarioBank:
+    def __init__(self, path):
+        self.path = path
+        # Plain ndarray view of the memory map, indexing np.memmap objects is slower
+        self.scenarios = np.asarray(np.load(path, mmap_mode='r'))
+        self.num_planes = self.scenarios.shape[1]
+
+    def __len__(self):
+        return len(self.scenarios)
+
+    # A row of the memory map, read-only and without copying
+    def __getitem__(self, index):
+        return self.scenarios[index]
+
+    # Scenarios of several indices, copied into a new array
+    def take(self, indices):
+        return self.scenarios[indices]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('out', help="e.g. scenarios_20.npy")
+    parser.add_argument('--scenarios', type=int, default=1_000_000)
+    parser.add_argument('--planes', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    bank = create_bank(args.out, args.scenarios, args.planes, args.seed)
+    print(f"Wrote {len(bank)} scenarios of {bank.num_planes} planes to {args.out}")
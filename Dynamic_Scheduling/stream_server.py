@@ -0,0 +1,103 @@
+import argparse
+import asyncio
+import struct
+
+import numpy as np
+
+from inference_server import MODEL_PATH, OBS_SIZE, MicroBatcher, compute_action_masks, fallback_action, load_model
+
+# Persistent binary channel between Unity's AgentController and the policy, instead of one HTTP POST per decision.
+# A client keeps one TCP connection open and may have several decisions in flight, replies can come back out of order.
+# All values are little-endian:
+#   request frame: uint32 request_id, int32 obs[OBS_SIZE]  (164 bytes), obs = [id, prio, id, prio, ...]
+#   reply frame:   uint32 request_id, int32 action         (8 bytes), action = -1 when no plane is left
+REQUEST_FRAME = np.dtype([('request_id', '<u4'), ('obs', '<i4', (OBS_SIZE,))])
+REPLY_FRAME = struct.Struct('<Ii')
+
+PORT = 5001
+
+class StreamServer:
+    def __init__(self, batcher):
+        self.batcher = batcher
+        self.num_connections = 0
+
+    async def handle_connection(self, reader, writer):
+        self.num_connections += 1
+        pending = set()
+        buffer = b''
+
+        try:
+            while True:
+                chunk = await reader.read(64 * REQUEST_FRAME.itemsize)
+                if not chunk:
+                    break
+
+                # Decode every complete frame received so far in one go, keep the rest for the next read
+                buffer += chunk
+                num_frames = len(buffer) // REQUEST_FRAME.itemsize
+                if num_frames == 0:
+                    continue
+                frames = np.frombuffer(buffer, dtype=REQUEST_FRAME, count=num_frames)
+                buffer = buffer[num_frames * REQUEST_FRAME.itemsize:]
+
+                masks = compute_action_masks(frames['obs'])
+                for frame, mask in zip(frames, masks):
+                    task = asyncio.create_task(self._decide(int(frame['request_id']), frame['obs'], mask, writer))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+
+        except ConnectionError as e:
+            print(f"Connection lost: {e}")
+
+        finally:
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            writer.close()
+            self.num_connections -= 1
+
+    async def _decide(self, request_id, obs, mask, writer):
+        if not mask.any():
+            action = -1
+        elif self.batcher is None:
+            action = fallback_action(obs)
+        else:
+            try:
+                action = await self.batcher.predict(obs.astype(np.float32), mask)
+            except Exception as e:
+                print(f"Error in predict: {e}")
+                action = fallback_action(obs)
+
+        if not writer.is_closing():
+            writer.write(REPLY_FRAME.pack(request_id, action))
+            # Backpressure: a client that stops reading holds its replies back instead of growing the send buffer
+            try:
+                await writer.drain()
+            except ConnectionError:
+                pass
+
+async def serve(model, host='0.0.0.0', port=PORT, max_batch_size=64, max_wait_ms=2.0):
+    batcher = MicroBatcher(model, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms) if model is not None else None
+    if batcher is not None:
+        await batcher.start()
+
+    stream_server = StreamServer(batcher)
+    server = await asyncio.start_server(stream_server.handle_connection, host, port)
+    print(f"Serving decisions on {host}:{port}")
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if batcher is not None:
+            await batcher.stop()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', default=MODEL_PATH, help="MaskablePPO .zip checkpoint or .npz exported by policy_export.py")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--max-batch-size', type=int, default=64)
+    parser.add_argument('--max-wait-ms', type=float, default=2.0, help="How long to wait for more requests after the first one of a batch")
+    args = parser.parse_args()
+
+    asyncio.run(serve(load_model(args.model), args.host, args.port, args.max_batch_size, args.max_wait_ms))
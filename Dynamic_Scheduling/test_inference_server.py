@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import model_registry
+from inference_server import OBS_SIZE, create_app
+from model_registry import ModelRegistry
+
+# Picks the last valid plane, so the answer differs from the heuristic's
+class LastPlanePolicy:
+    weights = [np.zeros(1)]
+    biases = []
+
+    def predict(self, observation, deterministic=True, action_masks=None):
+        return action_masks.shape[1] - 1 - np.argmax(action_masks[:, ::-1], axis=1), None
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_registry, '_load', lambda path: LastPlanePolicy())
+    for name in ('a', 'b'):
+        (tmp_path / f'{name}.npz').touch()
+    registry = ModelRegistry(root=str(tmp_path), default='a')
+    with TestClient(create_app(None, registry=registry)) as client:
+        yield client
+
+def observation():
+    obs = np.full(OBS_SIZE, -1)
+    obs[:6] = [0, 0, 1, 1, 2, 0]
+    return obs.tolist()
+
+# AgentController.cs parses the reply as {"action": n}, nothing may follow the action
+def test_reply_without_model_name(client):
+    response = client.post('/predict', json={'obs': observation()})
+    assert response.status_code == 200
+    assert response.json() == {'action': 2}
+    assert response.text.split(':')[1].replace('}', '') == '2'
+
+def test_reply_with_model_name(client):
+    assert client.post('/predict', json={'obs': observation(), 'model': 'b'}).json() == {'action': 2, 'model': 'b'}
+    assert client.post('/predict', json={'obs': observation(), 'model': 'missing'}).status_code == 404
+
+# The error path answers with the fallback, which must not raise on input it cannot read
+@pytest.mark.parametrize('obs', [['a'] * OBS_SIZE, [[1, 2], [3]], 'x', [0] * 7])
+def test_malformed_observation(client, obs):
+    response = client.post('/predict', json={'obs': obs})
+    assert response.status_code == 200
+    assert response.json() == {'action': -1}
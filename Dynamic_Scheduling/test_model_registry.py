@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+import model_registry
+from model_registry import ModelRegistry
+
+# Checkpoint files only need to exist, _load is replaced by a policy of nbytes bytes of weights
+class FakePolicy:
+    def __init__(self, nbytes):
+        self.weights = [np.zeros(nbytes, dtype=np.uint8)]
+        self.biases = []
+
+@pytest.fixture
+def registry_factory(tmp_path, monkeypatch):
+    sizes = {}
+    monkeypatch.setattr(model_registry, '_load', lambda path: FakePolicy(sizes[path]))
+
+    def factory(models, **kwargs):
+        for name, nbytes in models.items():
+            path = tmp_path / f'{name}.npz'
+            path.touch()
+            sizes[str(path)] = nbytes
+        return ModelRegistry(root=str(tmp_path), **kwargs)
+    return factory
+
+def test_rejects_max_models_below_two(registry_factory):
+    with pytest.raises(ValueError):
+        registry_factory({}, max_models=1)
+
+def test_max_models(registry_factory):
+    registry = registry_factory({'a': 1, 'b': 1, 'c': 1}, default='a', max_models=2)
+    evicted = []
+    registry.on_evict.append(lambda name, model: evicted.append(name))
+
+    registry.get('b')
+    registry.get('c')
+    assert list(registry.info()['models']) == ['a', 'c']
+    assert evicted == ['b'] and registry.num_evictions == 1
+
+    # The old default is no longer pinned: it is the least recently used and goes next
+    registry.set_default('b')
+    assert list(registry.info()['models']) == ['a', 'b']
+    registry.get('c')
+    assert list(registry.info()['models']) == ['b', 'c']
+    assert evicted == ['b', 'c', 'a']
+
+def test_memory_budget(registry_factory):
+    mib = 1024 * 1024
+    registry = registry_factory({'a': mib, 'b': mib, 'c': 2 * mib}, default='a', memory_budget_mb=2)
+
+    registry.get('b')
+    assert 'a' in registry and 'b' in registry
+    # c does not fit next to the default: it is served but not kept
+    assert isinstance(registry.get('c'), FakePolicy)
+    assert list(registry.info()['models']) == ['a']
+    assert registry.info()['memory_kib'] <= registry.info()['memory_budget_kib']
+    assert registry.num_evictions == 2
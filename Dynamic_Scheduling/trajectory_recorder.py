@@ -0,0 +1,303 @@
+import argparse
+import json
+import os
+import time
+
+import gymnasium as gym
+import numpy as np
+
+from columnar import ColumnWriter, read_columns
+
+# Recording of transitions (observation, action mask, action, reward, done) seen by the environment or the server.
+# A recording is a directory of chunk files, one .npy per field and chunk of chunk_size transitions, preallocated and
+# written through memory maps, and an episode index (see columnar.py) with the first transition, length and return
+# of every episode. The index is only appended once an episode is complete, so a recording always ends with
+# its last complete episode and can be reopened to append more.
+#   RecordingEnv:      gym wrapper recording every step of an AirplaneEnv
+#   DecisionRecorder:  records /predict decisions, an episode ends when planes come back into the observation
+#   TrajectoryReader:  slices, streams and samples transitions from the memory maps without loading them
+
+META_FILE = 'meta.json'
+INDEX_DIR = 'episodes'
+
+INDEX_COLUMNS = {
+    'start': np.int64,
+    'length': np.int64,
+    'return': np.float64,
+    'scenario': np.int64, # Index of the scenario bank row, -1 when unknown
+}
+
+def _fields(obs_size, num_actions):
+    return {
+        'obs': (np.int32, (obs_size,)),
+        'mask': (np.bool_, (num_actions,)),
+        'action': (np.int32, ()),
+        'reward': (np.float32, ()),
+        'done': (np.bool_, ()),
+    }
+
+def _chunk_path(path, field, chunk):
+    return os.path.join(path, f'{field}_{chunk:06d}.npy')
+
+class TrajectoryWriter:
+    def __init__(self, path, obs_size, num_actions, chunk_size=1 << 18):
+        self.path = path
+        obs_size, num_actions, chunk_size = int(obs_size), int(num_actions), int(chunk_size)
+        os.makedirs(path, exist_ok=True)
+
+        meta_path = os.path.join(path, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            assert (meta['obs_size'], meta['num_actions']) == (obs_size, num_actions), f"{path} has a different shape"
+            chunk_size = meta['chunk_size']
+        else:
+            with open(meta_path, 'w') as f:
+                json.dump({'obs_size': obs_size, 'num_actions': num_actions, 'chunk_size': chunk_size}, f, indent=2)
+
+        self.obs_size = obs_size
+        self.num_actions = num_actions
+        self.chunk_size = chunk_size
+        self.fields = _fields(obs_size, num_actions)
+
+        # Continue after the last complete episode
+        self.index = ColumnWriter(os.path.join(path, INDEX_DIR), INDEX_COLUMNS)
+        if self.index.num_rows > 0:
+            last = read_columns(self.index.path)
+            self.num_transitions = int(last['start'][-1] + last['length'][-1])
+        else:
+            self.num_transitions = 0
+
+        self._episode_start = self.num_transitions
+        self._episode_return = 0.0
+        self._chunk = -1
+        self._open_chunk(self.num_transitions // chunk_size)
+
+    def _open_chunk(self, chunk):
+        self._chunk = chunk
+        self._arrays = {}
+        for field, (dtype, shape) in self.fields.items():
+            chunk_path = _chunk_path(self.path, field, chunk)
+            if os.path.exists(chunk_path):
+                self._arrays[field] = np.lib.format.open_memmap(chunk_path, mode='r+')
+            else:
+                self._arrays[field] = np.lib.format.open_memmap(chunk_path, mode='w+', dtype=dtype, shape=(self.chunk_size,) + shape)
+        self._row = self.num_transitions - chunk * self.chunk_size
+
+        # Plain ndarray views for the per step writes, writing through np.memmap objects is slower
+        self._obs = np.asarray(self._arrays['obs'])
+        self._mask = np.asarray(self._arrays['mask'])
+        self._action = np.asarray(self._arrays['action'])
+        self._reward = np.asarray(self._arrays['reward'])
+        self._done = np.asarray(self._arrays['done'])
+
+    def append(self, obs, mask, action, reward, done):
+        if self._row == self.chunk_size:
+            self._flush_chunk()
+            self._open_chunk(self._chunk + 1)
+
+        row = self._row
+        self._obs[row] = obs
+        self._mask[row] = mask
+        self._action[row] = action
+        self._reward[row] = reward
+        self._done[row] = done
+        self._row += 1
+        self.num_transitions += 1
+        self._episode_return += reward
+
+    # Reward and done flag of the last transition appended, for callers that only know them after stepping
+    def set_outcome(self, reward, done):
+        row = self._row - 1
+        self._episode_return += reward - float(self._reward[row])
+        self._reward[row] = reward
+        self._done[row] = done
+
+    # Closes the episode, its last transition is marked done
+    def end_episode(self, scenario=-1):
+        length = self.num_transitions - self._episode_start
+        if length > 0:
+            self._done[self._row - 1] = True
+            self.index.append({'start': self._episode_start, 'length': length, 'return': self._episode_return, 'scenario': scenario})
+        self._episode_start = self.num_transitions
+        self._episode_return = 0.0
+
+    def _flush_chunk(self):
+        for array in self._arrays.values():
+            array.flush()
+
+    # Transitions of an unfinished episode are dropped
+    def close(self):
+        self._flush_chunk()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class RecordingEnv(gym.Wrapper):
+    def __init__(self, env, path, chunk_size=1 << 18):
+        super().__init__(env)
+        self.writer = TrajectoryWriter(path, env.observation_space.shape[0], env.action_space.n, chunk_size)
+        self._obs = None
+
+    def reset(self, **kwargs):
+        # An episode cut short by the reset is recorded as truncated
+        self.writer.end_episode(self._scenario())
+        obs, info = self.env.reset(**kwargs)
+        self._obs = obs
+        return obs, info
+
+    def step(self, action):
+        mask = self.env.unwrapped._action_mask
+        # Appended before the step, which changes the mask in place; reward and done follow from the step
+        self.writer.append(self._obs, mask, action, 0.0, False)
+        obs, reward, terminated, truncated, info = self.env.step(action)
+
+        self.writer.set_outcome(reward, terminated or truncated)
+        if terminated or truncated:
+            self.writer.end_episode(self._scenario())
+
+        self._obs = obs
+        return obs, reward, terminated, truncated, info
+
+    def _scenario(self):
+        scenario = getattr(self.env.unwrapped, 'scenario_index', None)
+        return -1 if scenario is None else scenario
+
+    def action_masks(self):
+        return self.env.unwrapped.action_masks()
+
+    def close(self):
+        self.writer.close()
+        super().close()
+
+class DecisionRecorder:
+    # Decisions have no reward, it is recorded as 0. Unity plays one episode at a time, so an observation with
+    # more planes than the previous one starts a new episode.
+    def __init__(self, path, obs_size, num_actions, chunk_size=1 << 18):
+        self.writer = TrajectoryWriter(path, obs_size, num_actions, chunk_size)
+        self._num_planes = 0
+
+    def record(self, obs, mask, action):
+        num_planes = int(np.count_nonzero(mask))
+        if num_planes > self._num_planes:
+            self.writer.end_episode()
+        self._num_planes = num_planes
+        self.writer.append(obs, mask, action, 0.0, num_planes == 1)
+
+    def close(self):
+        self.writer.end_episode()
+        self.writer.close()
+
+class TrajectoryReader:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        self.obs_size = meta['obs_size']
+        self.num_actions = meta['num_actions']
+        self.chunk_size = meta['chunk_size']
+
+        self.episodes = read_columns(os.path.join(path, INDEX_DIR))
+        self.num_episodes = len(self.episodes['start'])
+        self.num_transitions = int(self.episodes['start'][-1] + self.episodes['length'][-1]) if self.num_episodes else 0
+        self._chunks = {}
+
+    def __len__(self):
+        return self.num_transitions
+
+    def _chunk(self, chunk):
+        if chunk not in self._chunks:
+            self._chunks[chunk] = {field: np.load(_chunk_path(self.path, field, chunk), mmap_mode='r')
+                                   for field in _fields(self.obs_size, self.num_actions)}
+        return self._chunks[chunk]
+
+    # Transitions start to stop as {field: array}, views of the memory maps when they lie in one chunk
+    def slice(self, start, stop):
+        stop = min(stop, self.num_transitions)
+        parts = []
+        while start < stop:
+            chunk, row = divmod(start, self.chunk_size)
+            rows = min(stop - start, self.chunk_size - row)
+            parts.append({field: array[row:row + rows] for field, array in self._chunk(chunk).items()})
+            start += rows
+
+        if len(parts) == 1:
+            return parts[0]
+        fields = _fields(self.obs_size, self.num_actions)
+        if not parts:
+            return {field: np.zeros((0,) + shape, dtype=dtype) for field, (dtype, shape) in fields.items()}
+        return {field: np.concatenate([part[field] for part in parts]) for field in fields}
+
+    def episode(self, i):
+        start = int(self.episodes['start'][i])
+        return self.slice(start, start + int(self.episodes['length'][i]))
+
+    # Streams all transitions in slices of at most batch_size, never crossing a chunk boundary
+    def iter_batches(self, batch_size=65536):
+        start = 0
+        while start < self.num_transitions:
+            stop = min(start + batch_size, (start // self.chunk_size + 1) * self.chunk_size, self.num_transitions)
+            yield self.slice(start, stop)
+            start = stop
+
+    # Random observations and masks, e.g. as the background of explainer.PolicyExplainer
+    def sample(self, num_samples, seed=None):
+        rng = np.random.default_rng(seed)
+        indices = np.sort(rng.choice(self.num_transitions, size=min(num_samples, self.num_transitions), replace=False))
+        observations = np.empty((len(indices), self.obs_size), dtype=np.int32)
+        masks = np.empty((len(indices), self.num_actions), dtype=bool)
+        for chunk in np.unique(indices // self.chunk_size):
+            selected = indices // self.chunk_size == chunk
+            rows = indices[selected] - chunk * self.chunk_size
+            arrays = self._chunk(int(chunk))
+            observations[selected] = arrays['obs'][rows]
+            masks[selected] = arrays['mask'][rows]
+        return observations, masks
+
+# Time per step of whole episodes with and without recording, choosing the first free approach slot
+def benchmark(path, num_steps=50_000, seed=42):
+    from airplane_boarding import AirplaneEnv
+
+    def steps_per_sec(env):
+        env.reset(seed=seed)
+        start = time.perf_counter()
+        for _ in range(num_steps):
+            _, _, terminated, _, _ = env.step(int(np.argmax(env.unwrapped._action_mask)))
+            if terminated:
+                env.reset()
+        return num_steps / (time.perf_counter() - start)
+
+    plain = AirplaneEnv(num_of_rows=4, seats_per_row=5, num_of_plane_rows=4)
+    recording = RecordingEnv(AirplaneEnv(num_of_rows=4, seats_per_row=5, num_of_plane_rows=4), path)
+
+    # Alternate the runs to even out noise, keep the best of each
+    plain_rate = recording_rate = 0.0
+    for _ in range(3):
+        plain_rate = max(plain_rate, steps_per_sec(plain))
+        recording_rate = max(recording_rate, steps_per_sec(recording))
+    recording.close()
+
+    return {
+        'plain_step_us': 1e6 / plain_rate,
+        'recording_step_us': 1e6 / recording_rate,
+        'overhead_us': 1e6 / recording_rate - 1e6 / plain_rate,
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path', help="Recording directory, e.g. recordings/benchmark")
+    parser.add_argument('--steps', type=int, default=50_000)
+    args = parser.parse_args()
+
+    result = benchmark(args.path, args.steps)
+    print(f"Step without recording: {result['plain_step_us']:.2f} us")
+    print(f"Step with recording:    {result['recording_step_us']:.2f} us")
+    print(f"Overhead:               {result['overhead_us']:.2f} us "
+          f"({result['overhead_us'] / result['plain_step_us']:.1%})")
+
+    reader = TrajectoryReader(args.path)
+    print(f"\n{len(reader)} transitions in {reader.num_episodes} episodes recorded to {args.path}")
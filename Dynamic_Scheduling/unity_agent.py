@@ -1,8 +1,13 @@
-from flask import Flask, request, jsonify
+import sys
+
+from flask import Flask, Response, request, jsonify
 import numpy as np
 from sb3_contrib import MaskablePPO
 import torch
 
+from heuristic_scheduler import ObservationHeuristic
+from instrumentation import Profiler
+
 app = Flask(__name__)
 
 # Load your pre-trained model
@@ -21,49 +26,100 @@ def compute_action_mask(observation):
         for i in range(0, len(observation), 2)
     ], dtype=bool)
 
-@app.route('/predict', methods=['POST'])
-def predict():
+heuristic = ObservationHeuristic()
+
+def fallback_action(raw_obs):
+    # Rule-based decision (heuristic_scheduler.py): first high priority plane, else the first plane, -1 if none is left.
+    # It answers the error path of /predict, so a malformed observation gives -1 instead of raising.
     try:
-        data = request.json
-        raw_obs = data['obs']
+        mask = compute_action_mask(raw_obs)
+        if not any(mask):
+            return -1
+        action, _ = heuristic.predict(np.array(raw_obs, dtype=np.float32), action_masks=mask)
+        return int(action)
+    except Exception as e:
+        print(f"Error in fallback: {e}")
+        return -1
 
-        obs = np.array(raw_obs, dtype=np.float32)
+def read_request():
+    return request.get_json()
 
-        # Reshape if flat (e.g., shape = (40,))
-        if obs.ndim == 1:
-            obs = obs.reshape(1, -1)
+def parse_observation(data):
+    raw_obs = data['obs']
 
-        # Validate shape
-        if obs.shape[1] != 40:
-            raise ValueError(f"Invalid observation shape: {obs.shape}")
+    obs = np.array(raw_obs, dtype=np.float32)
 
-        # If model failed to load, return fallback
-        if model is None:
-            valid_indices = [i for i in range(0, len(raw_obs), 2) if raw_obs[i] != -1]
-            action = valid_indices[0] if valid_indices else -1
-            return jsonify({'action': int(action)})
+    # Reshape if flat (e.g., shape = (40,))
+    if obs.ndim == 1:
+        obs = obs.reshape(1, -1)
 
-        # Compute mask (1 per plane)
-        mask = compute_action_mask(raw_obs)
+    # Validate shape
+    if obs.shape[1] != 40:
+        raise ValueError(f"Invalid observation shape: {obs.shape}")
+    return raw_obs, obs
 
-        if not any(mask):
-            return jsonify({'action': -1})
+def select_action(obs, mask):
+    action, _ = model.predict(observation=obs, deterministic=True, action_masks=mask)
 
-        action, _ = model.predict(observation=obs, deterministic=True, action_masks=mask)
+    # Validate the action
+    valid_actions = np.where(mask)[0]
+    if action not in valid_actions and len(valid_actions) > 0:
+        action = valid_actions[0]
+    # predict returns an array of one action for the batch of one observation
+    return int(np.asarray(action).item())
 
-        # Validate the action
-        valid_actions = np.where(mask)[0]
-        if action not in valid_actions and len(valid_actions) > 0:
-            action = valid_actions[0]
+def handle_predict(data):
+    raw_obs, obs = parse_observation(data)
 
-        print(f"Agent selected plane index: {action}")
-        return jsonify({'action': int(action)})
+    # If model failed to load, return fallback
+    if model is None:
+        return fallback_action(raw_obs)
+
+    # Compute mask (1 per plane)
+    mask = compute_action_mask(raw_obs)
+
+    if not any(mask):
+        return -1
+
+    action = select_action(obs, mask)
+    print(f"Agent selected plane index: {action}")
+    return action
+
+# Phases of a /predict request, timed while profiling is switched on (POST /profiling), see GET /metrics.
+# predict.read_request is the JSON parsing, predict.handle_predict everything after it.
+profiler = Profiler()
+profiler.instrument(sys.modules[__name__], ['read_request', 'handle_predict', 'parse_observation', 'compute_action_mask',
+                                            'select_action', 'fallback_action'], prefix='predict.')
+
+@app.route('/predict', methods=['POST'])
+def predict():
+    data = None
+    try:
+        data = read_request()
+        return jsonify({'action': handle_predict(data)})
 
     except Exception as e:
         print(f"Error in predict: {e}")
-        valid_indices = [i for i in range(0, len(data['obs']), 2) if data['obs'][i] != -1]
-        action = valid_indices[0] if valid_indices else -1
-        return jsonify({'action': int(action)})
+        if not isinstance(data, dict) or 'obs' not in data:
+            return jsonify({'action': -1})
+        return jsonify({'action': fallback_action(data['obs'])})
+
+# Phase timings and call counts in the Prometheus text format
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(profiler.text(), mimetype='text/plain')
+
+# {"enabled": true/false} switches profiling on/off, {"reset": true} clears the timings
+@app.route('/profiling', methods=['POST'])
+def profiling():
+    data = request.get_json()
+    if data.get('reset'):
+        profiler.reset()
+    if data.get('enabled') is True:
+        profiler.enable()
+    elif data.get('enabled') is False:
+        profiler.disable()
+    return jsonify({'enabled': profiler.enabled})
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)